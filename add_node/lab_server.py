@@ -1,7 +1,15 @@
 import paho.mqtt.client as mqtt
 import json
+import os
+import sys
 import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from node_manager import HWNodeManager
+from sf_core.log import get_logger
+import telemetry_codec as codec
+
+logger = get_logger("add_node.lab")
 
 # 통신 프로토콜 설정
 BROKER = "broker.hivemq.com"
@@ -11,14 +19,23 @@ TOPIC_CONFIG = "smartfarm/config/"  # 뒤에 MAC 주소 붙음
 TOPIC_ALERT = "smartfarm/+/alert"
 
 # 노드 매니저 초기화
-manager = HWNodeManager()
+manager = HWNodeManager().start()  # 등록 변경은 WAL에 묶어서 기록 (1초 주기)
 
 def on_connect(client, userdata, flags, rc):
-    print(f"📡 MQTT 테스트 서버 연결됨 (Result: {rc})")
+    logger.info("📡 MQTT 테스트 서버 연결됨 (Result: %s)", rc)
     client.subscribe([(TOPIC_REG, 0), (TOPIC_ALERT, 0)])
 
 def on_message(client, userdata, msg):
     try:
+        # 바이너리 경보 프레임 (add_node/protocol.md 5절)
+        if "/alert" in msg.topic and codec.is_binary(msg.payload):
+            node_id = msg.topic.split('/')[1]
+            recs, _, _ = codec.decode_frames([msg.payload], codec.KIND_ALERT)
+            for dev, side, val, lo, hi in recs.tolist():
+                manager.process_incoming_data(node_id, {"dev": dev, "type": f"{codec.ALERT_SIDES.get(side, side)}_alert",
+                                                        "val": round(val, 2), "min": round(lo, 2), "max": round(hi, 2)})
+            return
+
         payload = json.loads(msg.payload.decode())
         
         # 1. 노드 등록 요청 처리
@@ -29,7 +46,7 @@ def on_message(client, userdata, msg):
             # 해당 노드에게만 설정값 발송
             target_topic = TOPIC_CONFIG + mac
             client.publish(target_topic, json.dumps(config))
-            print(f"📤 [Config] {mac}에게 설정 발송 완료")
+            logger.info("📤 [Config] %s에게 설정 발송 완료", mac)
 
         # 2. 임계값 이탈 경보 처리
         elif "/alert" in msg.topic:
@@ -37,13 +54,13 @@ def on_message(client, userdata, msg):
             manager.process_incoming_data(node_id, payload)
 
     except Exception as e:
-        print(f"❌ 메시지 처리 에러: {e}")
+        logger.error("❌ 메시지 처리 에러: %s", e)
 
 # 클라이언트 가동
 client = mqtt.Client()
 client.on_connect = on_connect
 client.on_message = on_message
 
-print(f"🚀 [Lab Server] 시작 중... (Broker: {BROKER})")
+logger.info("🚀 [Lab Server] 시작 중... (Broker: %s)", BROKER)
 client.connect(BROKER, PORT, 60)
 client.loop_forever()
@@ -1,70 +1,236 @@
 import json
 import os
+import sys
+import threading
+import time
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sf_core import ALARM_LOG_INTERVAL
+from sf_core.log import get_logger
+
+logger = get_logger("add_node")
+
 class HWNodeManager:
     """
     하드웨어 노드의 등록, 설정 및 데이터 처리를 담당하는 통합 모듈입니다.
     main_async.py에 통합하기 쉬운 클래스 구조로 설계되었습니다.
+
+    저장 구조 (노드가 한꺼번에 부팅해도 전체 파일을 매번 다시 쓰지 않음)
+    - hw_registry.json: 스냅샷 {"next_id": 다음 번호, "nodes": {MAC: 설정}}
+    - hw_registry.json.wal: 스냅샷 이후 변경분 (JSON 한 줄씩). commit_interval초 또는 commit_size건마다 묶어서 fsync
+    - WAL이 compact_size건을 넘으면 스냅샷을 새로 쓰고 WAL을 비웁니다.
+    노드 번호(NEW_NODE_n)는 저장되는 단조 증가 카운터로 발급하므로 삭제 후에도 겹치지 않습니다.
     """
-    def __init__(self, registry_file='add_node/hw_registry.json'):
+    def __init__(self, registry_file='add_node/hw_registry.json', commit_interval=1.0, commit_size=1000, compact_size=10000):
         self.registry_file = registry_file
-        self.nodes = self._load_registry()
+        self.wal_file = registry_file + ".wal"
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.compact_size = compact_size
+        self._lock = threading.RLock()
+        self._pending = []      # 아직 WAL에 기록되지 않은 변경 (JSON 줄)
+        self._wal_records = 0   # 마지막 스냅샷 이후 WAL에 기록된 변경 수
+        self._last_commit = time.monotonic()
+        self._flusher = None
+        self.nodes, self.next_id = self._load_registry()
+        self.by_node_id = {config.get("node_id"): mac for mac, config in self.nodes.items()}
 
+    # ---------------------------------------------------------------- 복구
     def _load_registry(self):
+        nodes, next_id = None, None
         if os.path.exists(self.registry_file):
             try:
                 with open(self.registry_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {
-            "SAMPLE_MAC_123": {
-                "node_id": "Seoul_Node_01",
-                "target_zone": "A_Zone",
-                "thresholds": {"temp_min": 18.0, "temp_max": 28.0, "humi_min": 40.0}
+                    data = json.load(f)
+                if isinstance(data.get("nodes"), dict):
+                    nodes, next_id = data["nodes"], data.get("next_id")
+                else:
+                    nodes = data  # 예전 형식: {MAC: 설정}
+            except (OSError, ValueError, AttributeError):
+                nodes = {}
+        if nodes is None and not os.path.exists(self.wal_file):
+            nodes = {
+                "SAMPLE_MAC_123": {
+                    "node_id": "Seoul_Node_01",
+                    "target_zone": "A_Zone",
+                    "thresholds": {"temp_min": 18.0, "temp_max": 28.0, "humi_min": 40.0}
+                }
             }
-        }
+        nodes = nodes or {}
+        if next_id is None:
+            next_id = self._next_from(nodes)
+
+        # 스냅샷 이후 변경분 재적용 (중간에 끊긴 마지막 줄은 잘라냄)
+        if os.path.exists(self.wal_file):
+            good = 0
+            with open(self.wal_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    if rec.get("op") == "put":
+                        nodes[rec["mac"]] = rec["config"]
+                    elif rec.get("op") == "del":
+                        nodes.pop(rec["mac"], None)
+                    next_id = max(next_id, rec.get("next_id", next_id))
+                    good += len(line)
+                    self._wal_records += 1
+            if good < os.path.getsize(self.wal_file):
+                logger.warning("⚠️ [Registry] WAL의 불완전한 마지막 기록을 잘라냅니다.")
+                with open(self.wal_file, 'r+b') as f:
+                    f.truncate(good)
+        return nodes, next_id
+
+    @staticmethod
+    def _next_from(nodes):
+        """카운터가 없는 예전 레지스트리: 사용 중인 NEW_NODE_n 최댓값 다음 번호"""
+        used = [int(c["node_id"][9:]) for c in nodes.values()
+                if str(c.get("node_id", "")).startswith("NEW_NODE_") and c["node_id"][9:].isdigit()]
+        return max(used + [len(nodes)]) + 1
+
+    # ---------------------------------------------------------------- 영속화
+    def _log(self, record):
+        self._pending.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        if len(self._pending) >= self.commit_size or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        """대기 중인 변경을 WAL에 한 번에 기록(fsync)하고, WAL이 커졌으면 스냅샷으로 압축합니다."""
+        with self._lock:
+            self._last_commit = time.monotonic()
+            if self._pending and not os.path.exists(self.registry_file):
+                self.compact()  # 최초 기록은 스냅샷으로 (기본 샘플 노드 포함)
+            if self._pending:
+                with open(self.wal_file, 'a', encoding='utf-8') as f:
+                    f.write("".join(self._pending))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._wal_records += len(self._pending)
+                self._pending = []
+            if self._wal_records >= self.compact_size:
+                self.compact()
+
+    def compact(self):
+        """현재 상태를 스냅샷으로 원자적으로 저장한 뒤 WAL을 비웁니다."""
+        with self._lock:
+            tmp_path = self.registry_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"next_id": self.next_id, "nodes": self.nodes}, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.registry_file)
+            # 스냅샷 교체 후 WAL을 비움 (그 사이 중단되어도 WAL 재적용은 같은 결과)
+            open(self.wal_file, 'w').close()
+            self._wal_records = 0
+            self._pending = []
 
-    def _save_registry(self):
-        with open(self.registry_file, 'w', encoding='utf-8') as f:
-            json.dump(self.nodes, f, indent=2, ensure_ascii=False)
+    def start(self):
+        """commit_interval마다 대기 중인 변경을 기록하는 백그라운드 스레드를 시작합니다."""
+        if self._flusher is None:
+            def loop():
+                while True:
+                    time.sleep(self.commit_interval)
+                    try:
+                        self.flush()
+                    except OSError as e:
+                        logger.error("⚠️ [Registry] WAL 기록 실패: %s", e, key="wal-error")
+            self._flusher = threading.Thread(target=loop, name="hw-registry-flush", daemon=True)
+            self._flusher.start()
+        return self
+
+    # ---------------------------------------------------------------- 조회/등록
+    def get(self, mac_address):
+        return self.nodes.get(mac_address)
+
+    def find_by_node_id(self, node_id):
+        mac = self.by_node_id.get(node_id)
+        return (mac, self.nodes[mac]) if mac is not None else (None, None)
 
     def register_node(self, mac_address):
         """
-        노드가 처음 접속했을 때 호출됩니다. 
+        노드가 처음 접속했을 때 호출됩니다.
         알려진 MAC이면 설정을 반환하고, 처음 보면 대기 목록에 넣습니다.
         """
-        if mac_address in self.nodes:
-            config = self.nodes[mac_address]
-            print(f"✅ [Registry] 기존 노드 활성화: {mac_address} ({config['node_id']})")
+        config = self.nodes.get(mac_address)
+        if config is not None:
+            logger.info("✅ [Registry] 기존 노드 활성화: %s (%s)", mac_address, config['node_id'])
             return config
-        else:
+        with self._lock:
+            config = self.nodes.get(mac_address)
+            if config is not None:
+                return config
             # 새로운 노드 발견 시 기본 설정으로 자동 등록 (또는 관리자 승인 대기)
-            new_id = f"NEW_NODE_{len(self.nodes) + 1}"
-            self.nodes[mac_address] = {
+            new_id = f"NEW_NODE_{self.next_id}"
+            self.next_id += 1
+            config = {
                 "node_id": new_id,
                 "target_zone": "Pending",
                 "thresholds": {"temp_min": 20.0, "temp_max": 25.0},
                 "registered_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
-            self._save_registry()
-            print(f"🆕 [Registry] 새 노드 임시 등록: {mac_address} -> {new_id}")
-            return self.nodes[mac_address]
+            self.nodes[mac_address] = config
+            self.by_node_id[new_id] = mac_address
+            self._log({"op": "put", "mac": mac_address, "config": config, "next_id": self.next_id})
+        logger.info("🆕 [Registry] 새 노드 임시 등록: %s -> %s", mac_address, new_id)
+        return config
+
+    def remove_node(self, mac_address):
+        """노드를 등록 해제합니다. (발급된 번호는 재사용하지 않음)"""
+        with self._lock:
+            config = self.nodes.pop(mac_address, None)
+            if config is None:
+                return False
+            self.by_node_id.pop(config.get("node_id"), None)
+            self._log({"op": "del", "mac": mac_address})
+        return True
 
     def process_incoming_data(self, node_id, payload):
         """
         노드에서 온 경보(Alert) 또는 데이터를 처리합니다.
         추후 DB 저장이나 시각화 로직이 여기에 추가됩니다.
         """
-        print(f"🚨 [Event] {node_id}에서 경보 수신: {payload}")
+        logger.info("🚨 [Event] %s에서 경보 수신: %s", node_id, payload,
+                    key=("event", node_id, payload.get("dev") if isinstance(payload, dict) else None), every=ALARM_LOG_INTERVAL)
         # 여기에 구글 시트 기록이나 메인 시스템 데이터 업데이트 로직 연동 가능
         return True
 
 # 테스트를 위한 직접 실행 로직
 if __name__ == "__main__":
-    manager = HWNodeManager()
-    # 테스트 1: 기존 노드
-    print(manager.register_node("SAMPLE_MAC_123"))
-    # 테스트 2: 새로운 노드
-    print(manager.register_node("MAC_ABC_456"))
+    import tempfile
+    from sf_core import log as farm_log
+
+    if len(sys.argv) == 1 or sys.argv[1] != "--bench":
+        manager = HWNodeManager()
+        # 테스트 1: 기존 노드
+        print(manager.register_node("SAMPLE_MAC_123"))
+        # 테스트 2: 새로운 노드
+        print(manager.register_node("MAC_ABC_456"))
+        manager.flush()
+        sys.exit(0)
+
+    # 벤치마크/자가 점검: 1만 대 동시 등록 → 삭제 후 번호 재사용 없음 → 재시작 복구 → 스냅샷 압축
+    path = os.path.join(tempfile.mkdtemp(), 'hw_registry.json')
+    manager = HWNodeManager(path, compact_size=25000)
+    macs = [f"ESP32_{i:06d}" for i in range(10000)]
+    farm_log.setup(level="WARNING")  # 등록 로그 1만 줄은 숨김
+    t0 = time.perf_counter()
+    for mac in macs:
+        manager.register_node(mac)
+    manager.flush()
+    elapsed = time.perf_counter() - t0
+    manager.remove_node(macs[-1])
+    reused = manager.register_node("ESP32_LATE")["node_id"]
+    manager.flush()
+
+    reopened = HWNodeManager(path)
+    assert len(reopened.nodes) == 10001 and reopened.next_id == manager.next_id
+    assert reused == "NEW_NODE_10002" and reopened.find_by_node_id(reused)[0] == "ESP32_LATE"
+    reopened.compact()
+    again = HWNodeManager(path)
+    assert again.nodes == reopened.nodes and os.path.getsize(path + ".wal") == 0
+    print(f"✅ 노드 1만 대 등록 {elapsed * 1000:.0f} ms (WAL 그룹 커밋 {10000 // manager.commit_size}회), "
+          f"삭제 후 신규 번호 {reused}, 재시작/압축 후 {len(again.nodes)}대 복구")
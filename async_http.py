@@ -0,0 +1,268 @@
+import asyncio
+import inspect
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sf_core.log import get_logger
+
+logger = get_logger("http")
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 75
+SERVER_ERROR = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def frame_response(data):
+    """
+    핸들러가 Content-Length 없이 본문을 쓴 경우 길이 헤더를 보충합니다.
+    (HTTP/1.1 keep-alive에서 응답 경계를 알리기 위해 필요)
+    """
+    head_end = data.find(b"\r\n\r\n")
+    if head_end < 0:
+        return data
+    head = data[:head_end]
+    lower = head.lower()
+    if b"\r\ncontent-length:" in lower or b"\r\ntransfer-encoding:" in lower:
+        return data
+    body = data[head_end + 4:]
+    return head + b"\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+
+
+class AsyncHTTPServer:
+    """
+    asyncio.start_server 기반 HTTP/1.1 서버.
+    기존 BaseHTTPRequestHandler 하위 클래스의 라우트를 그대로 실행하되,
+    - 연결마다 코루틴 1개로 keep-alive / 파이프라이닝(순서대로 응답)을 처리하고
+    - 핸들러는 스레드 풀에서, 무거운 경로(heavy_prefixes)는 별도 풀에서 실행하여 서로 막지 않습니다.
+    - stream_routes의 경로는 코루틴(reader, writer, path, headers)이 연결을 넘겨받아 직접 응답합니다. (SSE 등)
+    - loop_routes의 경로는 함수(path, headers) -> 응답 bytes 를 이벤트 루프에서 바로 실행합니다. (메모리 데이터 전용)
+      코루틴 함수도 되며(스레드를 잡지 않는 롱 폴링 등), None을 반환하면 기존 핸들러가 처리합니다.
+    - static(StaticCache)에 있는 경로의 GET/HEAD는 이벤트 루프에서 메모리 캐시(또는 sendfile)로 바로 응답합니다.
+    - router를 주면 라우팅 전에 함수(path, headers) -> (path, 추가 헤더 dict)로 요청을 고쳐 씁니다.
+      (예: /farm/<이름>/... 접두사 제거 + 농장 헤더 지정. 같은 이름의 클라이언트 헤더는 버림)
+    - request_seconds(metrics.Histogram, 라벨 route/code)를 주면 요청마다 처리 시간을 기록합니다.
+      route 라벨은 metric_routes 중 일치하는 접두사, 정적 캐시 응답은 "static", 나머지는 "other"로 묶습니다. (SSE 제외)
+    """
+    def __init__(self, handler_class, heavy_prefixes=(), inline_paths=('/health',),
+                 io_workers=32, heavy_workers=2, stream_routes=None, loop_routes=None, router=None, static=None,
+                 request_seconds=None, metric_routes=()):
+        self.handler_class = handler_class
+        self.router = router
+        self.static = static
+        self.stream_routes = dict(stream_routes or {})
+        self.loop_routes = dict(loop_routes or {})
+        self.heavy_prefixes = tuple(heavy_prefixes)
+        self.inline_paths = set(inline_paths)
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="http-io")
+        self.heavy_executor = ThreadPoolExecutor(max_workers=heavy_workers, thread_name_prefix="http-heavy")
+        self.connections = 0
+        self.request_seconds = request_seconds
+        self.metric_routes = tuple(sorted(metric_routes, key=len, reverse=True))
+        self._route_labels = {}  # 경로 -> route 라벨 (크기 제한 캐시)
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self._serve_connection, host, port,
+                                          limit=MAX_HEADER_BYTES, reuse_address=True)
+
+    # ---------------------------------------------------------------- 연결 처리
+    async def _serve_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or ("0.0.0.0", 0)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(b"HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+
+                headers = self._parse_headers(head)
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    writer.write(b"HTTP/1.1 411 Length Required\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                try:
+                    length = int(headers.get('content-length', '0'))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    writer.write(b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                started = time.perf_counter()
+                body = await reader.readexactly(length) if length else b""
+
+                path = self._request_path(head)
+                keep_alive = self._keep_alive(head, headers)
+                if self.router is not None:
+                    new_path, extra = self.router(path, headers)
+                    if new_path != path or extra:
+                        head = self._rewrite_head(head, new_path, extra)
+                        headers.update((name.lower(), value) for name, value in extra.items())
+                        path = new_path
+                route = path.split('?', 1)[0]
+                if self.static is not None:
+                    method = head.split(b" ", 1)[0]
+                    entry = self.static.lookup(route) if method in (b"GET", b"HEAD") else None
+                    if entry is not None:
+                        status = await self.static.send(writer, entry, headers, head_only=method == b"HEAD")
+                        await writer.drain()
+                        if self.request_seconds is not None:
+                            self.request_seconds.labels("static", str(status)).observe(time.perf_counter() - started)
+                        if not keep_alive:
+                            break
+                        continue
+
+                stream = self.stream_routes.get(route)
+                if stream:
+                    await stream(reader, writer, path, headers)
+                    break
+
+                response = None
+                loop_handler = self.loop_routes.get(route)
+                if loop_handler:
+                    try:
+                        response = loop_handler(path, headers)
+                        if inspect.isawaitable(response):
+                            response = await response
+                    except Exception as e:
+                        logger.error("⚠️ [HTTP] Handler Error: %s", e, key=("handler-error", route), every=10)
+                        response, keep_alive = SERVER_ERROR, False
+                if response is None:
+                    response, keep_alive = await self._dispatch(head + body, path, peer)
+                writer.write(response)
+                await writer.drain()
+                if self.request_seconds is not None:
+                    self.request_seconds.labels(self._route_label(route), response[9:12].decode('latin-1')).observe(
+                        time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _route_label(self, route):
+        label = self._route_labels.get(route)
+        if label is None:
+            label = next((prefix for prefix in self.metric_routes if route.startswith(prefix)), "other")
+            if len(self._route_labels) < 4096:
+                self._route_labels[route] = label
+        return label
+
+    @staticmethod
+    def _keep_alive(head, headers):
+        """HTTP/1.1은 Connection: close가 없으면, HTTP/1.0은 Connection: keep-alive가 있을 때만 연결을 유지합니다."""
+        tokens = {t.strip() for t in headers.get('connection', '').lower().split(',')}
+        if head.split(b"\r\n", 1)[0].rstrip().endswith(b"HTTP/1.0"):
+            return 'keep-alive' in tokens
+        return 'close' not in tokens
+
+    @staticmethod
+    def _request_path(head):
+        line = head.split(b"\r\n", 1)[0].split(b" ")
+        return line[1].decode('latin-1') if len(line) > 1 else "/"
+
+    @staticmethod
+    def _rewrite_head(head, path, extra):
+        """요청 줄의 경로를 바꾸고 extra 헤더를 덮어씁니다."""
+        lines = head[:-4].split(b"\r\n")
+        method, _, rest = lines[0].partition(b" ")
+        version = rest.rpartition(b" ")[2] if b" " in rest else b"HTTP/1.0"
+        drop = {name.lower().encode('latin-1') for name in extra}
+        kept = [line for line in lines[1:] if line.partition(b":")[0].strip().lower() not in drop]
+        added = [f"{name}: {value}".encode('latin-1') for name, value in extra.items()]
+        return b"\r\n".join([method + b" " + path.encode('latin-1') + b" " + version] + kept + added) + b"\r\n\r\n"
+
+    @staticmethod
+    def _parse_headers(head):
+        headers = {}
+        for line in head.split(b"\r\n")[1:]:
+            name, sep, value = line.partition(b":")
+            if sep:
+                headers[name.strip().lower().decode('latin-1')] = value.strip().decode('latin-1')
+        return headers
+
+    # ---------------------------------------------------------------- 핸들러 실행
+    async def _dispatch(self, raw, path, peer):
+        route = path.split('?', 1)[0]
+        if route in self.inline_paths:
+            return self._run_handler(raw, peer, route)
+        executor = self.heavy_executor if route.startswith(self.heavy_prefixes) else self.io_executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._run_handler, raw, peer, route)
+
+    def _run_handler(self, raw, peer, route):
+        """요청 1건을 메모리 버퍼 위에서 기존 핸들러로 처리합니다. 반환값: (응답 바이트, keep-alive 여부)"""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.rfile = io.BytesIO(raw)
+        handler.wfile = io.BytesIO()
+        handler.client_address = peer
+        handler.server = self
+        handler.request = None
+        handler.directory = os.getcwd()
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except Exception as e:
+            logger.error("⚠️ [HTTP] Handler Error: %s", e, key=("handler-error", route), every=10)
+            return SERVER_ERROR, False
+        return frame_response(handler.wfile.getvalue()), not handler.close_connection
+
+
+if __name__ == "__main__":
+    # 자가 점검: 스레드 핸들러/루프 경로가 예외를 던지면 연결이 끊기지 않고 500으로 응답, HTTP/1.0은 keep-alive 요청 시에만 연결 유지
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/boom":
+                raise RuntimeError("boom")
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    def loop_boom(path, headers):
+        raise RuntimeError("loop boom")
+
+    async def request(port, raw):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        try:
+            reply = await asyncio.wait_for(reader.read(), 1.0)
+            closed = True
+        except asyncio.TimeoutError:
+            reply, closed = b"", False
+        writer.close()
+        return reply, closed
+
+    async def demo():
+        server = AsyncHTTPServer(Handler, loop_routes={"/loop-boom": loop_boom})
+        httpd = await server.start("127.0.0.1", 0)
+        port = httpd.sockets[0].getsockname()[1]
+        for path in ("/boom", "/loop-boom"):
+            reply, closed = await request(port, f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            assert reply.startswith(b"HTTP/1.1 500") and closed, reply
+        reply, closed = await request(port, b"GET /ok HTTP/1.0\r\n\r\n")
+        assert b"ok" in reply and closed
+        _, closed = await request(port, b"GET /ok HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+        assert not closed
+        await asyncio.sleep(0.05)   # 클라이언트가 닫은 keep-alive 연결을 서버 코루틴이 정리할 틈
+        httpd.close()
+        print("✅ 핸들러 예외 → 500 응답, HTTP/1.0 keep-alive 판정 확인")
+
+    asyncio.run(demo())
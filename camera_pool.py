@@ -0,0 +1,272 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+
+import requests
+
+from sf_core.log import get_logger
+
+logger = get_logger("camera")
+
+SOI, EOI = b"\xff\xd8", b"\xff\xd9"
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+
+
+class Camera:
+    """
+    카메라 1대에 대한 장기 연결.
+    - MJPEG(multipart) 스트림은 연결 1개를 유지하며 JPEG 경계(SOI/EOI)로 프레임을 잘라 최신 프레임만 보관합니다.
+    - 정지 이미지 URL은 keep-alive 세션으로 poll_interval마다 다시 받습니다.
+    연결이 끊기면 지수 백오프로 재연결합니다. 프레임은 JPEG bytes로 보관되고, 디코드는 분석 워커에서 수행됩니다.
+    """
+    def __init__(self, cam_id, url, name=None, poll_interval=5.0, timeout=10.0, scale=0.5, roi=None):
+        self.cam_id = cam_id
+        self.url = url
+        self.name = name or cam_id
+        self.scale = scale  # 정기 분석 축소 배율
+        self.roi = tuple(roi) if roi else None  # 정기 분석 관심 영역 (x, y, w, h) 비율
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.frame = None        # 최신 JPEG bytes
+        self.frame_time = 0.0
+        self.frame_seq = 0
+        self.connects = 0
+        self.connected = False
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"cam-{self.cam_id}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self):
+        """반환값: (JPEG bytes 또는 None, 수신 시각, 프레임 순번)"""
+        with self._lock:
+            return self.frame, self.frame_time, self.frame_seq
+
+    def _store(self, jpeg):
+        with self._lock:
+            self.frame = bytes(jpeg)
+            self.frame_time = time.time()
+            self.frame_seq += 1
+
+    def _run(self):
+        backoff = 1.0
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                with session.get(self.url, stream=True, timeout=self.timeout) as resp:
+                    resp.raise_for_status()
+                    self.connects += 1
+                    self.connected = True
+                    backoff = 1.0
+                    content_type = resp.headers.get('Content-Type', '').lower()
+                    if 'multipart' in content_type:
+                        self._read_stream(resp)
+                    else:
+                        self._store(resp.content)
+                        self._stop.wait(self.poll_interval)
+            except Exception as e:
+                self.last_error = str(e)
+                self.connected = False
+                logger.warning("⚠️ [Camera] %s 연결 오류, %.0f초 후 재연결: %s", self.cam_id, backoff, e, key=("camera", self.cam_id), every=60)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+        self.connected = False
+        session.close()
+
+    @staticmethod
+    def _chunks(resp):
+        """도착한 만큼 바로 돌려주는 청크 반복자 (urllib3 2.x read1, 그 외에는 작은 고정 청크)"""
+        read1 = getattr(resp.raw, 'read1', None)
+        if read1 is None:
+            yield from resp.iter_content(chunk_size=4096)
+            return
+        while True:
+            chunk = read1(65536)
+            if not chunk:
+                return
+            yield chunk
+
+    def _read_stream(self, resp):
+        buf = bytearray()
+        for chunk in self._chunks(resp):
+            if self._stop.is_set():
+                return
+            buf += chunk
+            # 버퍼에 쌓인 완성 프레임 중 마지막 것만 보관
+            latest = None
+            while True:
+                start = buf.find(SOI)
+                if start < 0:
+                    buf.clear()
+                    break
+                end = buf.find(EOI, start + 2)
+                if end < 0:
+                    del buf[:start]
+                    break
+                latest = buf[start:end + 2]
+                del buf[:end + 2]
+            if latest is not None:
+                self._store(latest)
+            if len(buf) > MAX_FRAME_BYTES:
+                buf.clear()
+        raise ConnectionError("stream closed")
+
+
+class CameraPool:
+    """
+    camera_config.json([{"id", "name", "url", "scale"?, "roi"?}, ...])에 등록된 카메라마다 장기 연결을 유지하고,
+    run()으로 주기적으로 모든 카메라의 최신 프레임을 제한된 동시성으로 생육 분석합니다.
+    정기 분석은 카메라별 축소 배율/관심 영역으로 수행하며 결과 이미지는 만들지 않습니다.
+    """
+    def __init__(self, config_path=None, cameras=None):
+        self.cameras = {}
+        self.results = {}  # cam_id -> 마지막 분석 결과
+        self._analyzed_seq = {}
+        entries = cameras
+        if entries is None and config_path and os.path.exists(config_path):
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("⚠️ [Camera] 카메라 설정 로드 실패: %s", e)
+        for entry in entries or []:
+            cam = Camera(entry['id'], entry['url'], entry.get('name'), entry.get('poll_interval', 5.0),
+                         scale=float(entry.get('scale', 0.5)), roi=entry.get('roi'))
+            self.cameras[cam.cam_id] = cam
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def start(self):
+        for cam in self.cameras.values():
+            cam.start()
+        if self.cameras:
+            logger.info("📷 [Camera] 카메라 %d대 장기 연결 시작", len(self.cameras))
+        return self
+
+    def stop(self):
+        for cam in self.cameras.values():
+            cam.stop()
+
+    def find(self, url):
+        """URL이 등록된 카메라면 해당 Camera를 반환합니다."""
+        for cam in self.cameras.values():
+            if cam.url == url:
+                return cam
+        return None
+
+    def status(self):
+        now = time.time()
+        return [{
+            "id": cam.cam_id,
+            "name": cam.name,
+            "connected": cam.connected,
+            "connects": cam.connects,
+            "frames": cam.frame_seq,
+            "frame_age": round(now - cam.frame_time, 1) if cam.frame_time else None,
+            "last_error": cam.last_error,
+            "last_result": self.results.get(cam.cam_id),
+        } for cam in self.cameras.values()]
+
+    async def analyze_once(self, jobs, worker, concurrency=2, wait_timeout=120):
+        """새 프레임이 있는 카메라만 골라 분석 작업을 제출하고, 동시에 concurrency개까지만 진행합니다."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze(cam):
+            async with semaphore:
+                jpeg, _, seq = cam.latest()
+                task = functools.partial(worker, scale=cam.scale, roi=cam.roi, render=False)
+                job_id = jobs.submit(jpeg, worker=task, camera=cam.cam_id)
+                if job_id is None:
+                    return
+                job = await asyncio.to_thread(jobs.wait, job_id, wait_timeout)
+                if job and job.get("result"):
+                    self.results[cam.cam_id] = job["result"]
+                    self._analyzed_seq[cam.cam_id] = seq
+
+        targets = [cam for cam in self.cameras.values()
+                   if cam.frame is not None and cam.frame_seq != self._analyzed_seq.get(cam.cam_id)]
+        await asyncio.gather(*(analyze(cam) for cam in targets))
+        return len(targets)
+
+    async def run(self, jobs, worker, interval=600, concurrency=2):
+        """interval초마다 전체 카메라 생육 분석"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                count = await self.analyze_once(jobs, worker, concurrency)
+                if count:
+                    logger.info("📷 [Camera] 정기 생육 분석 %d대 완료", count)
+            except Exception as e:
+                logger.error("⚠️ [Camera] 정기 분석 오류: %s", e, key="camera-analysis", every=300)
+
+
+if __name__ == "__main__":
+    # 자가 점검: 로컬 MJPEG 대역 서버(카메라 3대) → 카메라당 연결 1개 유지, 최신 프레임 갱신, 동시성 2로 정기 분석
+    import tempfile
+    import cv2
+    import numpy as np
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from vision_jobs import VisionJobQueue
+    import vision_analysis
+
+    opened = []
+
+    class FakeMJPEG(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            opened.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.end_headers()
+            try:
+                for i in range(10 ** 6):
+                    img = np.zeros((240, 320, 3), np.uint8)
+                    w = 40 + i % 200
+                    img[60:180, 20:20 + w] = (40, 180, 40)
+                    jpeg = cv2.imencode('.jpg', img)[1].tobytes()
+                    self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg)
+                                     + jpeg + b"\r\n")
+                    time.sleep(0.05)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMJPEG)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.chdir(tempfile.mkdtemp())  # 분석 결과 이미지(html/analysis_result.jpg)는 임시 폴더에 저장
+    os.makedirs("html")
+    jobs = VisionJobQueue(vision_analysis.analyze_plant_growth, os.path.join(tempfile.mkdtemp(), "growth_log.json")).start()
+    pool = CameraPool(cameras=[{"id": f"CAM-0{i}", "url": f"{base}/cam{i}/stream"} for i in range(1, 4)]).start()
+
+    async def demo():
+        await asyncio.sleep(1.0)
+        first = {s["id"]: s["frames"] for s in pool.status()}
+        for _ in range(3):
+            assert await pool.analyze_once(jobs, vision_analysis.analyze_jpeg, concurrency=2) == 3
+            await asyncio.sleep(0.3)
+        return first
+
+    first = asyncio.run(demo())
+    status = pool.status()
+    assert len(opened) == 3 and all(s["connects"] == 1 for s in status)
+    assert all(s["frames"] > first[s["id"]] for s in status)
+    print(f"✅ 카메라 3대, 서버 연결 {len(opened)}회, 정기 분석 3회 × 3대, 생육 기록 {jobs.flush()}건")
+    for s in status:
+        print(f"   {s['id']}: 프레임 {s['frames']}개, 마지막 비율 {s['last_result']['ratio']}%")
+    pool.stop()
@@ -0,0 +1,299 @@
+import json
+import os
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 작물별 GDD 기준 온도(℃). zone_config의 "base_temp" 또는 호출 인자로 덮어쓸 수 있습니다.
+BASE_TEMPS = {"lettuce": 4.0, "strawberry": 5.0, "tomato": 10.0, "basil": 10.0, "cucumber": 10.0}
+DEFAULT_BASE_TEMP = 10.0
+UPPER_TEMP = 30.0         # 이 온도 이상은 생육 누적에 더 기여하지 않음
+DEFAULT_TEMP = 20.0       # 온도 기록도 작물 정보도 없을 때의 가정값
+STAGES = ("transplant", "planting", "harvest")
+MATURE_RATIO = 95.0       # 수확기 피복률(%) - 생육 기록 비율을 진행도로 환산할 때 사용
+MEASURED_WEIGHT = 0.3     # 최근 실측 진행도 반영 비율
+MEASURED_MAX_AGE = 7      # 이보다 오래된 실측은 반영하지 않음(일)
+TREND_DAYS = 7            # 예측 온도 = 최근 N일 평균
+MAX_HISTORY_DAYS = 5 * 365  # 이보다 이른 파종일은 기록 구간을 잘라 계산 (구역 결과에 history_truncated 표시)
+
+
+def _date(text):
+    return datetime.strptime(str(text)[:10], "%Y-%m-%d").date()
+
+
+def _schedule_error(zone):
+    """구역 일정의 날짜 형식 오류 (정상이면 None)"""
+    schedule = zone.get("schedule") or {}
+    if not isinstance(schedule, dict):
+        return "schedule 형식 오류"
+    for stage in ("sowing",) + STAGES:
+        if stage in schedule:
+            try:
+                _date(schedule[stage])
+            except ValueError:
+                return f"{stage} 날짜 형식 오류: {schedule[stage]!r}"
+    return None
+
+
+def optimal_temp(catalog, crop):
+    """작물 카탈로그의 단계별 적정 온도 범위 중간값 평균 (없으면 None)"""
+    stages = (catalog or {}).get(crop) or {}
+    mids = [(s["Temp"]["min"] + s["Temp"]["max"]) / 2 for s in stages.values() if "Temp" in s]
+    return sum(mids) / len(mids) if mids else None
+
+
+def forecast_zones(zones, temps, hist_start, today=None, horizon=120, base_temps=None,
+                   catalog=None, measured=None, upper_temp=UPPER_TEMP):
+    """
+    모든 구역의 누적 GDD, 단계 전환/수확 예상일을 한 번의 배열 연산으로 계산합니다.
+
+    zones: zone_config.json 항목 목록 (id, crop, schedule{sowing, transplant, planting, harvest})
+    temps: (구역 수, 기록 일수) 일평균 온도 배열, 결측은 NaN. 0열이 hist_start 날짜
+    horizon: 오늘 이후 예측 일수
+    base_temps: {작물 또는 구역 ID: 기준 온도} 덮어쓰기
+    measured: {구역 ID: [(날짜, 피복률%), ...]} 실측 생육 비율 (최근 값이 GDD 진행도에 가중 반영)
+    반환값: 구역별 결과 dict 목록
+    """
+    today = today or datetime.now().date()
+    n = len(zones)
+    temps = np.asarray(temps, dtype=np.float64).reshape(n, -1)
+    hist_days = (today - hist_start).days + 1
+    if temps.shape[1] < hist_days:
+        temps = np.pad(temps, ((0, 0), (0, hist_days - temps.shape[1])), constant_values=np.nan)
+    temps = temps[:, :hist_days]
+    overrides = base_temps or {}
+
+    # 1. 구역별 파라미터 벡터
+    base = np.empty(n)
+    fallback = np.empty(n)
+    offsets = np.empty((n, 1 + len(STAGES)), dtype=np.int64)  # 파종 및 각 단계까지의 계획 일수
+    for i, zone in enumerate(zones):
+        crop = zone.get("crop")
+        base[i] = overrides.get(zone["id"], overrides.get(crop, zone.get("base_temp", BASE_TEMPS.get(crop, DEFAULT_BASE_TEMP))))
+        opt = optimal_temp(catalog, crop)
+        fallback[i] = opt if opt is not None else DEFAULT_TEMP
+        schedule = zone.get("schedule") or {}
+        sowing = _date(schedule.get("sowing", today))
+        offsets[i, 0] = (sowing - hist_start).days
+        prev = sowing
+        for s, stage in enumerate(STAGES, 1):
+            prev = _date(schedule[stage]) if stage in schedule else prev
+            offsets[i, s] = (prev - sowing).days
+
+    # 2. 결측 보정 및 미래 온도 (최근 평균, 없으면 작물 적정 온도)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 기록이 전혀 없는 구역의 nanmean
+        zone_mean = np.nanmean(temps, axis=1)
+        recent = np.nanmean(temps[:, -TREND_DAYS:], axis=1)
+    zone_mean = np.where(np.isnan(zone_mean), fallback, zone_mean)
+    recent = np.where(np.isnan(recent), zone_mean, recent)
+    hist = np.where(np.isnan(temps), zone_mean[:, None], temps)
+    future = np.repeat(recent[:, None], horizon, axis=1)
+    series = np.concatenate([hist, future], axis=1)  # (구역, 기록+예측 일수)
+
+    # 3. GDD 누적 (파종일 이전은 0)
+    days = np.arange(series.shape[1])
+    daily = np.clip(np.minimum(series, upper_temp) - base[:, None], 0, None)
+    daily *= days[None, :] >= offsets[:, :1]
+    cum = np.cumsum(daily, axis=1)
+
+    # 4. 단계별 GDD 목표 = 계획 일수 × 적정 온도에서의 일 GDD
+    rate = np.clip(np.minimum(fallback, upper_temp) - base, 0.1, None)
+    targets = offsets[:, 1:] * rate[:, None]                      # (구역, 단계)
+    harvest_gdd = targets[:, -1]
+    today_idx = hist_days - 1
+    gdd_now = cum[:, today_idx]
+
+    # 5. 실측 생육 비율 가중 → 수확까지 남은 GDD
+    progress_gdd = np.where(harvest_gdd > 0, gdd_now / np.maximum(harvest_gdd, 1e-9), 1.0)
+    progress = progress_gdd.copy()
+    measured_ratio = np.full(n, np.nan)
+    for i, zone in enumerate(zones):
+        points = [(d, r) for d, r in (measured or {}).get(zone["id"], []) if 0 <= (today - d).days <= MEASURED_MAX_AGE]
+        if points:
+            measured_ratio[i] = max(points)[1]
+    has_measure = ~np.isnan(measured_ratio)
+    progress[has_measure] = ((1 - MEASURED_WEIGHT) * progress_gdd[has_measure]
+                             + MEASURED_WEIGHT * np.clip(measured_ratio[has_measure] / MATURE_RATIO, 0, 1))
+    # 보정된 진행도만큼 수확 목표를 앞당기거나 늦춤 (남은 GDD = (1 - 진행도) × 수확 GDD)
+    adjusted = targets.copy()
+    adjusted[has_measure, -1] = gdd_now[has_measure] + np.clip(1 - progress[has_measure], 0, None) * harvest_gdd[has_measure]
+
+    # 6. 누적 GDD가 목표에 처음 도달하는 날 (누적합은 단조 증가 → 목표 미만인 날 수)
+    reached = (cum[:, :, None] < adjusted[:, None, :]).sum(axis=1)  # (구역, 단계)
+    reached = np.maximum(reached, offsets[:, :1])
+    within = reached < series.shape[1]
+    current_stage = (gdd_now[:, None] >= targets).sum(axis=1)
+
+    results = []
+    for i, zone in enumerate(zones):
+        schedule = zone.get("schedule") or {}
+        projected = {stage: (hist_start + timedelta(days=int(reached[i, s]))).isoformat() if within[i, s] else None
+                     for s, stage in enumerate(STAGES)}
+        planned = schedule.get("harvest")
+        delay = None
+        if planned and projected["harvest"]:
+            delay = (_date(projected["harvest"]) - _date(planned)).days
+        results.append({
+            "id": zone["id"],
+            "name": zone.get("name"),
+            "crop": zone.get("crop"),
+            "base_temp": float(base[i]),
+            "gdd_to_date": round(float(gdd_now[i]), 1),
+            "harvest_gdd": round(float(harvest_gdd[i]), 1),
+            "progress": round(float(min(progress[i], 1.0)) * 100, 1),
+            "measured_ratio": None if np.isnan(measured_ratio[i]) else float(measured_ratio[i]),
+            "stage": (("sowing",) + STAGES)[int(current_stage[i])],
+            "projected": projected,
+            "planned_harvest": planned,
+            "harvest_delay_days": delay,
+            "forecast_temp": round(float(recent[i]), 1),
+            "history_truncated": bool(offsets[i, 0] < 0),
+        })
+    return results
+
+
+def load_zone_temperatures(store, zone_ids, start_date, end_date):
+    """
+    TSDB 1일 롤업에서 구역별 일평균 온도 배열을 만듭니다. (노드 ID 접두어로 구역 판별)
+    반환값: (구역 수, 일수) 배열, 결측은 NaN
+    """
+    days = (end_date - start_date).days + 1
+    temps = np.full((len(zone_ids), days), np.nan)
+    dev_ids = store.devices_matching(["온도", "Temp"])
+    if len(dev_ids) == 0 or days <= 0:
+        return temps
+
+    # 장치 -> 구역 인덱스 (가장 긴 접두어 일치)
+    order = sorted(range(len(zone_ids)), key=lambda z: -len(zone_ids[z]))
+    dev_zone = np.full(len(store.devices), -1)
+    for dev in dev_ids.tolist():
+        node_id = store.devices[dev]["node_id"]
+        dev_zone[dev] = next((z for z in order if node_id.startswith(zone_ids[z])), -1)
+
+    start_ts = int(datetime.combine(start_date, datetime.min.time()).timestamp())
+    _, aggs = store.rollup(86400, start_ts, start_ts + days * 86400, dev_ids)
+    if len(aggs) == 0:
+        return temps
+    zone = dev_zone[aggs['dev']]
+    day = ((aggs['ts'] - start_ts) // 86400).astype(np.int64)
+    ok = (zone >= 0) & (day >= 0) & (day < days)
+    sums = np.zeros(temps.shape)
+    counts = np.zeros(temps.shape)
+    np.add.at(sums, (zone[ok], day[ok]), aggs['sum'][ok])
+    np.add.at(counts, (zone[ok], day[ok]), aggs['count'][ok])
+    np.divide(sums, counts, out=temps, where=counts > 0)
+    return temps
+
+
+def load_measured(growth_log_path, zone_ids, camera_zones=None):
+    """
+    growth_log.json의 실측 피복률을 구역별로 묶습니다.
+    항목의 "zone" 또는 카메라 설정의 구역("camera" -> zone)을 따르며,
+    구역 정보가 없는 예전 항목은 자체 실측이 없는 모든 구역에 적용합니다.
+    """
+    try:
+        with open(growth_log_path, 'r', encoding='utf-8') as f:
+            logs = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    by_zone, shared = {}, []
+    for entry in logs:
+        try:
+            point = (_date(entry["date"]), float(entry["ratio"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        zone = entry.get("zone") or (camera_zones or {}).get(entry.get("camera"))
+        if zone:
+            by_zone.setdefault(zone, []).append(point)
+        else:
+            shared.append(point)
+    return {z: by_zone.get(z, shared) for z in zone_ids if by_zone.get(z, shared)}
+
+
+def run_forecast(data_dir, store=None, horizon=120, base_temps=None, today=None):
+    """DATA_DIR의 구역 설정/작물 카탈로그/TSDB/생육 기록으로 전체 구역 예측을 수행합니다."""
+    today = today or datetime.now().date()
+
+    def load(name, default):
+        try:
+            with open(os.path.join(data_dir, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return default
+
+    zones = [z for z in load('zone_config.json', []) if "id" in z]
+    if not zones:
+        return {"success": False, "error": "zone_config.json에 구역이 없습니다.", "zones": []}
+    # 일정 날짜가 잘못된 구역은 빼고 나머지 구역만 예측 (skipped에 사유 표시)
+    checked = [(z, _schedule_error(z)) for z in zones]
+    skipped = [{"id": z["id"], "error": err} for z, err in checked if err]
+    zones = [z for z, err in checked if err is None]
+    if not zones:
+        return {"success": False, "error": "일정이 올바른 구역이 없습니다.", "zones": [], "skipped": skipped}
+    catalog = load('catalog_crop.json', {})
+    camera_zones = {c["id"]: c["zone"] for c in load('camera_config.json', []) if "id" in c and c.get("zone")}
+
+    sowings = [_date((z.get("schedule") or {}).get("sowing", today)) for z in zones]
+    hist_start = min(min(sowings), today)
+    hist_start = max(hist_start, today - timedelta(days=MAX_HISTORY_DAYS))
+    zone_ids = [z["id"] for z in zones]
+    if store is None and os.path.isdir(os.path.join(data_dir, 'tsdb')):
+        from tsdb_store import TimeSeriesStore
+        store = TimeSeriesStore(data_dir)
+    temps = (load_zone_temperatures(store, zone_ids, hist_start, today) if store is not None
+             else np.full((len(zones), (today - hist_start).days + 1), np.nan))
+    measured = load_measured(os.path.join(data_dir, 'growth_log.json'), zone_ids, camera_zones)
+
+    results = forecast_zones(zones, temps, hist_start, today, horizon, base_temps, catalog, measured)
+    return {"success": True, "today": today.isoformat(), "horizon": horizon, "zones": results, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    # 벤치마크: 구역 500개 × 기록 365일 + 예측 180일, 배열 연산 1회 vs 구역별 파이썬 루프
+    import time
+
+    rng = np.random.default_rng(0)
+    today = datetime.now().date()
+    hist_start = today - timedelta(days=364)
+    crops = list(BASE_TEMPS)
+    zones = []
+    for i in range(500):
+        sow = hist_start + timedelta(days=int(rng.integers(0, 300)))
+        zones.append({"id": f"Z{i:03d}", "crop": crops[i % len(crops)], "schedule": {
+            "sowing": sow.isoformat(),
+            "transplant": (sow + timedelta(days=14)).isoformat(),
+            "planting": (sow + timedelta(days=30)).isoformat(),
+            "harvest": (sow + timedelta(days=int(rng.integers(45, 120)))).isoformat()}})
+    temps = 18 + 6 * np.sin(np.arange(365) / 58.0)[None, :] + rng.normal(0, 2, (500, 365))
+    temps[rng.random(temps.shape) < 0.05] = np.nan
+    catalog = {c: {"growth": {"Temp": {"min": 18.0, "max": 24.0}}} for c in crops}
+
+    t0 = time.perf_counter()
+    fast = forecast_zones(zones, temps, hist_start, today, 180, catalog=catalog)
+    fast_ms = (time.perf_counter() - t0) * 1000
+
+    # 기준 구현: 구역마다 하루씩 누적 (기존 growth_model 방식의 반복)
+    t0 = time.perf_counter()
+    slow = []
+    for i, zone in enumerate(zones):
+        base = BASE_TEMPS[zone["crop"]]
+        row = temps[i]
+        mean = float(np.nanmean(row))
+        recent = float(np.nanmean(row[-TREND_DAYS:]))
+        sow = (_date(zone["schedule"]["sowing"]) - hist_start).days
+        harvest_days = (_date(zone["schedule"]["harvest"]) - _date(zone["schedule"]["sowing"])).days
+        target = harvest_days * max(min(21.0, UPPER_TEMP) - base, 0.1)
+        total, found = 0.0, None
+        for d in range(365 + 180):
+            t = recent if d >= 365 else (mean if np.isnan(row[d]) else row[d])
+            if d >= sow:
+                total += max(min(t, UPPER_TEMP) - base, 0)
+            if found is None and d >= sow and total >= target:
+                found = d
+        slow.append(None if found is None else (hist_start + timedelta(days=found)).isoformat())
+    loop_ms = (time.perf_counter() - t0) * 1000
+
+    assert [r["projected"]["harvest"] for r in fast] == slow
+    print(f"구역 500개 × 545일: 배열 연산 {fast_ms:.1f} ms / 구역별 루프 {loop_ms:.1f} ms ({loop_ms / fast_ms:.1f}x), 수확 예상일 일치")
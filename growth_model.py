@@ -1,27 +1,34 @@
 import numpy as np
+import csv
+import io
 import json
+import math
 import os
-import pandas as pd
+import threading
 from datetime import datetime, timedelta
 
 # 1. 환경 설정
 BASE_TEMP = 10.0
+WINDOW_DAYS = 10
+
+# (DATA_DIR, 기간) -> (데이터 버전, 결과). 데이터가 바뀌지 않았으면 재계산 없이 반환
+_MEMO = {}
+_MEMO_LOCK = threading.Lock()
 
 def safe_val(x):
     try:
-        if pd.isna(x) or (isinstance(x, float) and (np.isnan(x) or np.isinf(x))):
-            return None
-        return float(x)
-    except:
+        v = float(x)
+    except (TypeError, ValueError):
         return None
+    return v if math.isfinite(v) else None
 
 def generate_mock_data(days=10, reason=""):
     """v4.5: 데이터가 없으면 즉석에서 완벽한 10일치 시뮬레이션 데이터를 생성"""
     end_date = datetime.now().date()
     dates = [(end_date - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days-1, -1, -1)]
     return {
-        "success": True, 
-        "demo": True, 
+        "success": True,
+        "demo": True,
         "error_context": reason,
         "dates": dates,
         "temp": [round(20 + i*0.5 + np.sin(i)*2, 2) for i in range(days)],
@@ -32,69 +39,263 @@ def generate_mock_data(days=10, reason=""):
         "cumulative_gdd": [round(15.0 * (i+1), 2) for i in range(days)]
     }
 
-def run_analysis_data():
+def resolve_data_dir():
     PORT = str(os.environ.get('PORT', '8007'))
     DATA_DIR = os.environ.get('DATA_DIR', 'data').strip()
-    
+
     # 🔎 v4.5: 경로 자동 감지 로직 강화
     if DATA_DIR == 'data' or not DATA_DIR:
         if PORT == '8001' and os.path.exists('seoul_data'): DATA_DIR = 'seoul_data'
         elif PORT == '8002' and os.path.exists('busan_data'): DATA_DIR = 'busan_data'
+    return DATA_DIR
+
+def run_analysis_data(store=None, days=WINDOW_DAYS, data_dir=None):
+    """
+    최근 N일 환경 데이터와 누적 GDD를 계산합니다.
+    store: 서버가 쓰고 있는 TimeSeriesStore (없으면 DATA_DIR/tsdb를 직접 엶)
+    data_dir: 농장 데이터 폴더 (없으면 환경 변수 DATA_DIR/PORT로 결정)
+    결과는 (DATA_DIR, 기간, 데이터 버전)으로 메모이즈되어, 새 데이터가 없으면 즉시 반환됩니다.
+    """
+    DATA_DIR = data_dir or resolve_data_dir()
+    end_date = datetime.now().date()
+    version = data_version(DATA_DIR, end_date, days)
+    key = (os.path.abspath(DATA_DIR), days)
+    with _MEMO_LOCK:
+        cached = _MEMO.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    result = compute_analysis(DATA_DIR, end_date, days, store)
+    with _MEMO_LOCK:
+        _MEMO[key] = (version, result)
+    return result
 
-    csv_path = os.path.join(DATA_DIR, 'smartfarm_tsdb.csv')
-    
+def compute_analysis(DATA_DIR, end_date, days=WINDOW_DAYS, store=None):
     try:
-        # 데이터가 아예 없거나 경로가 잘못된 경우 즉시 데모 데이터 반환
-        if not os.path.exists(csv_path) or os.path.getsize(csv_path) < 100:
-             return generate_mock_data(10, f"CSV Empty or Not Found ({DATA_DIR})")
-
-        # 📊 데이터 로드
-        df = pd.read_csv(csv_path)
-        if df.empty or len(df) < 5: 
-            return generate_mock_data(10, "Not enough data in CSV")
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['date'] = df['timestamp'].dt.date
-        
-        # 🔄 피벗 (일별 평균)
-        pivot_df = df.pivot_table(index='date', columns='device_name', values='value', aggfunc='mean').reset_index()
-        
-        # 📅 10일 타임라인에 맞춰 데이터 정렬
-        end_date = datetime.now().date()
-        date_range = [end_date - timedelta(days=i) for i in range(9, -1, -1)]
-        timeline_df = pd.DataFrame({'date': date_range})
-        full_df = pd.merge(timeline_df, pivot_df, on='date', how='left').sort_values('date')
-            
-        def find_col(df, kws):
-            for col in df.columns:
-                c = str(col).lower()
-                if any(kw.lower() in c for kw in kws): return col
+        # 📈 TSDB 1일 롤업이 있으면 원시 데이터 대신 일별 집계만 읽음
+        daily = load_daily_rollups(DATA_DIR, days, store, end_date)
+        if daily is None:
+            # 📄 레거시 월별 CSV: 기간에 해당하는 파티션만, 마지막으로 읽은 위치 이후의 새 줄만 집계
+            daily = load_daily_csv(DATA_DIR, days, end_date)
+            if daily is None:
+                return generate_mock_data(days, f"CSV Empty or Not Found ({DATA_DIR})")
+            if daily[2] < 5:
+                return generate_mock_data(days, "Not enough data in CSV")
+
+        res_dates, columns = daily[0], daily[1]
+        names = list(columns.keys())
+        t_col = find_col(names, ['온도', 'temp'])
+        h_col = find_col(names, ['습도', 'humi'])
+        l_col = find_col(names, ['조도', 'light', 'ppfd', 'lux'])
+        return build_result(
+            res_dates,
+            columns[t_col] if t_col else [None]*days,
+            columns[h_col] if h_col else [None]*days,
+            columns[l_col] if l_col else [None]*days,
+        )
+
+    except Exception as e:
+        return generate_mock_data(days, str(e))
+
+def find_col(columns, kws):
+    for col in columns:
+        c = str(col).lower()
+        if any(kw.lower() in c for kw in kws): return col
+    return None
+
+def window_dates(end_date, days):
+    return [end_date - timedelta(days=i) for i in range(days-1, -1, -1)]
+
+def csv_partitions(data_dir, end_date, days):
+    """기간에 걸치는 월별 CSV 파티션(tsdb_YYYY_MM.csv)과 단일 레거시 파일 중 존재하는 것"""
+    months = sorted({(d.year, d.month) for d in window_dates(end_date, days)})
+    paths = [os.path.join(data_dir, f"tsdb_{y}_{m:02d}.csv") for y, m in months]
+    paths.append(os.path.join(data_dir, 'smartfarm_tsdb.csv'))
+    return [p for p in paths if os.path.exists(p)]
+
+def data_version(data_dir, end_date, days):
+    """
+    결과 메모이즈용 데이터 버전: 기준 날짜 + 롤업 상태 파일 + 기간 내 CSV 파티션의 (크기, 수정 시각).
+    TSDB는 기록할 때마다 rollup_state.json을 갱신하므로 stat만으로 새 데이터 유무를 알 수 있습니다.
+    """
+    def stat(path):
+        try:
+            st = os.stat(path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError:
             return None
+    return (end_date, stat(os.path.join(data_dir, 'tsdb', 'rollup_state.json')),
+            tuple((p, stat(p)) for p in csv_partitions(data_dir, end_date, days)))
 
-        t_col = find_col(full_df, ['온도', 'temp'])
-        h_col = find_col(full_df, ['습도', 'humi'])
-        l_col = find_col(full_df, ['조도', 'light', 'ppfd', 'lux'])
+def load_daily_rollups(data_dir, days=10, store=None, end_date=None):
+    """
+    TSDB의 1일 롤업에서 최근 N일의 장치 이름별 일평균을 읽습니다.
+    반환값: (날짜 목록, {device_name: [일평균 또는 None, ...]}) / 롤업이 없으면 None
+    """
+    if store is None:
+        if not os.path.isdir(os.path.join(data_dir, 'tsdb')):
+            return None
+        from tsdb_store import TimeSeriesStore
+        store = TimeSeriesStore(data_dir)
 
-        # 결과 리스트 (데이터 없으면 None으로 채움)
-        res_dates = [d.strftime('%Y-%m-%d') for d in full_df['date']]
-        res_temp = [safe_val(x) for x in (full_df[t_col] if t_col else [None]*10)]
-        res_humi = [safe_val(x) for x in (full_df[h_col] if h_col else [None]*10)]
-        res_light = [safe_val(x) for x in (full_df[l_col] if l_col else [None]*10)]
+    end_date = end_date or datetime.now().date()
+    start = datetime.combine(end_date - timedelta(days=days-1), datetime.min.time())
+    start_ts = int(start.timestamp())
+    _, aggs = store.rollup(86400, start_ts, start_ts + days * 86400)
+    if len(aggs) == 0:
+        return None
 
-        # ✅ 데이터가 너무 비어있으면(예: 전체가 None) 자동으로 Mock 데이터로 전환
-        if res_temp.count(None) > 8:
-            return generate_mock_data(10, "Real data is mostly empty")
+    # 같은 이름의 장치는 합산 후 평균 (pivot_table(aggfunc='mean')과 동일한 의미)
+    names = [store.devices[d]['name'] for d in aggs['dev'].tolist()]
+    day_idx = ((aggs['ts'] - start_ts) // 86400).astype(int)
+    sums, counts = {}, {}
+    for name, i, sm, cnt in zip(names, day_idx.tolist(), aggs['sum'].tolist(), aggs['count'].tolist()):
+        if not 0 <= i < days: continue
+        sums.setdefault(name, [0.0]*days)[i] += sm
+        counts.setdefault(name, [0]*days)[i] += cnt
+    columns = {name: [(sums[name][i] / counts[name][i]) if counts[name][i] else None for i in range(days)]
+               for name in sums}
+    dates = [d.strftime('%Y-%m-%d') for d in window_dates(end_date, days)]
+    return dates, columns
 
-        # GDD 계산
-        gdd = [(max(safe_val(x) - BASE_TEMP, 0) if safe_val(x) else 0) for x in res_temp]
+class CsvDailyAggregates:
+    """
+    CSV 파일별로 (날짜, 장치 이름) -> [합계, 건수] 일별 집계와 마지막으로 읽은 바이트 위치를 유지합니다.
+    파일이 커지면 늘어난 부분의 완성된 줄만 읽어 집계에 더하고, 작아지면(재작성) 처음부터 다시 읽습니다.
+    """
+    def __init__(self):
+        self.files = {}
+        self._lock = threading.Lock()
 
-        return {
-            "success": True, "dates": res_dates,
-            "temp": res_temp, "humi": res_humi, "light": res_light,
-            "ec": [1.5]*10, "ph": [6.2]*10,
-            "measured_growth": {"dates": [res_dates[0], res_dates[-1]], "ratios": [10, 95]},
-            "cumulative_gdd": np.cumsum(gdd).tolist()
-        }
+    def update(self, path):
+        with self._lock:
+            size = os.path.getsize(path)
+            st = self.files.get(path)
+            if st is None or size < st["offset"]:
+                st = self.files[path] = {"offset": 0, "columns": None, "sums": {}}
+            if size == st["offset"]:
+                return st["sums"]
 
-    except Exception as e:
-        return generate_mock_data(10, str(e))
+            with open(path, 'rb') as f:
+                f.seek(st["offset"])
+                data = f.read(size - st["offset"])
+            end = data.rfind(b"\n") + 1  # 기록 중인 마지막 줄은 다음에 읽음
+            if end == 0:
+                return st["sums"]
+            text = data[:end].decode('utf-8-sig' if st["offset"] == 0 else 'utf-8', errors='replace')
+            reader = csv.reader(io.StringIO(text))
+            if st["columns"] is None:
+                header = next(reader, [])
+                st["columns"] = {name.strip(): i for i, name in enumerate(header)}
+            cols = st["columns"]
+            ts_i, name_i, val_i = cols.get('timestamp'), cols.get('device_name'), cols.get('value')
+            if None not in (ts_i, name_i, val_i):
+                width = max(ts_i, name_i, val_i)
+                sums = st["sums"]
+                for row in reader:
+                    if len(row) <= width:
+                        continue
+                    try:
+                        val = float(row[val_i])
+                    except ValueError:
+                        continue
+                    agg = sums.get((row[ts_i][:10], row[name_i]))
+                    if agg is None:
+                        sums[(row[ts_i][:10], row[name_i])] = [val, 1]
+                    else:
+                        agg[0] += val
+                        agg[1] += 1
+            st["offset"] += end
+            return st["sums"]
+
+_CSV_DAILY = CsvDailyAggregates()
+
+def load_daily_csv(data_dir, days=10, end_date=None):
+    """
+    레거시 CSV 파티션에서 최근 N일의 장치 이름별 일평균을 읽습니다.
+    반환값: (날짜 목록, {device_name: [일평균 또는 None, ...]}, 기간 내 행 수) / 파일이 없으면 None
+    """
+    end_date = end_date or datetime.now().date()
+    paths = csv_partitions(data_dir, end_date, days)
+    if not paths:
+        return None
+    dates = [d.strftime('%Y-%m-%d') for d in window_dates(end_date, days)]
+    index = {d: i for i, d in enumerate(dates)}
+    sums, counts = {}, {}
+    rows = 0
+    for path in paths:
+        for (day, name), (sm, cnt) in _CSV_DAILY.update(path).items():
+            i = index.get(day)
+            if i is None:
+                continue
+            sums.setdefault(name, [0.0]*days)[i] += sm
+            counts.setdefault(name, [0]*days)[i] += cnt
+            rows += cnt
+    columns = {name: [(sums[name][i] / counts[name][i]) if counts[name][i] else None for i in range(days)]
+               for name in sums}
+    return dates, columns, rows
+
+def build_result(res_dates, temps, humis, lights):
+    days = len(res_dates)
+    res_temp = [safe_val(x) for x in temps]
+    res_humi = [safe_val(x) for x in humis]
+    res_light = [safe_val(x) for x in lights]
+
+    # ✅ 데이터가 너무 비어있으면(예: 전체가 None) 자동으로 Mock 데이터로 전환
+    if res_temp.count(None) > days - 2:
+        return generate_mock_data(days, "Real data is mostly empty")
+
+    # GDD 계산
+    gdd = [(max(safe_val(x) - BASE_TEMP, 0) if safe_val(x) else 0) for x in res_temp]
+
+    return {
+        "success": True, "dates": res_dates,
+        "temp": res_temp, "humi": res_humi, "light": res_light,
+        "ec": [1.5]*days, "ph": [6.2]*days,
+        "measured_growth": {"dates": [res_dates[0], res_dates[-1]], "ratios": [10, 95]},
+        "cumulative_gdd": np.cumsum(gdd).tolist()
+    }
+
+if __name__ == "__main__":
+    # 벤치마크: 월별 CSV 2개(약 20만 행) → 최초 계산 / 메모 적중 / 새 행 추가 후 증분 재계산
+    import tempfile
+    import time
+
+    root = tempfile.mkdtemp()
+    os.environ['DATA_DIR'] = root
+    today = datetime.now().date()
+    rng = np.random.default_rng(0)
+
+    def write_rows(start_day, count_days, mode):
+        files = {}
+        for d in range(count_days):
+            day = start_day + timedelta(days=d)
+            path = os.path.join(root, f"tsdb_{day.year}_{day.month:02d}.csv")
+            if path not in files:
+                new = not os.path.exists(path) or mode == 'w'
+                files[path] = open(path, mode if new else 'a', encoding='utf-8', newline='')
+                if new:
+                    files[path].write("timestamp,node_id,device_id,device_name,value,pin\n")
+            f = files[path]
+            for minute in range(0, 1440, 2):
+                ts = f"{day:%Y-%m-%d} {minute // 60:02d}:{minute % 60:02d}:00"
+                for name, base in (("온도 센서", 22), ("습도 센서", 60), ("조도 센서", 400)):
+                    for node in range(3):
+                        f.write(f"{ts},N{node},D,{name},{base + rng.normal():.2f},GPIO0\n")
+        for f in files.values():
+            f.close()
+
+    write_rows(today - timedelta(days=20), 20, 'w')
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - t0) * 1000
+
+    first, first_ms = timed(run_analysis_data)
+    _, hit_ms = timed(run_analysis_data)
+    write_rows(today, 1, 'a')
+    updated, incr_ms = timed(run_analysis_data)
+    rows = sum(sum(c for _, c in st["sums"].values()) for st in _CSV_DAILY.files.values())
+    assert not first.get("demo") and updated["temp"][-1] is not None and first["temp"][-1] is None
+    print(f"CSV {rows}행: 최초 {first_ms:.1f} ms / 메모 적중 {hit_ms:.3f} ms / 하루치 추가 후 증분 {incr_ms:.1f} ms")
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from gs_uploader import SHEETS_CALL_SECONDS
+from tsdb_store import TimeSeriesStore
+from sf_core.log import get_logger
+
+logger = get_logger("mirror")
+
+# 시트 헤더가 없거나 다를 때 사용하는 기본 열 순서 (tsdb_logger_task의 append_rows 행 형식)
+DEFAULT_COLUMNS = ["timestamp", "node_id", "device_id", "device_name", "value", "pin"]
+
+
+def _column_letter(n):
+    """1 -> A, 27 -> AA"""
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class SheetMirror:
+    """
+    Google Sheets 이력을 로컬 일자 파티션 저장소(TimeSeriesStore, subdir='gs_mirror')로 미러링합니다.
+    - 마지막으로 가져온 시트 행 번호를 sync_state.json에 기록하고, 매 동기화마다 그 이후 행만 구간 단위로 읽습니다.
+    - 이력 API 보충 조회는 시트가 아니라 이 미러의 롤업을 읽으므로 요청당 비용이 해당 일자 크기로 제한됩니다.
+    """
+    def __init__(self, data_dir, sheet=None, chunk_rows=5000):
+        self.sheet = sheet
+        self.chunk_rows = chunk_rows
+        self.store = TimeSeriesStore(data_dir, subdir='gs_mirror')
+        self.state_path = os.path.join(self.store.root, 'sync_state.json')
+        self._lock = threading.Lock()
+        self.state = {"next_row": 2, "columns": None}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    self.state.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("⚠️ [Mirror] 동기화 상태 로드 실패, 처음부터 다시 가져옵니다: %s", e)
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _columns(self):
+        if not self.state["columns"]:
+            header = [str(h).strip() for h in self.sheet.row_values(1)]
+            self.state["columns"] = header if "timestamp" in header else DEFAULT_COLUMNS
+            if header and "timestamp" not in header:
+                self.state["next_row"] = 1  # 헤더 없는 시트: 1행부터 데이터
+        return self.state["columns"]
+
+    @staticmethod
+    def _parse(row, index):
+        """시트 행 1개 -> TSDB 행. 형식이 맞지 않으면 None"""
+        def cell(name):
+            i = index.get(name)
+            return row[i] if i is not None and i < len(row) else ""
+        try:
+            epoch = datetime.strptime(str(cell("timestamp"))[:19], "%Y-%m-%d %H:%M:%S").timestamp()
+            value = float(cell("value"))
+        except (TypeError, ValueError):
+            return None
+        return (epoch, str(cell("node_id")), str(cell("device_id")), str(cell("device_name")), value, str(cell("pin")))
+
+    def sync(self):
+        """새로 추가된 시트 행만 가져와 미러에 기록합니다. (블로킹, 스레드에서 호출) 반환값: 가져온 행 수"""
+        if self.sheet is None:
+            return 0
+        with self._lock:
+            columns = self._columns()
+            index = {name: i for i, name in enumerate(columns)}
+            last_col = _column_letter(len(columns))
+            fetched = 0
+            while True:
+                start = self.state["next_row"]
+                started = time.monotonic()
+                try:
+                    rows = self.sheet.get(f"A{start}:{last_col}{start + self.chunk_rows - 1}")
+                except Exception:
+                    SHEETS_CALL_SECONDS.labels("get", "error").observe(time.monotonic() - started)
+                    raise
+                SHEETS_CALL_SECONDS.labels("get", "ok").observe(time.monotonic() - started)
+                if not rows:
+                    break
+                parsed = [r for r in (self._parse(row, index) for row in rows) if r is not None]
+                self.store.append(parsed)
+                self.state["next_row"] = start + len(rows)
+                self._save_state()
+                fetched += len(rows)
+                if len(rows) < self.chunk_rows:
+                    break
+            return fetched
+
+    async def run(self, interval=600):
+        """백그라운드 증분 동기화 루프"""
+        while True:
+            try:
+                fetched = await asyncio.to_thread(self.sync)
+                if fetched:
+                    logger.info("🪞 [Mirror] Google Sheets 신규 %d행 미러링 완료 (다음 행: %d)", fetched, self.state['next_row'])
+            except Exception as e:
+                logger.warning("⚠️ [Mirror] 동기화 실패: %s", e, key="mirror-sync", every=300)
+            await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    # 자가 점검: 가짜 시트에 행을 두 번 나눠 추가하고, 두 번째 동기화가 새 행만 읽는지 확인합니다.
+    import tempfile
+    import numpy as np
+    from gs_uploader import FakeWorksheet
+
+    sheet = FakeWorksheet(header=DEFAULT_COLUMNS)
+    sheet.append_rows([[f"2026-01-01 10:{m:02d}:00", "N1", "T1", "온도 센서", 20 + m * 0.1, "GPIO0"] for m in range(60)])
+    mirror = SheetMirror(tempfile.mkdtemp(), sheet, chunk_rows=25)
+    assert mirror.sync() == 60
+
+    sheet.append_rows([[f"2026-01-01 11:{m:02d}:00", "N1", "H1", "습도 센서", 50.0, "GPIO1"] for m in range(30)])
+    read_before = sheet.rows_read
+    assert mirror.sync() == 30 and sheet.rows_read - read_before == 30
+    assert mirror.sync() == 0
+
+    midnight = int(datetime(2026, 1, 1).timestamp())
+    _, aggs = mirror.store.rollup(60, midnight, midnight + 86400, mirror.store.devices_matching(["온도"]))
+    assert len(aggs) == 60 and np.isclose(aggs['sum'][-1], 25.9)
+    print(f"✅ 증분 미러링 확인: 다음 행 {mirror.state['next_row']}, 시트 읽기 {sheet.rows_read}행")
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+import metrics
+from sf_core.log import get_logger
+
+logger = get_logger("google")
+
+# 📏 Google Sheets API 호출 시간 (/metrics, op: append_rows/get, result: ok/error)
+SHEETS_CALL_SECONDS = metrics.histogram("mqnet_sheets_call_seconds", "Google Sheets API 호출 시간", ("op", "result"),
+                                        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+class SheetUploader:
+    """
+    Google Sheets write-behind 업로더.
+    - submit()은 이벤트 루프를 막지 않고 행을 제한 크기 큐에 넣기만 합니다. (큐가 가득 차면 로컬 파일로 spill)
+    - run()은 큐의 행을 큰 append_rows 호출로 묶어 쿼터(분당 요청 수) 안에서 전송하고,
+      실패하면 지수 백오프로 재시도합니다. 재시도 한도를 넘긴 배치도 spill 파일로 보존됩니다.
+    - 큐에 여유가 있으면 spill 파일을 다시 읽어 업로드합니다.
+    sheet는 append_rows(rows)를 제공하는 객체면 되므로 FakeWorksheet로 대체해 검증할 수 있습니다.
+    """
+    def __init__(self, sheet=None, spill_path="gs_spill.jsonl", max_queue=10000, max_batch=2000,
+                 requests_per_minute=50, max_retries=5, base_backoff=2.0, max_backoff=300.0):
+        self.sheet = sheet
+        self.spill_path = spill_path
+        self.max_batch = max_batch
+        self.min_interval = 60.0 / requests_per_minute
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.queue = asyncio.Queue(max_queue)
+        self._last_call = 0.0
+        self.stats = {"uploaded": 0, "calls": 0, "retries": 0, "spilled": 0, "drained": 0, "corrupt": 0}
+
+    # ---------------------------------------------------------------- 생산자 측
+    def submit(self, rows):
+        """행 목록을 큐에 넣습니다. 큐가 가득 차면 남은 행은 spill 파일에 기록합니다."""
+        rows = list(rows)
+        for i, row in enumerate(rows):
+            try:
+                self.queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self._spill(rows[i:])
+                break
+
+    def _spill(self, rows):
+        if not rows:
+            return
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.stats["spilled"] += len(rows)
+        logger.warning("💾 [Google] 업로드 대기열 초과: %d건 로컬 보존 (%s)", len(rows), self.spill_path, key="spill", every=30)
+
+    # ---------------------------------------------------------------- 소비자 측
+    async def run(self):
+        logger.info("📤 [Google] Write-behind 업로더 가동 (배치 최대 %d행, 호출 간격 %.1f초)", self.max_batch, self.min_interval)
+        try:
+            while True:
+                try:
+                    await self._step()
+                except Exception as e:
+                    # spill 파일 쓰기 실패(디스크 가득 참 등)로 업로더 태스크가 죽지 않도록
+                    logger.error("⚠️ [Google] 업로더 처리 오류: %s", e, key="uploader-error", every=60)
+                    await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            pass
+
+    async def _step(self):
+        if self.queue.empty() and self.sheet is not None and self._has_spill():
+            await self._drain_spill()
+            return
+
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout=30)
+        except asyncio.TimeoutError:
+            return
+        batch = [first]
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+        if not await self._upload(batch):
+            self._spill(batch)
+
+    def _has_spill(self):
+        # 이전 실행이 재업로드 도중 종료되면 .draining 파일만 남아 있을 수 있음
+        return os.path.exists(self.spill_path) or os.path.exists(self.spill_path + ".draining")
+
+    async def _upload(self, batch):
+        """쿼터 간격을 지키며 append_rows를 호출하고, 실패 시 지수 백오프로 재시도합니다."""
+        if self.sheet is None:
+            return False
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_call + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_call = time.monotonic()
+            try:
+                await asyncio.to_thread(self.sheet.append_rows, batch)
+                SHEETS_CALL_SECONDS.labels("append_rows", "ok").observe(time.monotonic() - self._last_call)
+                self.stats["calls"] += 1
+                self.stats["uploaded"] += len(batch)
+                logger.info("📤 [Google] %d건 시트 업데이트 완료.", len(batch))
+                return True
+            except Exception as e:
+                SHEETS_CALL_SECONDS.labels("append_rows", "error").observe(time.monotonic() - self._last_call)
+                if attempt == self.max_retries:
+                    logger.error("⚠️ [Google] 시트 쓰기 실패 (재시도 %d회 초과): %s", attempt, e, key="upload-failed", every=60)
+                    break
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                self.stats["retries"] += 1
+                logger.warning("⚠️ [Google] 시트 쓰기 실패, %.1f초 후 재시도: %s", delay, e, key="upload-retry", every=60)
+                await asyncio.sleep(delay)
+        return False
+
+    async def _drain_spill(self):
+        """spill 파일을 이름 변경으로 떼어낸 뒤 배치 단위로 업로드합니다. 실패한 나머지는 다시 spill 합니다."""
+        draining = self.spill_path + ".draining"
+        if not os.path.exists(draining):
+            os.replace(self.spill_path, draining)
+        rows = []
+        with open(draining, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # 기록 도중 종료되어 잘린 줄 등은 건너뜀
+                    self.stats["corrupt"] += 1
+                    logger.warning("⚠️ [Google] spill 파일의 손상된 줄을 건너뜁니다 (%s)", draining, key="spill-corrupt", every=60)
+
+        for start in range(0, len(rows), self.max_batch):
+            batch = rows[start:start + self.max_batch]
+            if not await self._upload(batch):
+                self._spill(rows[start:])
+                break
+            self.stats["drained"] += len(batch)
+        os.remove(draining)
+
+
+class FakeWorksheet:
+    """테스트용 인프로세스 워크시트: append_rows 지연/실패를 흉내 내고 받은 행을 보관합니다. (get/row_values로 읽기도 지원)"""
+    def __init__(self, latency=0.0, fail_rate=0.0, seed=None, header=None):
+        self.header = list(header) if header else None
+        self.rows = []
+        self.calls = 0
+        self.rows_read = 0
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+
+    def append_rows(self, rows):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._rng.random() < self.fail_rate:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED (fake)")
+        self.rows.extend(rows)
+
+    def _sheet_rows(self):
+        return ([self.header] if self.header else []) + self.rows
+
+    def row_values(self, row):
+        rows = self._sheet_rows()
+        return list(rows[row - 1]) if row <= len(rows) else []
+
+    def get(self, range_name):
+        """'A2:F100' 형식의 구간을 읽습니다. (시트 끝을 넘는 부분은 잘림)"""
+        m = re.fullmatch(r"[A-Z]+(\d+):[A-Z]+(\d+)", range_name)
+        first, last = int(m.group(1)), int(m.group(2))
+        rows = [list(r) for r in self._sheet_rows()[first - 1:last]]
+        self.rows_read += len(rows)
+        return rows
+
+
+if __name__ == "__main__":
+    # 자가 점검: 실패율 30%의 가짜 시트 + 작은 큐로 재시도/spill/재업로드 경로를 모두 통과시킵니다.
+    import tempfile
+
+    async def demo():
+        sheet = FakeWorksheet(latency=0.01, fail_rate=0.3, seed=1)
+        spill = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+        uploader = SheetUploader(sheet, spill, max_queue=100, max_batch=50, requests_per_minute=6000,
+                                 base_backoff=0.01, max_backoff=0.05)
+        task = asyncio.create_task(uploader.run())
+        sent = [[f"2026-01-01 00:00:{i % 60:02d}", "NODE", f"D{i}", "온도 센서", i, "GPIO0"] for i in range(1000)]
+        for i in range(0, len(sent), 250):
+            uploader.submit(sent[i:i + 250])
+            await asyncio.sleep(0)
+        while len(sheet.rows) < len(sent):
+            await asyncio.sleep(0.05)
+        task.cancel()
+        assert sorted(r[4] for r in sheet.rows) == list(range(1000))
+        print(f"✅ 모든 행 업로드 확인: {uploader.stats}, 시트 호출 {sheet.calls}회")
+
+    asyncio.run(demo())
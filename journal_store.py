@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+from array import array
+
+from sf_core.log import get_logger
+
+logger = get_logger("journal")
+
+
+class JournalStore:
+    """
+    영농 일지 append-only 저장소.
+    - journal.jsonl: 항목 1개당 JSON 한 줄 (오래된 순으로 덧붙임)
+    - journal.idx: 항목별 시작 오프셋(uint64) 배열. 메모리에도 그대로 유지됩니다.
+    항목 ID는 기록 순번(0부터)이며, 페이지 조회는 인덱스로 필요한 바이트 구간만 한 번에 읽습니다.
+    기존 journal.json(최신순 배열)은 최초 1회 이관 후 journal.json.migrated로 이름이 바뀝니다.
+    """
+    def __init__(self, data_dir):
+        self.log_path = os.path.join(data_dir, 'journal.jsonl')
+        self.idx_path = os.path.join(data_dir, 'journal.idx')
+        self.legacy_path = os.path.join(data_dir, 'journal.json')
+        self._lock = threading.Lock()
+        self.offsets = array('Q')
+        self.size = 0  # 마지막으로 확인된 완전한 로그 끝 위치
+        self._recover()
+        if os.path.exists(self.legacy_path):
+            self.migrate_legacy()
+
+    # ---------------------------------------------------------------- 복구
+    def _recover(self):
+        """인덱스를 읽고 로그와 맞춰봅니다. 중간에 끊긴 마지막 줄은 잘라내고, 빠진 인덱스는 다시 만듭니다."""
+        if os.path.exists(self.idx_path):
+            with open(self.idx_path, 'rb') as f:
+                raw = f.read()
+            self.offsets.frombytes(raw[:len(raw) - len(raw) % self.offsets.itemsize])
+
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        while self.offsets and self.offsets[-1] >= log_size:
+            self.offsets.pop()
+
+        pos = 0
+        if self.offsets:
+            pos = self.offsets.pop()  # 마지막 항목은 온전한지 다시 검사
+        rebuilt = array('Q')
+        if log_size > pos:
+            with open(self.log_path, 'rb') as f:
+                f.seek(pos)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    rebuilt.append(pos)
+                    pos += len(line)
+        self.offsets.extend(rebuilt)
+        self.size = pos
+
+        if pos < log_size:
+            logger.warning("⚠️ [Journal] 불완전한 마지막 기록 %d바이트를 잘라냅니다.", log_size - pos)
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(pos)
+        with open(self.idx_path, 'wb') as f:
+            f.write(self.offsets.tobytes())
+
+    # ---------------------------------------------------------------- 쓰기
+    def append(self, entry):
+        """항목 1개를 로그 끝에 기록하고 ID를 반환합니다. (파일 길이와 무관한 상수 시간)"""
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+        with self._lock:
+            return self._append_lines([line])[0]
+
+    def _append_lines(self, lines):
+        start = len(self.offsets)
+        new = array('Q')
+        pos = self.size
+        for line in lines:
+            new.append(pos)
+            pos += len(line)
+        # 로그를 먼저 fsync 해야 인덱스가 존재하지 않는 줄을 가리키지 않음 (인덱스 유실은 _recover가 재생성)
+        with open(self.log_path, 'ab') as f:
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.idx_path, 'ab') as f:
+            f.write(new.tobytes())
+        self.offsets.extend(new)
+        self.size = pos
+        return list(range(start, start + len(lines)))
+
+    def migrate_legacy(self):
+        """journal.json(최신순 배열)을 오래된 순으로 로그에 이관합니다."""
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                journals = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error("⚠️ [Journal] journal.json 이관 실패: %s", e)
+            return 0
+        lines = [json.dumps(j, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+                 for j in reversed(journals)]
+        with self._lock:
+            if lines:
+                self._append_lines(lines)
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        logger.info("📦 [Journal] journal.json %d건 → journal.jsonl 이관 완료", len(lines))
+        return len(lines)
+
+    # ---------------------------------------------------------------- 읽기
+    def __len__(self):
+        return len(self.offsets)
+
+    def page(self, limit=50, before=None):
+        """
+        최신순 페이지 1개를 반환합니다.
+        before: 이 ID보다 오래된 항목만 (None이면 가장 최신부터)
+        반환값: (항목 목록[각 항목에 'id' 포함], 다음 페이지 커서 또는 None)
+        """
+        with self._lock:
+            end = len(self.offsets) if before is None else max(0, min(before, len(self.offsets)))
+            start = max(0, end - limit)
+            if start >= end:
+                return [], None
+            first = self.offsets[start]
+            last = self.offsets[end] if end < len(self.offsets) else self.size
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(first)
+            chunk = f.read(last - first)
+        items = []
+        for entry_id, line in zip(range(start, end), chunk.splitlines()):
+            entry = json.loads(line)
+            entry['id'] = entry_id
+            items.append(entry)
+        items.reverse()
+        return items, (start if start > 0 else None)
+
+
+if __name__ == "__main__":
+    # 자가 점검: 이관 → 추가 → 커서 페이지 → 끊긴 기록 복구
+    import tempfile
+
+    root = tempfile.mkdtemp()
+    with open(os.path.join(root, 'journal.json'), 'w', encoding='utf-8') as f:
+        json.dump([{"type": "work", "content": f"기존 {i}"} for i in reversed(range(5))], f, ensure_ascii=False)
+
+    store = JournalStore(root)
+    for i in range(5, 12):
+        store.append({"type": "work", "content": f"신규 {i}"})
+
+    items, cursor = store.page(limit=5)
+    assert [j['id'] for j in items] == [11, 10, 9, 8, 7] and cursor == 7
+    items, cursor = store.page(limit=5, before=cursor)
+    assert [j['id'] for j in items] == [6, 5, 4, 3, 2] and items[-1]['content'] == "기존 2"
+    items, cursor = store.page(limit=5, before=cursor)
+    assert [j['id'] for j in items] == [1, 0] and cursor is None
+
+    with open(store.log_path, 'ab') as f:
+        f.write(b'{"type":"work","con')  # 쓰는 도중 중단된 기록
+    reopened = JournalStore(root)
+    assert len(reopened) == 12 and reopened.append({"content": "복구 후"}) == 12
+    print(f"✅ 일지 저장소 확인: {len(reopened)}건")
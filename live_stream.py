@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+import json
+import time
+import urllib.parse
+from collections import deque
+
+HEARTBEAT_SEC = 15
+GZIP_MIN_BYTES = 1024
+SSE_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream; charset=utf-8\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"\r\n"
+)
+
+
+def http_response(status, body=b"", headers=()):
+    reason = {200: "OK", 304: "Not Modified", 400: "Bad Request"}.get(status, "OK")
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    lines += [f"{k}: {v}" for k, v in headers]
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+
+def encode_json(payload, use_gzip=False):
+    """반환값: (본문 bytes, gzip 적용 여부). 작은 본문은 압축하지 않음"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if use_gzip and len(body) >= GZIP_MIN_BYTES:
+        return gzip.compress(body, 5), True
+    return body, False
+
+
+def encode_event(event, payload):
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {payload.get('v', 0)}\nevent: {event}\ndata: {data}\n\n".encode('utf-8')
+
+
+class LiveHub:
+    """
+    SYSTEM_REGISTRY의 실시간 상태를 메모리에 유지하고, 바뀐 센서/액추에이터 값만
+    SSE(/api/live/stream) 구독자에게 팬아웃합니다.
+    한 틱의 변경분은 1회만 직렬화되어 모든 구독자가 같은 bytes 프레임을 공유합니다.
+    seq는 단조 증가하는 스냅샷 버전이며, /api/live?since=<버전> 질의는 장치별 변경 버전으로 응답합니다.
+    """
+    def __init__(self, queue_size=32, removed_history=1024):
+        self.queue_size = queue_size
+        # 재시작 후에도 이전 버전보다 커지도록 밀리초 시각에서 시작
+        self.seq = int(time.time() * 1000)
+        self.timestamp = None
+        self.state = {}     # node_id -> {"sensors": {id: status}, "actuators": {id: status}}
+        self.versions = {}  # node_id -> {"sensors": {id: seq}, "actuators": {id: seq}}
+        self.removed = deque(maxlen=removed_history)  # (seq, node_id)
+        self.subscribers = set()
+        self.external = set()  # merge()로만 갱신되는 노드 ID (publish()에서 제거하지 않음)
+        self._snapshot_cache = (-1, b"")
+        self._body_cache = {}  # (seq, gzip) -> 전체 스냅샷 응답 본문
+
+    def publish(self, timestamp, live_status):
+        """
+        틱마다 수집된 live_status({node_id: {"sensors": [...], "actuators": [...]}})를 반영합니다.
+        live_status에 없는 노드는 제거됩니다. (merge()로 들어온 외부 노드는 유지)
+        변경분이 있으면 delta 프레임을 구독자 큐에 넣고 반환합니다.
+        """
+        removed = [node_id for node_id in self.state if node_id not in live_status and node_id not in self.external]
+        return self._apply(timestamp, live_status, removed)
+
+    def merge(self, timestamp, updates, external=()):
+        """
+        일부 노드/장치의 새 값만 반영합니다. (MQTT 수집 등 틱 주기와 무관하게 들어오는 값)
+        external: SYSTEM_REGISTRY 밖의 노드 ID. publish()가 전체 상태를 반영할 때도 제거하지 않습니다.
+        """
+        self.external.update(external)
+        return self._apply(timestamp, updates, [])
+
+    def _apply(self, timestamp, live_status, removed):
+        next_seq = self.seq + 1
+        delta = {}
+        for node_id, node_data in live_status.items():
+            prev = self.state.setdefault(node_id, {"sensors": {}, "actuators": {}})
+            vers = self.versions.setdefault(node_id, {"sensors": {}, "actuators": {}})
+            changed = {}
+            for kind in ("sensors", "actuators"):
+                items = []
+                for item in node_data.get(kind, []):
+                    if prev[kind].get(item['id']) != item:
+                        prev[kind][item['id']] = item
+                        vers[kind][item['id']] = next_seq
+                        items.append(item)
+                if items:
+                    changed[kind] = items
+            if changed:
+                delta[node_id] = changed
+
+        for node_id in removed:
+            del self.state[node_id]
+            del self.versions[node_id]
+            self.removed.append((next_seq, node_id))
+
+        self.timestamp = timestamp
+        if not delta and not removed:
+            return None
+
+        self.seq = next_seq
+        self._body_cache.clear()
+        frame = encode_event("delta", {"v": self.seq, "timestamp": timestamp, "nodes": delta, "removed": removed})
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # 느린 구독자: 밀린 프레임을 버리고 전체 스냅샷으로 재동기화
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot_frame())
+        return frame
+
+    def snapshot(self):
+        return {
+            "v": self.seq,
+            "timestamp": self.timestamp,
+            "nodes": {
+                node_id: {"sensors": list(node["sensors"].values()), "actuators": list(node["actuators"].values())}
+                for node_id, node in self.state.items()
+            },
+        }
+
+    def delta_since(self, since):
+        """since 버전 이후 바뀐 장치만 담은 응답 객체. 제거 이력이 잘려 재구성할 수 없으면 None"""
+        if self.removed.maxlen and len(self.removed) == self.removed.maxlen and since < self.removed[0][0]:
+            return None
+        nodes = {}
+        for node_id, vers in self.versions.items():
+            node = self.state[node_id]
+            changed = {}
+            for kind in ("sensors", "actuators"):
+                items = [node[kind][dev_id] for dev_id, v in vers[kind].items() if v > since]
+                if items:
+                    changed[kind] = items
+            if changed:
+                nodes[node_id] = changed
+        removed = [node_id for seq, node_id in self.removed if seq > since and node_id not in self.state]
+        return {"v": self.seq, "timestamp": self.timestamp, "full": False, "nodes": nodes, "removed": removed}
+
+    def handle_http(self, path, headers):
+        """
+        AsyncHTTPServer 루프 라우트: GET /api/live[?since=<버전>]
+        - 버전이 같거나 If-None-Match가 일치하면 304
+        - since가 주어지면 그 이후 바뀐 장치만, 아니면 메모리에 유지된 전체 스냅샷
+        - 큰 응답은 gzip 압축 (전체 스냅샷은 버전당 1회만 직렬화/압축)
+        """
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+        since = params.get('since', [None])[0]
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return http_response(400, b"Invalid 'since' parameter")
+
+        etag = f'"{self.seq}"' if since is None else f'"{since}-{self.seq}"'
+        common = [("ETag", etag), ("Cache-Control", "no-cache"), ("X-Live-Version", str(self.seq))]
+        if headers.get('if-none-match') == etag or since == self.seq:
+            return http_response(304, headers=common)
+
+        use_gzip = 'gzip' in headers.get('accept-encoding', '')
+        payload = self.delta_since(since) if since is not None and since < self.seq else None
+        if payload is None:
+            body, compressed = self._full_body(use_gzip)
+        else:
+            body, compressed = encode_json(payload, use_gzip)
+
+        out_headers = [("Content-Type", "application/json; charset=utf-8")] + common
+        if compressed:
+            out_headers += [("Content-Encoding", "gzip"), ("Vary", "Accept-Encoding")]
+        return http_response(200, body, out_headers)
+
+    def _full_body(self, use_gzip):
+        key = (self.seq, use_gzip)
+        cached = self._body_cache.get(key)
+        if cached is None:
+            snap = self.snapshot()
+            snap["full"] = True
+            cached = self._body_cache[key] = encode_json(snap, use_gzip)
+        return cached
+
+    def snapshot_frame(self):
+        """현재 버전의 전체 스냅샷 프레임 (버전당 1회만 직렬화)"""
+        if self._snapshot_cache[0] != self.seq:
+            self._snapshot_cache = (self.seq, encode_event("snapshot", self.snapshot()))
+        return self._snapshot_cache[1]
+
+    async def stream(self, reader, writer, path, headers):
+        """AsyncHTTPServer 스트림 라우트: 연결이 끊길 때까지 SSE 프레임을 전송합니다."""
+        queue = asyncio.Queue(self.queue_size)
+        queue.put_nowait(self.snapshot_frame())
+        self.subscribers.add(queue)
+        try:
+            writer.write(SSE_HEADERS + b"retry: 3000\n\n")
+            await writer.drain()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    frame = b": ping\n\n"
+                writer.write(frame)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(queue)
@@ -1,11 +1,26 @@
 import asyncio
+import functools
 import json
-import csv
 import os
 import random
 import sys
+import time
+import numpy as np
 from datetime import datetime
-from sf_core import ESP32C3Node, SYSTEM_REGISTRY, set_data_dir
+import metrics
+from sf_core import DEFAULT_FARM, ESP32C3Node, Farm, TickScheduler, set_data_dir, report_unresolved, apply_recipe
+from sf_core.shards import ShardPool
+from sf_core.log import get_logger
+from tsdb_store import TimeSeriesStore
+from live_stream import LiveHub
+from gs_uploader import SheetUploader
+from gs_mirror import SheetMirror
+from journal_store import JournalStore
+from vision_jobs import VisionJobQueue
+from camera_pool import CameraPool
+from mqtt_gateway import MqttGateway
+from tenants import TenantRouter, parse_farms, parse_hosts, TENANT_HEADER, BASE_HEADER
+from add_node.node_manager import HWNodeManager
 
 # 🟢 Google Sheets Support
 try:
@@ -15,6 +30,8 @@ try:
 except ImportError:
     GS_ENABLED = False
 
+logger = get_logger("main")
+
 # Add current directory to sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -26,28 +43,153 @@ DATA_DIR = os.environ.get('DATA_DIR', 'data').strip()
 if DATA_DIR == 'busan-data' and not os.path.exists(os.path.join(BASE_DIR, 'busan-data')) and os.path.exists(os.path.join(BASE_DIR, 'busan_data')):
     DATA_DIR = 'busan_data'
 
+# 🏘️ 농장(테넌트) 구성: FARMS="seoul=seoul_data,busan=busan_data,default=data" 이면 한 프로세스가 여러 농장을 서비스합니다.
+#    요청은 Host 헤더(FARM_HOSTS="seoul.example.com=seoul,...") 또는 /farm/<이름>/ 경로 접두사로 구분하며, 첫 번째 농장이 기본입니다.
+#    지정하지 않으면 DATA_DIR 농장 1곳 (기존과 동일)
+FARM_SPECS = parse_farms(os.environ.get('FARMS')) or [(os.path.basename(os.path.normpath(DATA_DIR)) or 'default', DATA_DIR)]
+DATA_DIR = FARM_SPECS[0][1]
+
 set_data_dir(DATA_DIR)
 
-print(f"🔧 [System] BASE_DIR: {BASE_DIR}")
-print(f"📂 [System] DATA_DIR: {DATA_DIR}")
+logger.info("🔧 [System] BASE_DIR: %s", BASE_DIR)
+logger.info("📂 [System] DATA_DIR: %s", ', '.join(f'{name}={path}' for name, path in FARM_SPECS))
 
 # Vision Analysis (Optional)
 try:
     import vision_analysis
-    print("✅ [Vision] Vision Module Loaded Successfully.")
+    logger.info("✅ [Vision] Vision Module Loaded Successfully.")
 except ImportError as e:
-    print(f"⚠️ [Vision] Vision Module Load Failed: {e}")
+    logger.warning("⚠️ [Vision] Vision Module Load Failed: %s", e)
     vision_analysis = None
 
-# Google Sheets 전용 전역 객체
+# 📏 운영 지표 (/metrics, Prometheus 텍스트). 핫 패스는 라벨 조회 없이 미리 받아 둔 값 객체에 기록
+HTTP_SECONDS = metrics.histogram("mqnet_http_request_seconds", "HTTP 요청 처리 시간 (요청 수신~응답 전송)", ("route", "code"))
+TICK_SECONDS = metrics.histogram("mqnet_tick_seconds", "배치 틱 처리 시간", ("farm",))
+TICK_LAG_SECONDS = metrics.histogram("mqnet_tick_lag_seconds", "틱 지연 (예정 시각 대비)", ("farm",),
+                                     buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+NODE_TICKS = metrics.counter("mqnet_node_ticks_total", "처리한 노드 틱 수", ("farm",))
+LOGGER_SECONDS = metrics.histogram("mqnet_logger_pass_seconds", "실시간 스냅샷 조립·발행 1회 시간", ("farm",))
+TSDB_APPEND_SECONDS = metrics.histogram("mqnet_tsdb_append_seconds", "TSDB 이력 기록(파티션 append) 시간", ("farm",))
+TSDB_ROWS = metrics.counter("mqnet_tsdb_rows_total", "TSDB에 기록한 행 수", ("farm",))
+COORDINATOR_SECONDS = metrics.histogram("mqnet_coordinator_run_seconds", "재배 단계 점검 1회 시간", ("farm",))
+RECIPE_NODES = metrics.counter("mqnet_recipe_nodes_total", "레시피 임계값을 적용한 노드 수", ("farm",))
+
+
+class FarmTenant:
+    """
+    농장 1곳의 서비스 묶음: 노드 레지스트리(sf_core.Farm), 데이터 폴더, 시계열 저장소, 영농 일지, 실시간 허브,
+    카메라, 이미지 분석 큐, Google Sheets 업로더/미러, MQTT 게이트웨이.
+    틱 스케줄러/로거/코디네이터는 농장마다 따로 돌고, HTTP 서버와 이미지 분석 프로세스 풀은 모든 농장이 함께 씁니다.
+    """
+    def __init__(self, name, data_dir, farm=None, vision_pool=None):
+        self.name = name
+        self.data_dir = data_dir
+        self.farm = farm or Farm(name, data_dir)
+
+        # 📈 일 단위 파티션 바이너리 시계열 저장소 (tsdb/YYYY-MM-DD.seg)
+        self.tsdb = TimeSeriesStore(data_dir)
+
+        # 📒 영농 일지 append-only 로그 (journal.jsonl + 오프셋 인덱스, 기존 journal.json은 최초 1회 이관)
+        self.journal = JournalStore(data_dir)
+
+        # 📡 실시간 상태 허브 (/api/live/stream SSE 구독자에게 변경분만 푸시)
+        self.live_hub = LiveHub()
+
+        # 🔬 생육 이미지 분석 작업 큐 (프로세스 풀에서 실행, 결과는 growth_log.json에 일괄 반영)
+        #    프로세스 풀은 첫 번째 농장의 것을 함께 씀 (농장 수만큼 워커를 띄우지 않음)
+        self.vision_jobs = None
+        if vision_analysis:
+            self.vision_jobs = VisionJobQueue(vision_analysis.analyze_plant_growth, f"{data_dir}/growth_log.json",
+                                              max_workers=int(os.environ.get('VISION_WORKERS', 2)), pool=vision_pool)
+
+        # 📷 카메라별 장기 연결 + 최신 프레임 보관 (camera_config.json: [{"id", "name", "url"}, ...])
+        self.cameras = CameraPool(f"{data_dir}/camera_config.json")
+
+        # 📤 Google Sheets write-behind 업로더 / 🪞 시트 이력의 로컬 일자별 미러
+        self.gs_sheet = None
+        self.gs_uploader = SheetUploader(spill_path=os.path.join(data_dir, 'gs_spill.jsonl'))
+        self.gs_mirror = SheetMirror(data_dir)
+
+        # 📡 MQTT 수집 게이트웨이 (MQTT_BROKER 지정 시)
+        self.mqtt_gateway = None
+
+        self.scheduler = TickScheduler(observer=self.tick_observer())
+        # 🧩 노드 샤드 풀 (NODE_SHARDS > 1이면 노드를 워커 프로세스에서 실행하고, 상태는 공유 메모리로 읽음)
+        self.shards = None
+
+    def tick_observer(self):
+        """TickScheduler/run_forever에 넘길 지표 기록 함수 (라벨 조회는 여기서 한 번만)"""
+        seconds, lag_seconds, ticks = TICK_SECONDS.labels(self.name), TICK_LAG_SECONDS.labels(self.name), NODE_TICKS.labels(self.name)
+
+        def observe(nodes, lag, elapsed):
+            seconds.observe(elapsed)
+            lag_seconds.observe(lag)
+            ticks.inc(nodes)
+        return observe
+
+    def attach_sheet(self, sheet):
+        self.gs_sheet = sheet
+        self.gs_uploader.sheet = sheet
+        self.gs_mirror.sheet = sheet
+
+    def __repr__(self):
+        return f"[Tenant] {self.name}({self.data_dir})"
+
+
+TENANTS = []
+for _name, _data_dir in FARM_SPECS:
+    TENANTS.append(FarmTenant(_name, _data_dir, farm=None if TENANTS else DEFAULT_FARM,
+                              vision_pool=TENANTS[0].vision_jobs if TENANTS else None))
+ROUTER = TenantRouter(TENANTS, hosts=parse_hosts(os.environ.get('FARM_HOSTS')))
+
+# 🧩 노드 실행 샤드 수: 2 이상이면 농장마다 노드를 구역 접두사 단위로 나눠 워커 프로세스 N개에서 실행
+NODE_SHARDS = int(os.environ.get('NODE_SHARDS', 0) or 0)
+
+# 📏 다른 객체가 이미 들고 있는 값(큐 길이, 노드 수, 샤드 상태)은 /metrics 수집 시점에 읽음
+def _queue_depths():
+    depths = {}
+    for tenant in TENANTS:
+        depths[(tenant.name, "sheets")] = tenant.gs_uploader.queue.qsize()
+        depths[(tenant.name, "live_subscribers")] = len(tenant.live_hub.subscribers)
+        if tenant.vision_jobs:
+            depths[(tenant.name, "vision")] = tenant.vision_jobs.pending()
+        if tenant.mqtt_gateway:
+            depths[(tenant.name, "mqtt")] = tenant.mqtt_gateway.queue.qsize()
+    return depths
+
+
+def _shard_values(key):
+    return lambda: {(tenant.name, str(s["shard"])): s[key] for tenant in TENANTS if tenant.shards
+                    for s in tenant.shards.status()["shards"]}
+
+
+metrics.gauge("mqnet_queue_depth", "대기열 길이 (sheets: 업로드 대기 행, vision: 분석 작업, mqtt: 수집 메시지, live_subscribers: SSE 구독자)",
+              ("farm", "queue"), callback=_queue_depths)
+metrics.gauge("mqnet_nodes", "실행 중인 노드 수", ("farm",),
+              callback=lambda: {(t.name,): len(t.shards.node_ids) if t.shards else len(t.farm.registry) for t in TENANTS})
+metrics.gauge("mqnet_shard_ticks", "샤드 워커의 누적 배치 틱 수", ("farm", "shard"), callback=_shard_values("ticks"))
+metrics.gauge("mqnet_shard_max_lag_seconds", "샤드 워커의 최대 틱 지연", ("farm", "shard"), callback=_shard_values("max_lag"))
+
+# Google Sheets 전용 전역 객체 (인증 클라이언트는 모든 농장이 공유)
 GS_CLIENT = None
-GS_SHEET = None
+
+# 📡 MQTT 수집 게이트웨이 (MQTT_BROKER 지정 시: 노드 등록/경보/텔레메트리 → 센서 뱅크, 실시간 스냅샷, TSDB)
+#    여러 농장을 서비스할 때는 MQTT_FARM(기본: 첫 번째) 농장에 연결합니다.
+#    등록 저장소의 WAL 기록 스레드는 샤드/분석 프로세스 fork 이후 main()에서 시작합니다.
+if os.environ.get('MQTT_BROKER'):
+    _mqtt_tenant = ROUTER.get(os.environ.get('MQTT_FARM'))
+    _mqtt_tenant.mqtt_gateway = MqttGateway(
+        os.environ['MQTT_BROKER'], int(os.environ.get('MQTT_PORT', 1883)),
+        hub=_mqtt_tenant.live_hub, store=_mqtt_tenant.tsdb, farm=_mqtt_tenant.farm,
+        registrar=HWNodeManager(os.path.join(_mqtt_tenant.data_dir, 'hw_registry.json')),
+        username=os.environ.get('MQTT_USERNAME'), password=os.environ.get('MQTT_PASSWORD'))
 
 def init_google_sheets():
-    global GS_CLIENT, GS_SHEET
+    global GS_CLIENT
     if not GS_ENABLED: return None
     
-    sheet_name = os.environ.get('GS_SHEET_NAME', 'SmartFarm_Data')
+    # 농장별 시트 이름: GS_SHEET_NAME_<농장 이름 대문자> (없으면 GS_SHEET_NAME)
+    default_sheet = os.environ.get('GS_SHEET_NAME', 'SmartFarm_Data')
     
     # Render Secret Files 및 로컬 경로 탐색
     possible_paths = [
@@ -69,44 +211,43 @@ def init_google_sheets():
             scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
             creds = Credentials.from_service_account_file(cred_path, scopes=scopes)
             GS_CLIENT = gspread.authorize(creds)
-            
+        except Exception as e:
+            logger.warning("⚠️ [Google] 시트 인증 실패: %s", e)
+            return False
+
+        connected = False
+        for tenant in TENANTS:
+            sheet_name = os.environ.get(f'GS_SHEET_NAME_{tenant.name.upper()}', default_sheet)
             # 로그: 접속 시도
             try:
                 # 1. 시트 열기 시도
                 spreadsheet = GS_CLIENT.open(sheet_name)
-                GS_SHEET = spreadsheet.get_worksheet(0)
-                print(f"[Google] '{sheet_name}' 연결 성공. (Path: {cred_path})")
+                tenant.attach_sheet(spreadsheet.get_worksheet(0))
+                logger.info("[Google] [%s] '%s' 연결 성공. (Path: %s)", tenant.name, sheet_name, cred_path)
                 
                 # [NEW] 비동기로 부팅 로그 기록
-                asyncio.create_task(async_update_gs([[datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "SYSTEM", "BOOT", "Server Started", "OK", "0"]]))
-                return True
+                asyncio.create_task(async_update_gs(tenant, [[datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "SYSTEM", "BOOT", "Server Started", "OK", "0"]]))
+                connected = True
             except gspread.exceptions.SpreadsheetNotFound:
                 # 2. 못 찾았을 경우, 권한이 있는 시트 목록 출력하여 가이드
-                print(f"⚠️ [Google] '{sheet_name}' 시트를 찾을 수 없습니다.")
+                logger.warning("⚠️ [Google] '%s' 시트를 찾을 수 없습니다.", sheet_name)
                 titles = [s.title for s in GS_CLIENT.openall()]
                 if titles:
-                    print(f"   ㄴ 현재 접근 가능한 시트: {titles}")
+                    logger.warning("   ㄴ 현재 접근 가능한 시트: %s", titles)
                 else:
-                    print(f"   ㄴ 접근 가능한 시트가 없습니다. 공유 설정을 다시 확인하세요 (Email: {creds.service_account_email})")
+                    logger.warning("   ㄴ 접근 가능한 시트가 없습니다. 공유 설정을 다시 확인하세요 (Email: %s)", creds.service_account_email)
             except Exception as e:
-                print(f"⚠️ [Google] 시트 접근 중 오류 발생: {e}")
-                
-        except Exception as e:
-            print(f"⚠️ [Google] 시트 인증 실패: {e}")
+                logger.warning("⚠️ [Google] 시트 접근 중 오류 발생: %s", e)
+        return connected
     else:
         # print("ℹ️ [Google] credentials.json 파일이 없어 시트 연동을 건너뜁니다.")
         pass
     return False
 
-# Google Sheets 비동기 업데이트 래퍼
-async def async_update_gs(rows):
-    if not GS_SHEET: return
-    try:
-        # gspread는 동기 방식이므로 스레드에서 실행하여 이벤트 루프 방해 금지
-        await asyncio.to_thread(GS_SHEET.append_rows, rows)
-        print(f"[Google] {len(rows)}건 업데이트 완료.")
-    except Exception as e:
-        print(f"[Google] 업데이트 에러: {e}")
+# Google Sheets 비동기 업데이트 래퍼 (업로더 큐에 넣기만 하고 즉시 반환)
+async def async_update_gs(tenant, rows):
+    if not tenant.gs_sheet: return
+    tenant.gs_uploader.submit(rows)
 
 # 초기화 함수 정의 (호출은 main에서 수행)
 
@@ -117,31 +258,33 @@ def index_to_alpha(n):
         n //= 26
     return res
 
-async def tsdb_logger_task(interval=60):
+async def tsdb_logger_task(tenant, interval=60):
     """
-    주기적으로 모든 센서 데이터를 수집하여 CSV 파일에 시계열로 저장합니다.
+    주기적으로 농장의 모든 센서 데이터를 수집하여 일 단위 바이너리 파티션(TSDB)에 시계열로 저장합니다.
     """
-    file_path = f"{DATA_DIR}/smartfarm_tsdb.csv"
-    
-    # 파일이 없으면 헤더 생성
-    if not os.path.exists(file_path):
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp", "node_id", "device_id", "device_name", "value", "pin"])
-
-    print(f"📈 [TSDB] 시계열 로깅 태스크 가동 (주기: {interval}초)")
-    
-    # 실시간 데이터 공유를 위한 파일 경로
-    live_data_path = f"{DATA_DIR}/live_data.json"
+    # 기존 월별 CSV가 남아 있으면 1회 이관
+    try:
+        await asyncio.to_thread(tenant.tsdb.import_legacy)
+    except Exception as e:
+        logger.warning("⚠️ [TSDB] [%s] 레거시 CSV 이관 실패: %s", tenant.name, e)
+
+    logger.info("📈 [TSDB] [%s] 시계열 로깅 태스크 가동 (주기: %s초)", tenant.name, interval)
 
+    pass_seconds, append_seconds, rows_total = (LOGGER_SECONDS.labels(tenant.name), TSDB_APPEND_SECONDS.labels(tenant.name),
+                                                TSDB_ROWS.labels(tenant.name))
+    csv_counter = 0
     while True:
         try:
+            started = time.perf_counter()
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             log_entries = []
             live_status = {}
 
-            for node_id, node in SYSTEM_REGISTRY.items():
+            # 샤드 모드: 워커들이 쓰는 공유 메모리 상태판에서 바로 조립 (프로세스 간 직렬화 없음)
+            if tenant.shards:
+                live_status = tenant.shards.board.live_status()
+
+            for node_id, node in tenant.farm.registry.items():
                 node_data = {"sensors": [], "actuators": []}
                 for sensor in node.sensors.values():
                     status = sensor.get_status()
@@ -157,68 +300,84 @@ async def tsdb_logger_task(interval=60):
                     })
                 live_status[node_id] = node_data
 
-            # 1. 2초마다 실시간 JSON 업데이트 (원자적 저장: 임시 파일 사용 후 이름 변경)
-            with open(live_data_path + ".tmp", 'w', encoding='utf-8') as f:
-                json.dump({"timestamp": timestamp, "nodes": live_status}, f, ensure_ascii=False, indent=2)
-            os.replace(live_data_path + ".tmp", live_data_path)
+            # 1. 메모리 스냅샷 갱신 (버전 증가) 및 변경된 값만 SSE 구독자에게 푸시
+            #    /api/live, /data/live_data.json 은 이 스냅샷에서 바로 응답 (디스크 기록 없음)
+            tenant.live_hub.publish(timestamp, live_status)
+            pass_seconds.observe(time.perf_counter() - started)
 
             # 2. 10분(600초)마다 CSV 및 Google 시트 누적
-            if not hasattr(tsdb_logger_task, '_csv_counter'):
-                tsdb_logger_task._csv_counter = 0
-            
-            tsdb_logger_task._csv_counter += 2 # 2초 주기
-            if tsdb_logger_task._csv_counter >= interval:
-                tsdb_logger_task._csv_counter = 0
-                
-                # 월별 파일명 생성 (예: data/tsdb_2026_02.csv)
-                now = datetime.now()
-                monthly_file = f"{DATA_DIR}/tsdb_{now.strftime('%Y_%m')}.csv"
+            csv_counter += 2 # 2초 주기
+            if csv_counter >= interval:
+                csv_counter = 0
                 
-                # 파일이 없으면 헤더 생성
-                if not os.path.exists(monthly_file):
-                    os.makedirs(os.path.dirname(monthly_file), exist_ok=True)
-                    with open(monthly_file, 'w', newline='', encoding='utf-8-sig') as f:
-                        writer = csv.writer(f)
-                        writer.writerow(["timestamp", "node_id", "device_id", "device_name", "value", "pin"])
-
+                epoch = int(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp())
+                ts_rows = []
                 for node_id, node_data in live_status.items():
                     for s in node_data["sensors"]:
                         log_entries.append([timestamp, node_id, s['id'], s['name'], s['val'], s['pin']])
+                        ts_rows.append((epoch, node_id, s['id'], s['name'], s['val'], s['pin']))
                 
                 if log_entries:
-                    # A. 로컬 CSV 저장
-                    with open(monthly_file, 'a', newline='', encoding='utf-8-sig') as f:
-                        writer = csv.writer(f)
-                        writer.writerows(log_entries)
+                    # A. 로컬 TSDB 저장 (일 단위 파티션에 append)
+                    with append_seconds.time():
+                        tenant.tsdb.append(ts_rows)
+                    rows_total.inc(len(ts_rows))
                     
-                    # B. Google Sheets 저장 (비동기로 실행하거나 간단히 처리)
-                    if GS_SHEET:
-                        try:
-                            GS_SHEET.append_rows(log_entries)
-                            print(f"� [Google] {len(log_entries)}건 시트 업데이트 완료.")
-                        except Exception as e:
-                            print(f"⚠️ [Google] 시트 쓰기 실패: {e}")
+                    # B. Google Sheets 저장 (write-behind 큐에 넣고 전송은 업로더 태스크가 담당)
+                    if tenant.gs_sheet:
+                        tenant.gs_uploader.submit(log_entries)
                             
-                    print(f"�📊 [TSDB] {timestamp} 이력 데이터 저장 완료 ({monthly_file})")
+                    logger.info("📊 [TSDB] %s 이력 데이터 저장 완료 (%s)", timestamp, tenant.tsdb.root)
             
         except Exception as e:
-            print(f"⚠️ [TSDB/Live Error] {e}")
+            logger.error("⚠️ [TSDB/Live Error] [%s] %s", tenant.name, e, key=("tsdb-error", tenant.name))
         
         await asyncio.sleep(2) # 실시간성을 위해 2초 주기로 변경
 
+def history_series(store, midnight, step):
+    """저장소의 하루치 온도/습도 롤업 평균을 [{"t": "HH:MM", "y": 값}] 목록 2개로 반환합니다."""
+    temp_ids = store.devices_matching(["온도", "Temp"])
+    humi_ids = store.devices_matching(["습도", "Humi"], exclude=["온도", "Temp"])
+    temp, humi = [], []
+    _, aggs = store.rollup(step, midnight, midnight + 86400, np.concatenate([temp_ids, humi_ids]))
+    if len(aggs):
+        sod = aggs['ts'] - midnight
+        means = aggs['sum'] / aggs['count']
+        is_temp = np.isin(aggs['dev'], temp_ids)
+        for sec, val, is_t in zip(sod.tolist(), means.tolist(), is_temp.tolist()):
+            entry = {"t": f"{sec // 3600:02d}:{sec % 3600 // 60:02d}", "y": round(val, 2)}
+            (temp if is_t else humi).append(entry)
+    return temp, humi
+
 async def web_server_task():
     """
     브라우저의 CORS 정책(file:// 제한)을 피하기 위해
     현재 디렉토리를 웹 서버로 호스팅합니다.
-    또한 /api/history 엔드포인트를 통해 CSV 데이터를 JSON으로 제공합니다.
+    또한 /api/history 엔드포인트를 통해 TSDB 데이터를 JSON으로 제공합니다.
     """
     import http.server
-    import socketserver
     import urllib.parse
+    from async_http import AsyncHTTPServer
+    from static_cache import StaticCache
     
     PORT = int(os.environ.get('PORT', 8000))
 
     class SmartFarmHandler(http.server.SimpleHTTPRequestHandler):
+        # keep-alive 지원 (Content-Length는 AsyncHTTPServer가 보충)
+        protocol_version = "HTTP/1.1"
+
+        # 요청마다 stderr에 동기 기록하던 접근 로그는 DEBUG 레벨 로거로 (오류 응답은 WARNING)
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+        def log_error(self, format, *args):
+            logger.warning("%s - %s", self.address_string(), format % args, every=10)   # 같은 클라이언트의 같은 오류 반복은 10초에 1번
+
+        @property
+        def tenant(self):
+            """이 요청의 농장 (AsyncHTTPServer 라우터가 Host/경로 접두사/Referer로 정해 헤더에 넣어 줌)"""
+            return ROUTER.get(self.headers.get(TENANT_HEADER))
+
         def do_GET(self):
             # Health Check (Render용)
             if self.path == '/health':
@@ -229,11 +388,11 @@ async def web_server_task():
 
             # [Routing] 루트(/) 접속 시 promo.html로 명시적 리다이렉트 (주소창 일치를 위함)
             parsed_path = urllib.parse.urlparse(self.path).path
-            print(f"🔍 [HTTP] Request: {self.path}", flush=True)
+            logger.debug("🔍 [HTTP] Request: %s", self.path)
             
             if parsed_path == '/':
                 self.send_response(302)
-                self.send_header('Location', '/promo.html')
+                self.send_header('Location', self.headers.get(BASE_HEADER, '') + '/promo.html')
                 self.end_headers()
                 return
 
@@ -259,6 +418,22 @@ async def web_server_task():
                 self.handle_growth_list()
             elif self.path.startswith('/api/run_model'):
                 self.handle_run_model()
+            elif self.path.startswith('/api/forecast'):
+                self.handle_forecast()
+            elif self.path.startswith('/api/analyze_growth'):
+                self.handle_growth_job()
+            elif self.path.startswith('/api/cameras'):
+                self.send_json(200, self.tenant.cameras.status())
+            elif self.path.startswith('/api/mqtt'):
+                gateway = self.tenant.mqtt_gateway
+                self.send_json(200, gateway.status() if gateway else {"connected": False, "enabled": False})
+            elif self.path.startswith('/api/shards'):
+                shards = self.tenant.shards
+                self.send_json(200, shards.status() if shards else {"shards": []})
+            elif self.path.startswith('/api/farms'):
+                self.send_json(200, {"current": self.tenant.name, "farms": [
+                    {"name": t.name, "data_dir": t.data_dir, "nodes": len(t.farm.registry), "prefix": f"/farm/{t.name}/"}
+                    for t in ROUTER]})
             else:
                 # 기본 정적 파일 제공
                 super().do_GET()
@@ -271,10 +446,10 @@ async def web_server_task():
             if 'html/html/' in file_name:
                 file_name = file_name.replace('html/html/', 'html/')
 
-            # 1. /data/ 요청을 실제 DATA_DIR 폴더로 매핑 (절대 경로 보정)
+            # 1. /data/ 요청을 요청 농장의 데이터 폴더로 매핑 (절대 경로 보정)
             if parsed_path.startswith('/data/'):
                 rel_path = parsed_path[len('/data/'):].lstrip('/')
-                return os.path.join(BASE_DIR, DATA_DIR, rel_path)
+                return os.path.join(BASE_DIR, self.tenant.data_dir, rel_path)
             
             # 2. .html 요청인 경우 /html/ 폴더 내 파일이 있는지 우선 확인
             if file_name.endswith('.html'):
@@ -308,9 +483,9 @@ async def web_server_task():
             """
             try:
                 import growth_model
-                # 현재 서버가 사용 중인 DATA_DIR를 환경 변수로 강제 고정
-                os.environ['DATA_DIR'] = DATA_DIR
-                result = growth_model.run_analysis_data()
+                # 요청 농장의 데이터 폴더/저장소를 명시 (농장마다 메모이즈 키가 다름)
+                tenant = self.tenant
+                result = growth_model.run_analysis_data(store=tenant.tsdb, data_dir=tenant.data_dir)
                 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
@@ -318,14 +493,31 @@ async def web_server_task():
                 self.wfile.write(json.dumps(result).encode('utf-8'))
                 
             except Exception as e:
-                print(f"❌ [AI Model Error] {e}")
+                logger.error("❌ [AI Model Error] %s", e)
                 # 에러 발생 시에도 브라우저가 'H' 문자를 읽지 않도록 JSON으로 응답
                 self.send_response(500)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"success": False, "error": str(e), "dates": []}).encode('utf-8'))
 
+        def handle_forecast(self):
+            """GET /api/forecast?horizon=<일수> : 전체 구역 GDD 누적 및 단계 전환/수확 예상일"""
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            try:
+                horizon = min(max(int(params.get('horizon', ['120'])[0]), 1), 730)
+            except ValueError:
+                self.send_error(400, "Invalid 'horizon' parameter")
+                return
+            try:
+                import gdd_forecast
+                tenant = self.tenant
+                self.send_json(200, gdd_forecast.run_forecast(tenant.data_dir, store=tenant.tsdb, horizon=horizon))
+            except Exception as e:
+                logger.error("❌ [Forecast Error] %s", e)
+                self.send_json(500, {"success": False, "error": str(e), "zones": []})
+
         def handle_growth_analysis(self):
+            """POST /api/analyze_growth : 분석 작업을 큐에 넣고 작업 ID를 즉시 반환 (202)"""
             try:
                 # 1. Body 읽기 (Target Image URL)
                 content_length = int(self.headers['Content-Length'])
@@ -337,76 +529,90 @@ async def web_server_task():
                     self.send_error(400, "Image URL is missing")
                     return
                 
-                # 2. Vision Analysis 실행
-                if vision_analysis:
-                    try:
-                        result = vision_analysis.analyze_plant_growth(image_url)
-                        
-                        # [NEW] 분석 결과 파일 저장
-                        if result.get('success'):
-                            log_file = f"{DATA_DIR}/growth_log.json"
-                            logs = []
-                            if os.path.exists(log_file):
-                                try:
-                                    with open(log_file, 'r', encoding='utf-8') as f:
-                                        logs = json.load(f)
-                                except: pass
-                            
-                            # Add log entry
-                            logs.append({
-                                "date": result['timestamp'],
-                                "ratio": result['ratio'],
-                                "pixels": result['green_pixels']
-                            })
-                            
-                            with open(log_file, 'w', encoding='utf-8') as f:
-                                json.dump(logs, f, indent=2)
-
-                    except Exception as e:
-                        result = {"error": f"Vision Engine Error: {str(e)}"}
+                # 2. Vision 작업 제출 (분석은 프로세스 풀에서 수행)
+                tenant = self.tenant
+                if not tenant.vision_jobs:
+                    self.send_json(200, {"error": "Vision Module Not Loaded. (Check terminal logs for import error)"})
+                    return
+                # 분석 옵션: scale(축소 배율, 기본 원본), roi([x, y, w, h] 비율), render(결과 이미지 생성, 기본 true)
+                try:
+                    scale = min(max(float(req_json.get('scale', 1.0)), 0.05), 1.0)
+                    roi = req_json.get('roi')
+                    roi = tuple(float(v) for v in roi) if roi else None
+                    if roi is not None and len(roi) != 4:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    self.send_error(400, "Invalid 'scale' or 'roi' parameter")
+                    return
+                render = bool(req_json.get('render', True))
+
+                # 풀에 등록된 카메라면 새 연결 없이 보관 중인 최신 프레임을 분석 (같은 프레임은 캐시 결과)
+                cam = tenant.cameras.find(image_url)
+                jpeg = cam.latest()[0] if cam else None
+                if jpeg:
+                    task = functools.partial(vision_analysis.analyze_jpeg, scale=scale, roi=roi or cam.roi, render=render)
+                    job_id = tenant.vision_jobs.submit(jpeg, worker=task, camera=cam.cam_id)
                 else:
-                    result = {"error": "Vision Module Not Loaded. (Check terminal logs for import error)"}
+                    task = functools.partial(vision_analysis.analyze_plant_growth, scale=scale, roi=roi, render=render)
+                    job_id = tenant.vision_jobs.submit(image_url, worker=task)
+                if job_id is None:
+                    self.send_json(503, {"error": "분석 대기열이 가득 찼습니다. 잠시 후 다시 시도하세요."})
+                    return
                 
-                # 3. 결과 반환
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(result).encode('utf-8'))
+                # 3. 작업 ID 반환 (결과는 GET /api/analyze_growth?job=<ID>&wait=<초> 로 조회)
+                self.send_json(202, {"job_id": job_id, "status": "queued"})
                 
             except Exception as e:
-                print(f"Analysis API Error: {e}")
+                logger.error("Analysis API Error: %s", e)
                 self.send_error(500, str(e))
 
+        def handle_growth_job(self):
+            """
+            GET /api/analyze_growth?job=<ID>[&wait=<초>] : 작업 상태/결과 조회
+            (wait 지정 시 완료까지 최대 30초 대기하는 롱 폴링은 이벤트 루프의 growth_job_http가 처리하고, 여기는 즉시 응답)
+            """
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            job_id = params.get('job', [''])[0]
+            try:
+                wait = min(max(float(params.get('wait', ['0'])[0]), 0), 30)
+            except ValueError:
+                self.send_error(400, "Invalid 'wait' parameter")
+                return
+            jobs = self.tenant.vision_jobs
+            job = jobs.get(job_id) if jobs else None
+            if job is None:
+                self.send_error(404, "Unknown analysis job")
+                return
+            self.send_json(200, job)
+
+        def send_json(self, status, payload):
+            self.send_response(status)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(payload).encode('utf-8'))
+
         def handle_journal_post(self):
-            # ... (Existing Code) ...
             try:
                 # 1. Body 읽기
                 content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length)
                 entry = json.loads(post_data.decode('utf-8'))
+                if not isinstance(entry, dict):
+                    self.send_error(400, "Journal entry must be a JSON object")
+                    return
                 
-                # 2. 파일에 저장 (prepend)
-                file_path = f"{DATA_DIR}/journal.json"
-                journals = []
-                
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        try:
-                            journals = json.load(f)
-                        except json.JSONDecodeError:
-                            journals = []
-                
-                journals.insert(0, entry) # 최신순
-                
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(journals, f, ensure_ascii=False, indent=2)
+                # 2. 로그 끝에 1줄 추가 (기존 항목은 다시 쓰지 않음)
+                entry_id = self.tenant.journal.append(entry)
                 
                 self.send_response(200)
+                self.send_header('Content-type', 'application/json')
                 self.end_headers()
-                self.wfile.write(b"OK")
+                self.wfile.write(json.dumps({"id": entry_id}).encode('utf-8'))
                 
+            except (ValueError, TypeError) as e:
+                self.send_error(400, f"Invalid journal entry: {e}")
             except Exception as e:
-                print(f"Journal Save Error: {e}")
+                logger.error("Journal Save Error: %s", e)
                 self.send_error(500, str(e))
 
 
@@ -416,92 +622,70 @@ async def web_server_task():
                 query = urllib.parse.urlparse(self.path).query
                 params = urllib.parse.parse_qs(query)
                 target_date = params.get('date', [None])[0] # YYYY-MM-DD
+                try:
+                    step = int(params.get('step', ['60'])[0]) # 집계 간격(초)
+                except ValueError:
+                    step = 60
                 
                 if not target_date:
                     self.send_error(400, "Missing 'date' parameter")
                     return
 
-                # 2. 데이터 수집 (CSV + Google Sheets)
-                ym_prefix = target_date[:7].replace('-', '_')
-                file_path = f"{DATA_DIR}/tsdb_{ym_prefix}.csv"
+                # 2. 데이터 수집 (TSDB + Google Sheets)
                 result_data = {"labels": [], "temp": [], "humi": []}
+                try:
+                    day = datetime.strptime(target_date, "%Y-%m-%d").date()
+                except ValueError:
+                    self.send_error(400, "Invalid 'date' parameter (YYYY-MM-DD)")
+                    return
                 
-                # A. 로컬 CSV 시도
-                if os.path.exists(file_path):
-                    encodings = ['utf-8-sig', 'utf-8']
-                    lines = []
-                    for enc in encodings:
-                        try:
-                            with open(file_path, 'r', encoding=enc) as f:
-                                lines = f.readlines()
-                            break
-                        except: continue
-                    if lines:
-                        reader = csv.DictReader(lines)
-                        for row in reader:
-                            ts = row.get('timestamp', '')
-                            if ts.startswith(target_date):
-                                t_str = ts.split(' ')[1][:5]
-                                dev = row.get('device_name', '')
-                                try: val = float(row.get('value', '0'))
-                                except: continue
-                                if "온도" in dev or "Temp" in dev:
-                                    result_data["temp"].append({"t": t_str, "y": val})
-                                elif "습도" in dev or "Humi" in dev:
-                                    result_data["humi"].append({"t": t_str, "y": val})
-
-                # B. Google Sheets 보충
-                if (not result_data["temp"] or not result_data["humi"]) and GS_SHEET:
-                    print(f"🌐 [API] Google Sheets에서 {target_date} 복구 시도...")
-                    try:
-                        all_rec = GS_SHEET.get_all_records()
-                        for row in all_rec:
-                            ts = str(row.get('timestamp', ''))
-                            if ts.startswith(target_date):
-                                t_str = ts.split(' ')[1][:5]
-                                dev = row.get('device_name', '')
-                                try: val = float(row.get('value', '0'))
-                                except: continue
-                                entry = {"t": t_str, "y": val}
-                                if ("온도" in dev or "Temp" in dev):
-                                    if not any(x['t'] == t_str for x in result_data["temp"]):
-                                        result_data["temp"].append(entry)
-                                elif ("습도" in dev or "Humi" in dev):
-                                    if not any(x['t'] == t_str for x in result_data["humi"]):
-                                        result_data["humi"].append(entry)
-                        result_data["temp"].sort(key=lambda x: x["t"])
-                        result_data["humi"].sort(key=lambda x: x["t"])
-                    except Exception as ge: print(f"⚠️ [API] GS Error: {ge}")
+                # A. 로컬 TSDB 롤업 조회 (요청 간격에 맞는 가장 작은 집계, 해당 일자 파티션만 memory-map)
+                midnight = int(datetime.combine(day, datetime.min.time()).timestamp())
+                tenant = self.tenant
+                result_data["temp"], result_data["humi"] = history_series(tenant.tsdb, midnight, step)
+
+                # B. Google Sheets 보충 (시트를 직접 받지 않고 로컬 미러의 해당 일자만 조회)
+                if not result_data["temp"] or not result_data["humi"]:
+                    mirror_temp, mirror_humi = history_series(tenant.gs_mirror.store, midnight, step)
+                    for key, extra in (("temp", mirror_temp), ("humi", mirror_humi)):
+                        if extra:
+                            seen = {x['t'] for x in result_data[key]}
+                            result_data[key].extend(x for x in extra if x['t'] not in seen)
+                            result_data[key].sort(key=lambda x: x["t"])
 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps(result_data).encode('utf-8'))
             except Exception as e:
-                print(f"API Error: {e}")
+                logger.error("API Error: %s", e)
                 self.send_error(500, str(e))
         
         def handle_journal_list(self):
+            """GET /api/journal?limit=<개수>&before=<ID> : 최신순 커서 페이지"""
             try:
-                file_path = f"{DATA_DIR}/journal.json"
-                journals = []
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        try:
-                            journals = json.load(f)
-                        except: 
-                            pass
+                params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                try:
+                    limit = min(max(int(params.get('limit', ['50'])[0]), 1), 500)
+                    before = params.get('before', [None])[0]
+                    before = int(before) if before is not None else None
+                except ValueError:
+                    self.send_error(400, "Invalid 'limit' or 'before' parameter")
+                    return
+
+                journal = self.tenant.journal
+                items, next_before = journal.page(limit, before)
                 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
-                self.wfile.write(json.dumps(journals).encode('utf-8'))
+                self.wfile.write(json.dumps({"items": items, "next_before": next_before, "total": len(journal)}).encode('utf-8'))
             except Exception as e:
                 self.send_error(500, str(e))
         
         def handle_growth_list(self):
             try:
-                file_path = f"{DATA_DIR}/growth_log.json"
+                file_path = f"{self.tenant.data_dir}/growth_log.json"
                 logs = []
                 if os.path.exists(file_path):
                     with open(file_path, 'r', encoding='utf-8') as f:
@@ -516,7 +700,58 @@ async def web_server_task():
             except Exception as e:
                 self.send_error(500, str(e))
 
+    # 🗂️ html/ 정적 파일은 시작 시 메모리에 적재 (gzip/brotli 변형 + ETag, 변경 시 자동 갱신)
+    #    캐시에 없는 경로(/data/ 등)는 기존 핸들러(translate_path)가 처리
+    static = StaticCache(os.path.join(BASE_DIR, 'html')).load()
+    static_task = asyncio.create_task(static.run())
+
+    # 실시간 경로는 요청 농장의 허브로 보냄 (농장 헤더는 라우터가 지정)
+    def live_http(path, headers):
+        return ROUTER.get(headers.get(TENANT_HEADER.lower())).live_hub.handle_http(path, headers)
+
+    async def live_stream(reader, writer, path, headers):
+        await ROUTER.get(headers.get(TENANT_HEADER.lower())).live_hub.stream(reader, writer, path, headers)
+
+    # ⏳ 분석 결과 롱 폴링(wait>0)은 이벤트 루프에서 작업 Future를 기다림 (대기 중 핸들러 스레드를 잡지 않음)
+    #    제출(POST), 즉시 조회, 잘못된 요청은 None을 반환하여 기존 핸들러(handle_growth_job 등)로 넘김
+    async def growth_job_http(path, headers):
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+        job_id = params.get('job', [''])[0]
+        try:
+            wait = min(max(float(params.get('wait', ['0'])[0]), 0), 30)
+        except ValueError:
+            return None
+        jobs = ROUTER.get(headers.get(TENANT_HEADER.lower())).vision_jobs
+        if not job_id or not wait > 0 or jobs is None:
+            return None
+        job = await jobs.wait_async(job_id, wait)
+        if job is None:
+            return None
+        body = json.dumps(job).encode('utf-8')
+        return b"HTTP/1.1 200 OK\r\nContent-type: application/json\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+
+    # 📏 /metrics는 이벤트 루프에서 바로 응답 (핸들러 스레드 풀이 밀려 있어도 수집 가능)
+    def metrics_http(path, headers):
+        body = metrics.REGISTRY.render().encode('utf-8')
+        return (f"HTTP/1.1 200 OK\r\nContent-Type: {metrics.CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\n\r\n").encode('latin-1') + body
+
     # 현재 디렉토리를 서빙하는 핸들러 생성
+    # 모델 계산·수확 예측은 별도 실행기, 이미지 분석은 공유 프로세스 풀에서 처리하여 다른 대시보드 요청을 막지 않음
+    server = AsyncHTTPServer(
+        SmartFarmHandler,
+        heavy_prefixes=('/api/run_model', '/api/forecast'),
+        stream_routes={'/api/live/stream': live_stream},
+        loop_routes={'/api/live': live_http, '/data/live_data.json': live_http, '/metrics': metrics_http,
+                     '/api/analyze_growth': growth_job_http},
+        router=ROUTER.route,
+        static=static,
+        request_seconds=HTTP_SECONDS,
+        metric_routes=('/health', '/promo.html', '/api/history', '/api/journal', '/api/growth', '/api/run_model',
+                       '/api/forecast', '/api/analyze_growth', '/api/cameras', '/api/mqtt', '/api/shards', '/api/farms',
+                       '/api/live', '/data/', '/metrics'),
+    )
+    metrics.gauge("mqnet_http_connections", "열린 HTTP 연결 수", callback=lambda: server.connections)
     
     server_started = False
     max_tries = 10
@@ -524,45 +759,52 @@ async def web_server_task():
     
     while retry_count < max_tries:
         try:
-            # socketserver.TCPServer는 블로킹이므로 스레드에서 실행
-            # 파이썬 3.7+ ThreadingHTTPServer 권장되지만 호환성 위해 TCPServer 사용
-            with socketserver.TCPServer(("0.0.0.0", PORT), SmartFarmHandler) as httpd:
-                print(f"🌍 [{DATA_DIR}] 서버가 가동되었습니다: http://0.0.0.0:{PORT}/")
-                print(f"   ㄴ API 엔드포인트: http://localhost:{PORT}/api/history")
-                server_started = True
-                await asyncio.to_thread(httpd.serve_forever)
-                break
+            httpd = await server.start("0.0.0.0", PORT)
         except OSError as e:
             if 'PORT' in os.environ:
                 # Render와 같이 환경 변수로 포트가 지정된 경우, 해당 포트가 안 되면 즉시 에러
-                print(f"❌ 지정된 포트 {PORT}를 사용할 수 없습니다: {e}")
+                logger.error("❌ 지정된 포트 %d를 사용할 수 없습니다: %s", PORT, e)
                 raise
-            print(f"⚠️ 포트 {PORT}가 이미 사용 중입니다. 다음 포트로 시도합니다...")
+            logger.warning("⚠️ 포트 %d가 이미 사용 중입니다. 다음 포트로 시도합니다...", PORT)
             PORT += 1
             retry_count += 1
+            continue
+
+        logger.info("🌍 [%s] 서버가 가동되었습니다: http://0.0.0.0:%d/", DATA_DIR, PORT)
+        logger.info("   ㄴ API 엔드포인트: http://localhost:%d/api/history", PORT)
+        if len(ROUTER) > 1:
+            for tenant in ROUTER:
+                logger.info("   ㄴ [%s] http://localhost:%d/farm/%s/html/index.html (%s)", tenant.name, PORT, tenant.name, tenant.data_dir)
+        server_started = True
+        async with httpd:
+            await httpd.serve_forever()
+        break
     
+    static_task.cancel()
     if not server_started:
-        print("❌ 웹 서버를 시작할 수 없습니다.")
+        logger.error("❌ 웹 서버를 시작할 수 없습니다.")
 
-async def dynamic_coordinator_task():
+async def dynamic_coordinator_task(tenant):
     """
-    하루 4번(00, 06, 12, 18시) 날짜를 점검하여 구역별 재배 단계 및 임계값을 업데이트합니다.
+    하루 4번(00, 06, 12, 18시) 날짜를 점검하여 농장의 구역별 재배 단계 및 임계값을 업데이트합니다.
     초기 실행 시 1회 즉시 동기화를 수행합니다.
     """
     CHECK_HOURS = {0, 6, 12, 18}
-    print(f"📅 [Coordinator] 정기 업데이트 모드 가동 (예정 시간: {sorted(list(CHECK_HOURS))}시)")
+    logger.info("📅 [Coordinator] [%s] 정기 업데이트 모드 가동 (예정 시간: %s시)", tenant.name, sorted(CHECK_HOURS))
     
     last_run_hour = -1
     last_processed_stages = {} # {node_id: last_recipe}
     first_run = True
+    run_seconds, recipe_nodes = COORDINATOR_SECONDS.labels(tenant.name), RECIPE_NODES.labels(tenant.name)
 
     while True:
         try:
             now = datetime.now()
             # 정해진 시간이거나 초기 실행인 경우
             if first_run or (now.hour in CHECK_HOURS and now.hour != last_run_hour):
+                started = time.perf_counter()
                 # 1. 설정 로드
-                with open(f'{DATA_DIR}/zone_config.json', 'r', encoding='utf-8') as f:
+                with open(f'{tenant.data_dir}/zone_config.json', 'r', encoding='utf-8') as f:
                     zones = json.load(f)
                 
                 for zone in zones:
@@ -583,69 +825,119 @@ async def dynamic_coordinator_task():
                     
                     target_recipe = f"{crop}.{current_stage}"
                     
-                    # 3. 해당 구역의 노드들을 찾아 임계값 업데이트
-                    for node_id, node in SYSTEM_REGISTRY.items():
-                        if node_id.startswith(zone_id_prefix):
-                            if last_processed_stages.get(node_id) != target_recipe:
-                                success = node.update_thresholds(target_recipe)
-                                if success:
-                                    prefix = "🚀 [Initial]" if first_run else f"⏰ [{now.hour:02d}:00]"
-                                    print(f"{prefix} {node_id} 단계 확인: {target_recipe} 임계값 적용")
-                                    last_processed_stages[node_id] = target_recipe
+                    # 3. 해당 구역의 노드들을 찾아 임계값 일괄 업데이트 (카탈로그 캐시 + 뱅크 배열 대입)
+                    #    (샤드 모드면 노드가 속한 샤드 워커로 레시피 명령 전달)
+                    node_ids = tenant.shards.node_ids if tenant.shards else tenant.farm.registry
+                    pending = [node_id for node_id in node_ids
+                               if node_id.startswith(zone_id_prefix) and last_processed_stages.get(node_id) != target_recipe]
+                    if tenant.shards:
+                        applied = pending and tenant.shards.apply_recipe(pending, target_recipe)
+                    else:
+                        applied = pending and apply_recipe([tenant.farm.registry[n] for n in pending], target_recipe)
+                    if applied:
+                        prefix = "🚀 [Initial]" if first_run else f"⏰ [{now.hour:02d}:00]"
+                        logger.info("%s %s 구역 %d개 노드 단계 확인: %s 임계값 적용", prefix, zone_id_prefix, len(pending), target_recipe)
+                        for node_id in pending:
+                            last_processed_stages[node_id] = target_recipe
+                        recipe_nodes.inc(len(pending))
 
                 last_run_hour = now.hour
                 first_run = False
+                run_seconds.observe(time.perf_counter() - started)
 
         except Exception as e:
-            print(f"⚠️ [Coordinator Error] {e}")
+            logger.error("⚠️ [Coordinator Error] [%s] %s", tenant.name, e, key=("coordinator-error", tenant.name), every=600)
         
         # 1분 단위로 체크
         await asyncio.sleep(60)
 
-async def main():
-    # 0. Google Sheets 초기화 (이벤트 루프 시작 후 수행)
-    init_google_sheets()
-
-    # 1. 파일에서 설정 로드
+def load_tenant_nodes(tenant):
+    """농장의 config.json으로 노드를 프로비저닝하고 틱 스케줄러에 등록합니다. 반환값: 노드 수 (설정이 없으면 None)"""
     try:
-        with open(f'{DATA_DIR}/config.json', 'r', encoding='utf-8') as f:
+        with open(f'{tenant.data_dir}/config.json', 'r', encoding='utf-8') as f:
             config_data = json.load(f)
     except FileNotFoundError:
-        print(f"{DATA_DIR}/config.json 파일을 찾을 수 없어 기본 시뮬레이션을 실행합니다.")
-        return
+        logger.warning("%s/config.json 파일을 찾을 수 없어 기본 시뮬레이션을 실행합니다.", tenant.data_dir)
+        return None
+
+    logger.info("[%s: %d개의 노드 설정 로드 완료...]", tenant.name, len(config_data))
 
-    all_tasks = []
-    print(f"[{len(config_data)}개의 노드 설정 로드 완료...]")
+    if NODE_SHARDS > 1:
+        # 샤드 모드: 구역 접두사 단위로 워커 프로세스에 분산 (이 프로세스의 레지스트리는 비워 둠)
+        try:
+            with open(f'{tenant.data_dir}/zone_config.json', 'r', encoding='utf-8') as f:
+                zone_ids = [zone['id'] for zone in json.load(f)]
+        except (OSError, ValueError, KeyError):
+            zone_ids = []
+        tenant.shards = ShardPool(config_data, tenant.data_dir, shards=NODE_SHARDS, name=tenant.name, zone_ids=zone_ids).start()
+        if tenant.mqtt_gateway:
+            # 이 프로세스의 레지스트리가 비어 있으므로 바이너리 장치 인덱스는 샤드 배치에서 해석
+            tenant.mqtt_gateway.shards = tenant.shards
+            tenant.mqtt_gateway.devices.provisioned = tenant.shards.device_entries()
+        return len(config_data)
 
     for node_cfg in config_data:
         node_id = node_cfg['id']
-        node = ESP32C3Node(node_id)
+        node = ESP32C3Node(node_id, farm=tenant.farm)
         node.provision(node_cfg)
         
         # 할당된 핀 정보 출력
-        print(f"   [{node_id}] Pin Map: ", end="")
         pin_info = [f"{dev_id}({info['pin']})" for dev_id, info in node.get_pin_map().items()]
-        print(", ".join(pin_info))
+        logger.info("   [%s] Pin Map: %s", node_id, ", ".join(pin_info))
         
-        # 비동기 실행 추가
+        # 배치 스케줄러에 등록 (노드별 주기 지터는 그대로 유지)
         interval = random.uniform(4, 6)
-        all_tasks.append(node.run_forever(interval=interval))
+        tenant.scheduler.add(node, interval=interval)
+
+    # 자동화 대상 해석 결과는 프로비저닝 직후 1회만 보고
+    report_unresolved(tenant.farm)
+    return len(config_data)
 
-    # 2. 태스크 추가 (5분=300초 간격으로 로그 기록)
-    all_tasks.append(tsdb_logger_task(interval=300))
-    all_tasks.append(web_server_task())
-    all_tasks.append(dynamic_coordinator_task())
+async def main():
+    # 0. 농장별로 파일에서 설정 로드 (설정이 없는 농장은 건너뜀)
+    #    샤드 워커/분석 프로세스 풀은 다른 스레드가 생기기 전에 미리 fork (분석 풀은 모든 농장이 첫 번째 농장의 풀을 공유)
+    active = [tenant for tenant in TENANTS if load_tenant_nodes(tenant) is not None]
+    if not active:
+        return
+    for tenant in TENANTS:
+        if tenant.vision_jobs:
+            tenant.vision_jobs.start()
+    for tenant in TENANTS:
+        tenant.cameras.start()
+        if tenant.mqtt_gateway:
+            tenant.mqtt_gateway.registrar.start()
+
+    # 0-1. Google Sheets 초기화 (이벤트 루프 시작 후 수행)
+    init_google_sheets()
 
-    print(f"\n[실행 시작] 모든 노드와 통합 서버가 작동합니다.")
-    print("------------------------------------------------------------------")
+    # 2. 태스크 추가 (5분=300초 간격으로 로그 기록). 웹 서버와 이벤트 루프 지연 측정은 모든 농장이 함께 사용
+    all_tasks = [web_server_task(), metrics.watch_loop_lag()]
+    for tenant in active:
+        if not tenant.shards:
+            all_tasks.append(tenant.scheduler.run())
+        all_tasks.append(tsdb_logger_task(tenant, interval=300))
+        all_tasks.append(dynamic_coordinator_task(tenant))
+        if tenant.vision_jobs:
+            all_tasks.append(tenant.vision_jobs.run())
+            if len(tenant.cameras):
+                interval = int(os.environ.get('CAMERA_ANALYSIS_INTERVAL', 600))
+                all_tasks.append(tenant.cameras.run(tenant.vision_jobs, vision_analysis.analyze_jpeg, interval=interval))
+        if tenant.gs_sheet:
+            all_tasks.append(tenant.gs_uploader.run())
+            all_tasks.append(tenant.gs_mirror.run())
+        if tenant.mqtt_gateway:
+            all_tasks.append(tenant.mqtt_gateway.run())
+
+    logger.info("\n[실행 시작] 모든 노드와 통합 서버가 작동합니다. (농장 %d곳)", len(active))
+    logger.info("------------------------------------------------------------------")
 
     try:
         # 모든 태스크가 종료될 때까지 무한 실행
         await asyncio.gather(*all_tasks)
     except KeyboardInterrupt:
-        print("\n[정지] 사용자가 프로그램을 종료했습니다.")
+        logger.info("\n[정지] 사용자가 프로그램을 종료했습니다.")
     except Exception as e:
-        print(f"\n[오류 발생] {e}")
+        logger.error("\n[오류 발생] %s", e)
 
 if __name__ == "__main__":
     asyncio.run(main())
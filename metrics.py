@@ -0,0 +1,346 @@
+import asyncio
+import math
+import threading
+import time
+from bisect import bisect_left
+from threading import get_ident
+
+from sf_core.log import get_logger
+
+logger = get_logger("metrics")
+
+# Prometheus 텍스트 노출 형식 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 기본 지연 버킷(초): 1ms ~ 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ---------------------------------------------------------------- 값 (라벨 조합 1개당 1개)
+# 기록은 잠금 없이 스레드별 칸에만 씁니다. (잠금 획득/해제가 기록 비용의 대부분을 차지하므로)
+# 칸은 스레드 ID마다 1개라 다른 스레드와 겹쳐 쓰지 않고, 수집 시점에 모든 칸을 합산합니다.
+class _CounterValue:
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = {}   # 스레드 ID -> [값]
+
+    def inc(self, amount=1):
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._cells[get_ident()] = [0]
+        cell[0] += amount
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in list(self._cells.values()))
+
+
+class _GaugeValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+
+class _Timer:
+    __slots__ = ("target", "start")
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.start)
+
+
+class _HistogramValue:
+    """고정 버킷 히스토그램: 관측 1건 = 이진 탐색 1번 + 칸 증가 (누적 합산은 수집 시점에 계산)"""
+    __slots__ = ("bounds", "_cells")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self._cells = {}   # 스레드 ID -> [버킷별 건수..., +Inf 건수, 합계]
+
+    def observe(self, value):
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._cells[get_ident()] = [0] * (len(self.bounds) + 1) + [0.0]
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        """with hist.time(): ... 블록의 실행 시간을 관측합니다."""
+        return _Timer(self)
+
+    def snapshot(self):
+        """(버킷별 건수 목록(+Inf 포함, 비누적), 합계)"""
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0.0
+        for cell in list(self._cells.values()):
+            for i, count in enumerate(cell[:-1]):
+                counts[i] += count
+            total += cell[-1]
+        return counts, total
+
+
+# ---------------------------------------------------------------- 지표 (이름 1개 + 라벨 조합별 값)
+class _Metric:
+    kind = ""
+    _value_class = None
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # 라벨이 없으면 값의 메서드를 그대로 노출 (위임 호출 1단계를 없앰)
+            self._default = self.labels()
+            for attr in self._exposed:
+                setattr(self, attr, getattr(self._default, attr))
+
+    def _new_value(self):
+        return self._value_class()
+
+    def labels(self, *values):
+        """라벨 값 조합의 값 객체. 핫 패스에서는 반환값을 보관해 두고 쓰면 사전 조회도 생략됩니다."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._create(values)
+        return child
+
+    def _create(self, values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: 라벨 {self.labelnames}에 값 {values}가 맞지 않습니다.")
+        key = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_value()
+            # 숫자 등 문자열이 아닌 값으로 조회해도 다음부터 바로 맞도록 별칭 등록 (출력은 문자열 키만)
+            self._children[values] = child
+        return child
+
+    def _items(self):
+        return [(values, child) for values, child in list(self._children.items())
+                if all(type(v) is str for v in values)]
+
+    def samples(self):
+        """(접미사, 라벨 이름, 라벨 값, 값) 목록"""
+        for values, child in self._items():
+            yield "", self.labelnames, values, child.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(names, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _value_class = _CounterValue
+    _exposed = ("inc",)
+
+
+class Gauge(_Metric):
+    """
+    값을 직접 set/inc/dec 하거나, callback을 주어 수집 시점에 읽습니다. (큐 길이 등 다른 객체가 이미 가진 값)
+    callback은 숫자, 또는 라벨이 있으면 {라벨 값 튜플: 숫자} dict를 반환합니다.
+    """
+    kind = "gauge"
+    _value_class = _GaugeValue
+    _exposed = ("set", "inc", "dec")
+
+    def __init__(self, name, doc, labelnames=(), callback=None):
+        super().__init__(name, doc, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        if self.callback is None:
+            yield from super().samples()
+            return
+        try:
+            result = self.callback()
+        except Exception as e:
+            logger.warning("⚠️ [Metrics] %s 수집 실패: %s", self.name, e, key=("collect", self.name), every=300)
+            return
+        if not self.labelnames:
+            yield "", (), (), result
+            return
+        for values, value in result.items():
+            yield "", self.labelnames, values if isinstance(values, tuple) else (values,), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    _exposed = ("observe", "time")
+
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, doc, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.bounds)
+
+    def samples(self):
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", self.labelnames + ("le",), values + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, values, total
+            yield "_count", self.labelnames, values, cumulative
+
+
+class Registry:
+    """지표 모음. 같은 이름을 다시 요청하면 기존 지표를 돌려주므로 모듈/농장마다 따로 선언해도 됩니다."""
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, doc, labelnames, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, doc, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"지표 {name}이(가) 다른 종류/라벨로 이미 등록되어 있습니다.")
+            return metric
+
+    def counter(self, name, doc, labelnames=()):
+        return self._get(Counter, name, doc, labelnames)
+
+    def gauge(self, name, doc, labelnames=(), callback=None):
+        metric = self._get(Gauge, name, doc, labelnames)
+        if callback is not None:
+            metric.callback = callback
+        return metric
+
+    def histogram(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, doc, labelnames, buckets=buckets)
+
+    def render(self):
+        """Prometheus 텍스트 형식 전체 (/metrics 응답 본문)"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+async def watch_loop_lag(interval=0.5, registry=REGISTRY):
+    """
+    이벤트 루프 지연 측정: interval초 sleep이 예정보다 늦게 깨어난 만큼이 루프가 막혀 있던 시간입니다.
+    (동기 I/O, 긴 계산 등으로 다른 코루틴이 밀린 정도)
+    """
+    lag_hist = registry.histogram("mqnet_event_loop_lag_seconds", "이벤트 루프 지연 (sleep 초과 시간)",
+                                  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+    lag_max = registry.gauge("mqnet_event_loop_lag_max_seconds", "이벤트 루프 최대 지연 (프로세스 시작 이후)")
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    try:
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            lag_hist.observe(lag)
+            if lag > worst:
+                worst = lag
+                lag_max.set(lag)
+    except asyncio.CancelledError:
+        pass
+
+
+if __name__ == "__main__":
+    # 벤치마크/자가 점검: 핫 패스 기록 비용(이벤트 1건당)과 텍스트 출력 형식
+    import timeit
+
+    reg = Registry()
+    c = reg.counter("demo_total", "데모 카운터")
+    h = reg.histogram("demo_seconds", "데모 지연", ("route", "code"))
+    g = reg.gauge("demo_depth", "데모 큐 길이", ("queue",), callback=lambda: {("mqtt",): 3, ("sheets",): 0})
+    child = h.labels("/api/history", 200)
+    assert h.labels("/api/history", "200") is child
+
+    for v in (0.0004, 0.003, 0.003, 0.2, 42):
+        child.observe(v)
+    c.inc()
+    c.inc(2)
+    text = reg.render()
+    assert 'demo_seconds_bucket{route="/api/history",code="200",le="0.001"} 1' in text
+    assert 'demo_seconds_bucket{route="/api/history",code="200",le="0.005"} 3' in text
+    assert 'demo_seconds_bucket{route="/api/history",code="200",le="+Inf"} 5' in text
+    assert 'demo_seconds_count{route="/api/history",code="200"} 5' in text
+    assert "demo_total 3" in text
+    assert 'demo_depth{queue="mqtt"} 3' in text
+    print(text)
+
+    n = 1_000_000
+    env = {"f": lambda: None, "c": c, "h": h, "child": child}
+    base = timeit.timeit("f()", globals=env, number=n) / n
+    cases = {
+        "counter.inc()": "c.inc()",
+        "histogram child.observe(v)": "child.observe(0.012)",
+    }
+    hot = set(cases)
+    cases["histogram.labels(..).observe(v)"] = "h.labels('/api/history', 200).observe(0.012)"  # 참고: 라벨 조회 포함
+    print(f"이벤트 1건당 기록 비용 ({n:,}회 평균, 참고: 빈 함수 호출 {base * 1e9:.0f}ns)")
+    for label, stmt in cases.items():
+        per = timeit.timeit(stmt, globals=env, number=n) / n
+        print(f"  {label:34s} {per * 1e9:6.0f} ns")
+        assert label not in hot or per < 1e-6, f"{label}: 1µs 초과"
+
+    # 수집 경합: 스레드 4개가 동시에 기록해도 누락 없음
+    hc = reg.histogram("demo_threads_seconds", "동시 기록")
+    threads = [threading.Thread(target=lambda: [hc.observe(0.01) for _ in range(50_000)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert hc.labels().snapshot()[0][3] == 200_000
+    print("스레드 4개 동시 기록 200,000건 누락 없음")
@@ -0,0 +1,506 @@
+import asyncio
+import json
+import math
+import struct
+import time
+from collections import deque
+from datetime import datetime
+
+from sf_core import DEFAULT_FARM, apply_readings
+from sf_core.log import get_logger
+import telemetry_codec as codec
+
+logger = get_logger("mqtt")
+
+# MQTT 3.1.1 패킷 타입
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = 1, 2, 3, 4, 8, 9, 12, 13, 14
+
+# 통신 규격 (add_node/protocol.md)
+TOPIC_REGISTER = "smartfarm/request/register"
+TOPIC_CONFIG = "smartfarm/config/"  # 뒤에 MAC 주소 붙음
+TOPIC_ALERT = "smartfarm/+/alert"
+TOPIC_TELEMETRY = "smartfarm/+/telemetry"
+
+
+def encode_length(n):
+    """MQTT 가변 길이(Remaining Length) 인코딩"""
+    out = bytearray()
+    while True:
+        n, digit = divmod(n, 128)
+        out.append(digit | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def encode_str(text):
+    raw = text.encode('utf-8')
+    return struct.pack('!H', len(raw)) + raw
+
+
+def make_packet(ptype, flags, body=b""):
+    return bytes([ptype << 4 | flags]) + encode_length(len(body)) + body
+
+
+def publish_packet(topic, payload, qos=0, packet_id=0):
+    body = encode_str(topic) + (struct.pack('!H', packet_id) if qos else b"") + payload
+    return make_packet(PUBLISH, qos << 1, body)
+
+
+async def read_packet(reader):
+    """패킷 1개를 읽습니다. 반환값: (타입, 플래그, 본문). 연결이 끊기면 IncompleteReadError"""
+    head = await reader.readexactly(2)
+    length, digit, shift = head[1] & 0x7F, head[1], 7
+    while digit & 0x80:
+        if shift > 21:
+            raise ValueError("malformed remaining length")
+        digit = (await reader.readexactly(1))[0]
+        length |= (digit & 0x7F) << shift
+        shift += 7
+    body = await reader.readexactly(length) if length else b""
+    return head[0] >> 4, head[0] & 0x0F, body
+
+
+def parse_publish(flags, body):
+    """반환값: (토픽, QoS, 패킷 ID 또는 None, 페이로드 bytes)"""
+    size = struct.unpack_from('!H', body)[0]
+    topic = body[2:2 + size].decode('utf-8')
+    pos = 2 + size
+    qos = (flags >> 1) & 0x03
+    packet_id = None
+    if qos:
+        packet_id = struct.unpack_from('!H', body, pos)[0]
+        pos += 2
+    return topic, qos, packet_id, body[pos:]
+
+
+def topic_matches(pattern, topic):
+    """구독 필터(+, # 와일드카드)와 토픽 일치 여부"""
+    p_parts, t_parts = pattern.split('/'), topic.split('/')
+    for i, part in enumerate(p_parts):
+        if part == '#':
+            return True
+        if i >= len(t_parts) or (part != '+' and part != t_parts[i]):
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class MqttClient:
+    """
+    asyncio 스트림 위의 최소 MQTT 3.1.1 클라이언트 (QoS 0 발행, QoS 0/1 수신).
+    이벤트 루프를 막는 별도 네트워크 루프(paho loop_forever) 없이 messages()로 수신 메시지를 받습니다.
+    """
+    def __init__(self, host, port=1883, client_id="smartfarm", keepalive=60, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.username = username
+        self.password = password
+        self.reader = None
+        self.writer = None
+        self._packet_id = 0
+        self._pinger = None
+
+    async def connect(self, timeout=10):
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        flags = 0x02  # clean session
+        payload = encode_str(self.client_id)
+        if self.username is not None:
+            flags |= 0x80
+            payload += encode_str(self.username)
+            if self.password is not None:
+                flags |= 0x40
+                payload += encode_str(self.password)
+        body = encode_str("MQTT") + bytes([4, flags]) + struct.pack('!H', self.keepalive) + payload
+        self.writer.write(make_packet(CONNECT, 0, body))
+        await self.writer.drain()
+        ptype, _, body = await asyncio.wait_for(read_packet(self.reader), timeout)
+        if ptype != CONNACK or len(body) < 2 or body[1] != 0:
+            raise ConnectionError(f"CONNACK 거부 (code: {body[1] if len(body) > 1 else '?'})")
+        if self.keepalive:
+            self._pinger = asyncio.create_task(self._ping_loop())
+        return self
+
+    async def _ping_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive / 2)
+                self.writer.write(make_packet(PINGREQ, 0))
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+
+    def _next_id(self):
+        self._packet_id = self._packet_id % 65535 + 1
+        return self._packet_id
+
+    async def subscribe(self, topics):
+        """topics: [(필터, QoS), ...]. SUBACK은 messages()가 소비합니다."""
+        body = struct.pack('!H', self._next_id())
+        for topic, qos in topics:
+            body += encode_str(topic) + bytes([qos])
+        self.writer.write(make_packet(SUBSCRIBE, 0x02, body))
+        await self.writer.drain()
+
+    def publish(self, topic, payload):
+        """QoS 0 발행 (송신 버퍼에 넣기만 함, 흐름 제어가 필요하면 drain() 호출)"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.writer.write(publish_packet(topic, payload))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def messages(self):
+        """수신 PUBLISH를 (토픽, 페이로드 bytes)로 차례로 돌려줍니다. 연결이 끊기면 ConnectionError"""
+        try:
+            while True:
+                ptype, flags, body = await read_packet(self.reader)
+                if ptype == PUBLISH:
+                    topic, qos, packet_id, payload = parse_publish(flags, body)
+                    if qos:
+                        self.writer.write(make_packet(PUBACK, 0, struct.pack('!H', packet_id)))
+                    yield topic, payload
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("broker closed connection")
+
+    async def close(self):
+        if self._pinger:
+            self._pinger.cancel()
+        if self.writer:
+            try:
+                self.writer.write(make_packet(DISCONNECT, 0))
+                self.writer.close()
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+class MqttGateway:
+    """
+    이벤트 루프 안에서 동작하는 MQTT 수집 게이트웨이.
+    - 등록/경보/텔레메트리 토픽을 구독하고, 수신 즉시 JSON을 해석해 제한된 큐(queue_size)에 넣습니다.
+      큐가 가득 차면 수신을 멈추므로(TCP 흐름 제어) 브로커 쪽으로 배압이 전달됩니다.
+    - 커밋 태스크는 flush_interval마다(batch_size건이 쌓이면 즉시) 최대 batch_size건을 묶어 농장(farm)의 센서 뱅크,
+      실시간 스냅샷(LiveHub.merge), 시계열 저장소(TSDB.append)에 한 번에 반영합니다.
+    텔레메트리: smartfarm/{node_id}/telemetry
+      {"ts": epoch(선택), "sensors": [{"id", "name", "val", "pin"}, ...]} 또는 센서 1개 객체,
+      또는 telemetry_codec 바이너리 프레임 (장치 인덱스는 마지막 JSON sensors 순서/등록 노드의 센서 순서)
+    """
+    def __init__(self, host, port=1883, hub=None, store=None, registrar=None, client_id="smartfarm-gateway",
+                 username=None, password=None, queue_size=10000, batch_size=2000, flush_interval=0.2, farm=None):
+        self.host = host
+        self.port = port
+        self.farm = farm or DEFAULT_FARM
+        self.shards = None  # sf_core.shards.ShardPool: 지정하면 등록 노드의 실측값을 소속 샤드로 보냄
+        self.hub = hub
+        self.store = store
+        self.registrar = registrar  # register_node(mac) / process_incoming_data(node_id, payload)
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(queue_size)
+        self._batch_ready = asyncio.Event()  # 큐에 batch_size건 이상 쌓이면 대기 중인 커밋을 즉시 깨움
+        self.client = None
+        self.connected = False
+        self.alerts = deque(maxlen=200)
+        self.devices = codec.DeviceDictionary(self.farm.registry)  # 바이너리 레코드의 장치 인덱스 해석
+        self.stats = {"received": 0, "committed": 0, "rows": 0, "batches": 0, "decode_errors": 0,
+                      "backpressure": 0, "registered": 0, "alerts": 0, "connects": 0, "last_batch": 0}
+
+    # ---------------------------------------------------------------- 수신
+    def decode(self, topic, payload):
+        """
+        토픽/페이로드를 (종류, 노드 ID, 내용, 수신 시각)으로 해석합니다. 해당 없으면 None
+        바이너리 프레임(telemetry_codec)은 헤더만 검사하고 memoryview 그대로 넘겨 커밋 시 일괄 해석합니다.
+        """
+        parts = topic.split('/')
+        if len(parts) == 3 and parts[0] == "smartfarm" and parts[2] in ("telemetry", "alert"):
+            if codec.is_binary(payload):
+                kind, _, _ = codec.read_header(payload)
+                return ("telemetry" if kind == codec.KIND_TELEMETRY else "alert", parts[1], memoryview(payload), time.time())
+            return (parts[2], parts[1], json.loads(payload), time.time())
+        if topic == TOPIC_REGISTER:
+            return ("register", None, json.loads(payload), time.time())
+        return None
+
+    async def _receive(self, client):
+        async for topic, payload in client.messages():
+            self.stats["received"] += 1
+            try:
+                item = self.decode(topic, payload)
+            except (ValueError, UnicodeDecodeError):
+                self.stats["decode_errors"] += 1
+                continue
+            if item is None:
+                continue
+            if self.queue.full():
+                self.stats["backpressure"] += 1
+            await self.queue.put(item)
+            if self.queue.qsize() >= self.batch_size:
+                self._batch_ready.set()
+
+    async def run(self):
+        """브로커 연결 유지(지수 백오프 재연결) + 커밋 태스크"""
+        committer = asyncio.create_task(self._commit_loop())
+        backoff = 1.0
+        try:
+            while True:
+                client = MqttClient(self.host, self.port, self.client_id, username=self.username, password=self.password)
+                try:
+                    await client.connect()
+                    await client.subscribe([(TOPIC_REGISTER, 0), (TOPIC_ALERT, 0), (TOPIC_TELEMETRY, 0)])
+                    self.client, self.connected = client, True
+                    self.stats["connects"] += 1
+                    backoff = 1.0
+                    logger.info("📡 [MQTT] 브로커 연결됨 (%s:%d)", self.host, self.port)
+                    await self._receive(client)
+                except (OSError, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning("⚠️ [MQTT] 연결 오류, %.0f초 후 재연결: %s", backoff, e, key="mqtt-connect", every=60)
+                finally:
+                    self.connected = False
+                    self.client = None
+                    await client.close()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+        finally:
+            committer.cancel()
+
+    # ---------------------------------------------------------------- 커밋
+    async def _commit_loop(self):
+        loop = asyncio.get_running_loop()
+        last = 0.0
+        while True:
+            batch = [await self.queue.get()]
+            wait = last + self.flush_interval - loop.time()
+            self._batch_ready.clear()
+            if wait > 0 and self.queue.qsize() < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self.commit(batch)
+            except Exception as e:
+                logger.error("⚠️ [MQTT] 배치 반영 오류 (%d건): %s", len(batch), e, key="mqtt-commit", every=10)
+            last = loop.time()
+
+    async def commit(self, batch):
+        """수신 메시지 묶음을 센서 뱅크/실시간 스냅샷/TSDB에 한 번에 반영합니다."""
+        readings, rows, external = [], [], {}
+        registers, alerts = [], []
+        frames, alert_frames = [], []  # 바이너리: (노드 ID, memoryview)
+        for kind, node_id, data, received in batch:
+            if kind == "telemetry":
+                if isinstance(data, memoryview):
+                    frames.append((node_id, data))
+                    continue
+                ts = data.get("ts") if isinstance(data, dict) else None
+                ts = int(ts) if isinstance(ts, (int, float)) and math.isfinite(ts) else int(received)
+                sensors = data.get("sensors", [data]) if isinstance(data, dict) else data
+                if not isinstance(sensors, list):
+                    # 42, null, {"sensors": null} 등 형식이 맞지 않는 메시지는 이 메시지만 버림 (배치 전체를 잃지 않도록)
+                    self.stats["decode_errors"] += 1
+                    continue
+                if isinstance(data, dict) and "sensors" in data:
+                    self.devices.learn(node_id, sensors)
+                for s in sensors:
+                    if not isinstance(s, dict) or not isinstance(s.get("id"), str) or not isinstance(s.get("val"), (int, float)):
+                        self.stats["decode_errors"] += 1
+                        continue
+                    rows.append((ts, node_id, s["id"], s.get("name", s["id"]), float(s["val"]), s.get("pin", "")))
+            elif kind == "register":
+                registers.append(data.get("mac", "unknown") if isinstance(data, dict) else "unknown")
+            elif kind == "alert":
+                if isinstance(data, memoryview):
+                    alert_frames.append((node_id, data))
+                else:
+                    alerts.append((node_id, data))
+
+        # 0. 바이너리 프레임은 종류별로 한 번에 배열로 해석
+        if frames:
+            recs, frame_idx, stamps = codec.decode_frames([buf for _, buf in frames])
+            for f, ts, dev, val in zip(frame_idx.tolist(), stamps.tolist(), recs['dev'].tolist(), recs['val'].tolist()):
+                node_id = frames[f][0]
+                device_id, name, pin = self.devices.resolve(node_id, dev)
+                rows.append((ts, node_id, device_id, name, val, pin))
+        if alert_frames:
+            recs, frame_idx, stamps = codec.decode_frames([buf for _, buf in alert_frames], codec.KIND_ALERT)
+            for f, ts, rec in zip(frame_idx.tolist(), stamps.tolist(), recs.tolist()):
+                node_id = alert_frames[f][0]
+                dev, side, val, lo, hi = rec
+                alerts.append((node_id, {"id": self.devices.resolve(node_id, dev)[0], "type": f"{codec.ALERT_SIDES.get(side, side)}_alert",
+                                         "val": round(val, 2), "min": round(lo, 2), "max": round(hi, 2),
+                                         "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")}))
+
+        for ts, node_id, device_id, name, val, pin in rows:
+            readings.append((node_id, device_id, val))
+            if node_id not in self.farm.registry and (self.shards is None or node_id not in self.shards.owner):
+                external.setdefault(node_id, {})[device_id] = {
+                    "id": device_id, "name": name, "val": round(val, 2), "pin": pin, "type": "mqtt"}
+
+        # 1. 등록된 노드는 시뮬레이션 대신 실측값으로 필터/알람/자동화 수행
+        #    (샤드 모드면 소속 샤드 워커가 반영하고, 실시간 상태는 공유 상태판을 통해 로거가 갱신)
+        if self.shards is not None:
+            self.shards.apply_readings(readings)
+            applied = []
+        else:
+            applied, _ = apply_readings(readings, farm=self.farm)
+
+        # 2. 실시간 스냅샷: 등록 노드는 필터링된 상태, 외부 노드는 수신 값 그대로
+        if self.hub is not None and (applied or external):
+            updates = {node_id: {"sensors": list(items.values())} for node_id, items in external.items()}
+            for sensor in applied:
+                updates.setdefault(sensor.node_id, {"sensors": []})["sensors"].append(sensor.get_status())
+            self.hub.merge(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), updates, external=external.keys())
+
+        # 3. 시계열 저장 (파일 쓰기는 스레드에서)
+        if self.store is not None and rows:
+            await asyncio.to_thread(self.store.append, rows)
+
+        # 4. 노드 등록 → 노드 전용 토픽으로 설정 발송, 경보 기록
+        if registers and self.registrar is not None:
+            configs = await asyncio.to_thread(lambda: [(mac, self.registrar.register_node(mac)) for mac in registers])
+            for mac, config in configs:
+                if self.client is not None:
+                    reply = {**config, "codec": self.devices.describe(config.get("node_id"))}
+                    self.client.publish(TOPIC_CONFIG + mac, json.dumps(reply, ensure_ascii=False))
+            self.stats["registered"] += len(configs)
+        for node_id, data in alerts:
+            self.alerts.append({"node_id": node_id, "received": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **(data if isinstance(data, dict) else {"payload": data})})
+            if self.registrar is not None:
+                self.registrar.process_incoming_data(node_id, data)
+        self.stats["alerts"] += len(alerts)
+
+        self.stats["committed"] += len(batch)
+        self.stats["rows"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["last_batch"] = len(batch)
+
+    def status(self):
+        return {"connected": self.connected, "broker": f"{self.host}:{self.port}", "queue": self.queue.qsize(),
+                **self.stats, "recent_alerts": list(self.alerts)[-20:]}
+
+
+if __name__ == "__main__":
+    # 자가 점검: 로컬 브로커 대역(asyncio) + 노드 100개가 텔레메트리 5만 건을 쏟아낼 때 처리량/배압/저장 확인
+    import os
+    import tempfile
+    from sf_core import ESP32C3Node
+    from live_stream import LiveHub
+    from tsdb_store import TimeSeriesStore
+    from add_node.node_manager import HWNodeManager
+
+    class Broker:
+        """구독 필터 매칭 + QoS 0 전달만 하는 최소 브로커. 구독자에게 drain()하므로 느린 구독자는 발행자를 늦춥니다."""
+        def __init__(self):
+            self.sessions = {}  # writer -> [필터]
+
+        async def handle(self, reader, writer):
+            self.sessions[writer] = []
+            try:
+                while True:
+                    ptype, flags, body = await read_packet(reader)
+                    if ptype == CONNECT:
+                        writer.write(make_packet(CONNACK, 0, b"\x00\x00"))
+                    elif ptype == SUBSCRIBE:
+                        pos, codes = 2, b""
+                        while pos < len(body):
+                            size = struct.unpack_from('!H', body, pos)[0]
+                            self.sessions[writer].append(body[pos + 2:pos + 2 + size].decode())
+                            pos += 3 + size
+                            codes += b"\x00"
+                        writer.write(make_packet(SUBACK, 0, body[:2] + codes))
+                    elif ptype == PUBLISH:
+                        topic, _, _, payload = parse_publish(flags, body)
+                        packet = publish_packet(topic, payload)
+                        for sub, filters in list(self.sessions.items()):
+                            if any(topic_matches(f, topic) for f in filters):
+                                sub.write(packet)
+                                await sub.drain()
+                    elif ptype == PINGREQ:
+                        writer.write(make_packet(PINGRESP, 0))
+                    elif ptype == DISCONNECT:
+                        break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                self.sessions.pop(writer, None)
+                writer.close()
+
+    assert topic_matches("smartfarm/+/alert", "smartfarm/AAA/alert") and not topic_matches("smartfarm/+/alert", "smartfarm/AAA/telemetry")
+    assert topic_matches("smartfarm/config/#", "smartfarm/config/MAC_1") and not topic_matches("smartfarm/+", "smartfarm/a/b")
+
+    root = tempfile.mkdtemp()
+    node = ESP32C3Node("AAA")
+    node.provision({"sensors": [{"id": "AAA001", "name": "온도 센서", "type": "analog", "min": 10, "max": 35, "filter_size": 1}]})
+
+    async def demo(total=50000, nodes=100):
+        broker = Broker()
+        server = await asyncio.start_server(broker.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        hub = LiveHub()
+        store = TimeSeriesStore(root)
+        gateway = MqttGateway("127.0.0.1", port, hub=hub, store=store,
+                              registrar=HWNodeManager(os.path.join(root, 'hw_registry.json')), queue_size=5000)
+        task = asyncio.create_task(gateway.run())
+        while not gateway.connected:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)  # SUBSCRIBE 처리 대기
+
+        device = await MqttClient("127.0.0.1", port, "device-sim").connect()
+        await device.subscribe([(TOPIC_CONFIG + "#", 0)])
+        await asyncio.sleep(0.05)
+        device.publish(TOPIC_REGISTER, json.dumps({"mac": "ESP32_TEST_01"}))
+        device.publish("smartfarm/AAA/alert", json.dumps({"id": "AAA", "type": "temp_alert", "val": 36.5}))
+        device.publish("smartfarm/AAA/telemetry", b"{broken")
+        config = await asyncio.wait_for(device.messages().__anext__(), 5)
+
+        async def burst(binary):
+            """JSON 또는 바이너리 프레임으로 total건 발행 후 모두 커밋될 때까지의 시간"""
+            start_rows = gateway.stats["rows"]
+            t0 = time.perf_counter()
+            for i in range(total):
+                node_id = "AAA" if i % nodes == 0 else f"ZB{i % nodes:03d}"
+                device_id = "AAA001" if node_id == "AAA" else f"{node_id}001"
+                val = 20 + i % 10
+                if binary:
+                    payload = codec.encode_telemetry(time.time(), [(0, val)])
+                else:
+                    payload = json.dumps({"sensors": [{"id": device_id, "name": "온도 센서", "val": val, "pin": "GPIO0(ADC)"}]})
+                device.publish(f"smartfarm/{node_id}/telemetry", payload)
+                if i % 500 == 499:
+                    await device.drain()
+            await device.drain()
+            while gateway.stats["rows"] < start_rows + total:
+                await asyncio.sleep(0.01)
+            return time.perf_counter() - t0
+
+        elapsed = {"JSON": await burst(False), "바이너리": await burst(True)}
+        device.publish("smartfarm/AAA/alert", codec.encode_alert(time.time(), [(0, "max", 36.5, 10.0, 35.0)]))
+        while gateway.stats["alerts"] < 2:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        await device.close()
+        server.close()
+        return gateway, hub, store, config, elapsed
+
+    gateway, hub, store, config, elapsed = asyncio.run(demo())
+    stats = gateway.status()
+    recs = store.query(0, 2 ** 31 - 1)
+    reply = json.loads(config[1])
+    assert config[0] == TOPIC_CONFIG + "ESP32_TEST_01" and reply["node_id"] and reply["codec"]["version"] == codec.VERSION
+    assert stats["decode_errors"] == 1 and stats["alerts"] == 2 and stats["registered"] == 1
+    assert len(recs) == 100000 and len(hub.state) == 100 and len(store.devices) == 100  # 바이너리도 같은 장치로 해석
+    assert stats["recent_alerts"][-1]["id"] == "AAA001" and stats["recent_alerts"][-1]["type"] == "max_alert"
+    assert node.sensors["AAA001"].last_value == 20 + (50000 - 100) % 10  # 마지막 실측값이 필터에 반영됨
+    for label, seconds in elapsed.items():
+        print(f"✅ {label} 텔레메트리 50000건 / {seconds:.2f}초 = {50000 / seconds:,.0f} msg/s")
+    print(f"   배치 {stats['batches']}회, 큐 포화(배압) {stats['backpressure']}회, 실시간 노드 {len(hub.state)}개")
@@ -1,16 +1,54 @@
 import asyncio
-import random
+import heapq
 import json
+import os
+import time
+import numpy as np
 from abc import ABC, abstractmethod
+from .sensor_bank import SensorBank
+from .log import get_logger
 
-# 전역 설정
-SYSTEM_REGISTRY = {}
+logger = get_logger("sf_core")
+# 센서 알람/자동화 로그는 센서(규칙)별로 이 간격(초)에 1줄만 출력 (생략된 건수는 다음 줄 끝에 표시)
+ALARM_LOG_INTERVAL = float(os.environ.get('ALARM_LOG_INTERVAL', 30))
+
+class Farm:
+    """
+    농장 1곳의 노드 런타임. 한 프로세스에서 여러 농장을 돌릴 때 농장마다 하나씩 만들며,
+    노드/센서는 자신이 속한 농장의 레지스트리/뱅크/인덱스만 사용합니다. (자동화 대상도 같은 농장 안에서만 해석)
+    """
+    def __init__(self, name="default", data_dir="data"):
+        self.name = name
+        self.data_dir = data_dir
+        # node_id -> ESP32C3Node
+        self.registry = {}
+        # 농장 내 모든 센서의 필터/임계값/알람 상태를 보관하는 벡터 뱅크
+        self.bank = SensorBank()
+        # 장치 인덱스: 액추에이터 device_id -> (node, actuator)
+        self.device_index = {}
+        # 컴파일된 자동화 디스패치 테이블: 센서 뱅크 행 -> ((min 대상, msg_id), (max 대상, msg_id))
+        self.automation_table = {}
+        # 대상 device_id -> 이를 참조하는 센서 집합 (대상이 재프로비저닝되면 재컴파일)
+        self.target_dependents = {}
+
+    def __repr__(self):
+        return f"[Farm] {self.name}({self.data_dir}) 노드 {len(self.registry)}개"
+
+
+# 전역 설정: 농장을 지정하지 않은 노드/센서는 기본 농장에 속합니다. (단일 농장 실행 시 기존 전역 이름 그대로 사용)
+DEFAULT_FARM = Farm()
+SYSTEM_REGISTRY = DEFAULT_FARM.registry
 DATA_DIR = "data"
+SENSOR_BANK = DEFAULT_FARM.bank
+DEVICE_INDEX = DEFAULT_FARM.device_index
+AUTOMATION_TABLE = DEFAULT_FARM.automation_table
+_TARGET_DEPENDENTS = DEFAULT_FARM.target_dependents
 
 def set_data_dir(path):
     global DATA_DIR
     DATA_DIR = path
-    print(f"📂 [sf_core] Data directory set to: {DATA_DIR}")
+    DEFAULT_FARM.data_dir = path
+    logger.info("📂 [sf_core] Data directory set to: %s", DATA_DIR)
 
 class BaseDevice(ABC):
     def __init__(self, device_id, name, pin, io_type):
@@ -24,103 +62,141 @@ class BaseDevice(ABC):
         pass
 
 class Sensor(BaseDevice):
-    def __init__(self, device_id, name, pin, io_type, t_min=None, t_max=None, target_min=None, target_max=None, msg_id_min=None, msg_id_max=None, offset=0, filter_size=5, hysteresis=0.5):
+    """
+    센서 핸들. 필터/임계값/알람 상태는 소속 농장 센서 뱅크의 한 행(bank_index)에 저장되며,
+    속성(threshold_min 등)은 해당 배열 원소를 읽고 씁니다.
+    """
+    def __init__(self, device_id, name, pin, io_type, t_min=None, t_max=None, target_min=None, target_max=None, msg_id_min=None, msg_id_max=None, offset=0, filter_size=5, hysteresis=0.5, bank=None, farm=None):
         super().__init__(device_id, name, pin, io_type)
-        self.threshold_min = t_min
-        self.threshold_max = t_max
         self.target_min = target_min
         self.target_max = target_max
         self.msg_id_min = msg_id_min
         self.msg_id_max = msg_id_max
-        
-        # 보정 및 필터링 설정
-        self.offset = offset
-        self.filter_size = filter_size
-        self.hysteresis = hysteresis
-        self.buffer = []
-        
-        # 현재 상태 추적 (채터링 방지용)
-        self.is_alarm_min = False
-        self.is_alarm_max = False
-        
-        self.last_value = 0
+        self.node_id = None  # 소속 노드 (프로비저닝 시 설정)
+        self.farm = farm or DEFAULT_FARM
+
+        # 보정/필터링/히스테리시스 설정은 뱅크 행에 저장
+        self.bank = bank if bank is not None else self.farm.bank
+        self.bank_index = self.bank.add(offset=offset, filter_size=filter_size, hysteresis=hysteresis,
+                                        t_min=t_min, t_max=t_max, owner=self)
+
+    # ---- 뱅크 행에 대한 속성 접근 (임계값 None <-> NaN)
+    @property
+    def threshold_min(self):
+        v = self.bank.t_min[self.bank_index]
+        return None if np.isnan(v) else float(v)
+
+    @threshold_min.setter
+    def threshold_min(self, value):
+        self.bank.t_min[self.bank_index] = np.nan if value is None else value
+
+    @property
+    def threshold_max(self):
+        v = self.bank.t_max[self.bank_index]
+        return None if np.isnan(v) else float(v)
+
+    @threshold_max.setter
+    def threshold_max(self, value):
+        self.bank.t_max[self.bank_index] = np.nan if value is None else value
+
+    @property
+    def offset(self):
+        return float(self.bank.offset[self.bank_index])
+
+    @offset.setter
+    def offset(self, value):
+        self.bank.offset[self.bank_index] = value
+
+    @property
+    def hysteresis(self):
+        return float(self.bank.hysteresis[self.bank_index])
+
+    @hysteresis.setter
+    def hysteresis(self, value):
+        self.bank.hysteresis[self.bank_index] = value
+
+    @property
+    def filter_size(self):
+        return int(self.bank.filter_size[self.bank_index])
+
+    @filter_size.setter
+    def filter_size(self, value):
+        self.bank.set_filter_size(self.bank_index, value)
+
+    @property
+    def is_alarm_min(self):
+        return bool(self.bank.alarm_min[self.bank_index])
+
+    @property
+    def is_alarm_max(self):
+        return bool(self.bank.alarm_max[self.bank_index])
+
+    @property
+    def last_value(self):
+        return float(self.bank.last_value[self.bank_index])
+
+    @property
+    def buffer(self):
+        """이동평균 버퍼의 현재 값 (오래된 것부터)"""
+        i = self.bank_index
+        size, count, pos = self.filter_size, int(self.bank.ring_count[i]), int(self.bank.ring_pos[i])
+        ring = self.bank.ring[i, :size]
+        return np.roll(ring, -pos)[size - count:].tolist()
+
+    def release(self):
+        self.farm.automation_table.pop(self.bank_index, None)
+        for target_id in (self.target_min, self.target_max):
+            if target_id:
+                self.farm.target_dependents.get(target_id, set()).discard(self)
+        self.bank.release(self.bank_index)
 
     def read_value(self):
-        # 1. 원시 값 시뮬레이션 (0~100)
-        raw_val = random.uniform(0, 100)
-        
-        # 2. 보정 적용 (Offset)
-        calibrated_val = raw_val + self.offset
-        
-        # 3. 필터링 (Moving Average)
-        self.buffer.append(calibrated_val)
-        if len(self.buffer) > self.filter_size:
-            self.buffer.pop(0)
-            
-        self.last_value = sum(self.buffer) / len(self.buffer)
+        """1회 샘플링(보정 + 이동평균 + 히스테리시스 판정) 후 필터링된 값을 반환합니다."""
+        self.bank.sample([self.bank_index])
         return self.last_value
 
+    def alarm_dict(self):
+        return {
+            "id": self.device_id,
+            "pin": self.pin,
+            "val": round(self.last_value, 2),
+            "is_min": self.is_alarm_min,
+            "is_max": self.is_alarm_max
+        }
+
     def get_alarm_status(self):
-        val = self.read_value()
-        
-        # 히스테리시스 적용 로직
-        if self.threshold_min is not None:
-            if not self.is_alarm_min:
-                if val < self.threshold_min:
-                    self.is_alarm_min = True
-            else:
-                if val >= self.threshold_min + self.hysteresis:
-                    self.is_alarm_min = False
-                    
-        if self.threshold_max is not None:
-            if not self.is_alarm_max:
-                if val > self.threshold_max:
-                    self.is_alarm_max = True
-            else:
-                if val <= self.threshold_max - self.hysteresis:
-                    self.is_alarm_max = False
-        
+        self.read_value()
         if self.is_alarm_min or self.is_alarm_max:
-            return {
-                "id": self.device_id,
-                "pin": self.pin,
-                "val": round(val, 2),
-                "is_min": self.is_alarm_min,
-                "is_max": self.is_alarm_max
-            }
+            return self.alarm_dict()
         return None
 
     def get_status(self):
+        # 상태 조회는 필터를 진행시키지 않음 (마지막 샘플 값 사용)
         return {
             "id": self.device_id,
             "name": self.name,
-            "val": round(self.read_value(), 2),
+            "val": round(self.last_value, 2),
             "pin": self.pin,
             "type": self.io_type
         }
 
     def execute_automation(self, alarm):
-        target_id = None
-        msg_id = ""
+        rules = self.farm.automation_table.get(self.bank_index)
+        if not rules:
+            return
 
         if alarm['is_min'] and self.target_min:
-            target_id = self.target_min
-            msg_id = self.msg_id_min
+            act, msg_id = rules[0]
         elif alarm['is_max'] and self.target_max:
-            target_id = self.target_max
-            msg_id = self.msg_id_max
+            act, msg_id = rules[1]
+        else:
+            return
 
-        if target_id:
-            found = False
-            for node in SYSTEM_REGISTRY.values():
-                if target_id in node.actuators:
-                    act = node.actuators[target_id]
-                    result = act.set_state(f"ACTIVE (By:{self.device_id} Msg:{msg_id})")
-                    print(f"🌐 [Global-Auto] {self.device_id} -> {target_id}({act.pin}): {result}")
-                    found = True
-                    break
-            if not found:
-                print(f"⚠️ [Error] 대상 장치 {target_id}를 찾을 수 없습니다.")
+        # 대상을 찾지 못한 규칙은 프로비저닝 시 1회 보고되었으므로 조용히 건너뜀
+        if act is not None:
+            result = act.set_state(f"ACTIVE (By:{self.device_id} Msg:{msg_id})")
+            logger.info("🌐 [Global-Auto] %s -> %s(%s): %s", self.device_id, act.device_id, act.pin, result,
+                     key=("auto", self.device_id, msg_id), every=ALARM_LOG_INTERVAL)
 
     def __repr__(self):
         return f"[Sensor] {self.device_id}({self.name})"
@@ -138,12 +214,18 @@ class Actuator(BaseDevice):
         return f"[Actuator] {self.device_id}({self.name}) State:{self.state}"
 
 class ESP32C3Node:
-    def __init__(self, node_id):
+    def __init__(self, node_id, farm=None):
         self.node_id = node_id  
+        self.farm = farm or DEFAULT_FARM
         self.is_provisioned = False
         self.sensors = {}
         self.actuators = {}
-        SYSTEM_REGISTRY[node_id] = self
+        self._bank_rows = np.empty(0, dtype=np.intp)
+        # 같은 ID의 이전 노드 객체가 있으면 인덱스/뱅크에서 먼저 정리
+        previous = self.farm.registry.get(node_id)
+        if previous is not None:
+            previous.decommission()
+        self.farm.registry[node_id] = self
 
         self.hardware_pins = {
             "analog": [f"GPIO{i}(ADC)" for i in range(5)],
@@ -153,8 +235,7 @@ class ESP32C3Node:
     def provision(self, config):
         """ID 및 기기 목록 기반 초기 프로비저닝 (핀 맵 고정)"""
         # 기존 핀 맵 보존을 위해 초기화 시에만 실행 권장
-        self.sensors = {}
-        self.actuators = {}
+        self.decommission()
         
         # 기기 등록 및 핀 할당
         for s in config.get('sensors', []):
@@ -169,8 +250,10 @@ class ESP32C3Node:
                     s.get('msg_id_min'), s.get('msg_id_max'),
                     offset=s.get('offset', 0),
                     filter_size=s.get('filter_size', 5),
-                    hysteresis=s.get('hysteresis', 0.5)
+                    hysteresis=s.get('hysteresis', 0.5),
+                    farm=self.farm
                 )
+                self.sensors[s_id].node_id = self.node_id
 
         for a in config.get('actuators', []):
             a_id = a['id']
@@ -178,40 +261,47 @@ class ESP32C3Node:
             if pin_list:
                 pin = pin_list.pop(0)
                 self.actuators[a_id] = Actuator(a_id, a.get('name', 'Actuator'), pin, a['type'])
+                self.farm.device_index[a_id] = (self, self.actuators[a_id])
         
         # 초기 레시피 적용
         if 'recipe' in config:
             self.update_thresholds(config['recipe'])
             
+        self._bank_rows = np.array([s.bank_index for s in self.sensors.values()], dtype=np.intp)
+
+        # 자동화 규칙 컴파일: 이 노드의 센서 + 이 노드의 액추에이터를 참조하는 센서
+        # (이전 액추에이터를 참조하던 규칙은 decommission()에서 이미 다시 해석됨)
+        for sensor in self.sensors.values():
+            compile_automation(sensor)
+        for a_id in self.actuators:
+            for sensor in list(self.farm.target_dependents.get(a_id, ())):
+                compile_automation(sensor)
         self.is_provisioned = True
 
+    def decommission(self):
+        """센서 뱅크 행, 자동화 규칙, 농장 장치 인덱스에서 이 노드의 장치를 제거합니다."""
+        for sensor in self.sensors.values():
+            sensor.release()
+        removed = [a_id for a_id in self.actuators if self.farm.device_index.get(a_id, (None,))[0] is self]
+        for a_id in removed:
+            del self.farm.device_index[a_id]
+        self.sensors = {}
+        self.actuators = {}
+        self._bank_rows = np.empty(0, dtype=np.intp)
+        self.is_provisioned = False
+        # 제거된 액추에이터를 대상으로 하던 다른 노드의 규칙이 죽은 객체를 가리키지 않도록 다시 해석
+        for a_id in removed:
+            for sensor in list(self.farm.target_dependents.get(a_id, ())):
+                compile_automation(sensor)
+
     def update_thresholds(self, recipe_str):
         """레시피(작물.단계)를 기반으로 센서 임계값을 동적으로 업데이트"""
         if not recipe_str: return
         
         try:
-            catalog_path = f'{DATA_DIR}/catalog_crop.json'
-            with open(catalog_path, 'r', encoding='utf-8') as f:
-                all_recipes = json.load(f)
-                parts = recipe_str.split('.')
-                if len(parts) != 2: return
-                crop, stage = parts
-                recipe_data = all_recipes.get(crop, {}).get(stage, {})
-                
-                if not recipe_data:
-                    # print(f"   [{self.node_id}] Warning: '{recipe_str}' 에 해당하는 레시피 데이터가 없습니다.")
-                    return
-
-                for s_id, sensor in self.sensors.items():
-                    for key, limits in recipe_data.items():
-                        if key.lower() in sensor.name.lower():
-                            sensor.threshold_min = limits.get('min')
-                            sensor.threshold_max = limits.get('max')
-                            # print(f"   [{self.node_id}] {s_id}({sensor.name}) 임계값 갱신: {sensor.threshold_min} ~ {sensor.threshold_max}")
-                            break
-                return True
+            return apply_recipe([self], recipe_str)
         except Exception as e:
-            print(f"   [{self.node_id}] 임계값 업데이트 실패: {e}")
+            logger.warning("   [%s] 임계값 업데이트 실패: %s", self.node_id, e)
         return False
 
     def get_pin_map(self):
@@ -222,18 +312,275 @@ class ESP32C3Node:
             mapping[a.device_id] = {"name": a.name, "pin": a.pin, "type": "Actuator"}
         return mapping
 
-    async def run_forever(self, interval=5):
+    async def run_forever(self, interval=5, observer=None):
+        """
+        노드 단독 틱 루프. observer(노드 수, 지연 초, 처리 초)를 주면 틱마다 호출합니다. (지표 기록용)
+        지연은 예정보다 늦게 깨어난 시간입니다.
+        """
         if not self.is_provisioned: return
-        print(f"[{self.node_id}] 모니터링 시작")
+        logger.info("[%s] 모니터링 시작", self.node_id)
+        loop = asyncio.get_running_loop()
         try:
+            due = loop.time()
             while True:
-                for s_id, s_obj in self.sensors.items():
-                    alarm = s_obj.get_alarm_status()
-                    if alarm:
-                        print(f"📡 [ESP-NOW] {self.node_id} 알람: {alarm}")
-                        s_obj.execute_automation(alarm)
+                started = time.perf_counter()
+                tick_nodes([self])
+                if observer is not None:
+                    observer(1, max(0.0, loop.time() - due), time.perf_counter() - started)
+                due = loop.time() + interval
                 await asyncio.sleep(interval)
         except asyncio.CancelledError:
             pass
         except Exception as e:
-            print(f"[{self.node_id}] 오류: {e}")
+            logger.error("[%s] 오류: %s", self.node_id, e)
+
+
+class RecipeCatalog:
+    """
+    catalog_crop.json 공유 캐시. 파일은 mtime/크기가 바뀔 때만 다시 파싱하며,
+    레시피별 (키, min, max) 목록과 '센서 이름 -> 적용 한계값' 매칭 결과를 미리 계산해 둡니다.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.recipes = {}
+        self._stamp = None
+        self._compiled = {}  # recipe_str -> [(key.lower(), min, max), ...] 또는 None
+        self._matches = {}   # (recipe_str, sensor_name) -> (min, max) 또는 None
+
+    def refresh(self):
+        """파일이 바뀌었으면 다시 읽습니다. 반환값: 재로딩 여부"""
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.recipes = json.load(f)
+        self._stamp = stamp
+        self._compiled.clear()
+        self._matches.clear()
+        return True
+
+    def compile(self, recipe_str):
+        """'작물.단계' 레시피를 매칭용 목록으로 변환합니다. 레시피가 없으면 None"""
+        if recipe_str not in self._compiled:
+            parts = recipe_str.split('.')
+            recipe_data = {}
+            if len(parts) == 2:
+                crop, stage = parts
+                recipe_data = self.recipes.get(crop, {}).get(stage, {})
+            self._compiled[recipe_str] = [
+                (key.lower(), limits.get('min'), limits.get('max')) for key, limits in recipe_data.items()
+            ] or None
+        return self._compiled[recipe_str]
+
+    def match(self, recipe_str, sensor_name):
+        """센서 이름에 포함된 첫 번째 레시피 키의 (min, max). 없으면 None"""
+        key = (recipe_str, sensor_name)
+        if key not in self._matches:
+            name = sensor_name.lower()
+            self._matches[key] = next(
+                ((mn, mx) for k, mn, mx in (self.compile(recipe_str) or ()) if k in name), None)
+        return self._matches[key]
+
+
+_RECIPE_CATALOGS = {}
+
+
+def get_recipe_catalog(path=None):
+    """경로별 공유 RecipeCatalog (기본: {DATA_DIR}/catalog_crop.json), 변경 시 자동 재로딩"""
+    path = path or f'{DATA_DIR}/catalog_crop.json'
+    catalog = _RECIPE_CATALOGS.get(path)
+    if catalog is None:
+        catalog = _RECIPE_CATALOGS[path] = RecipeCatalog(path)
+    catalog.refresh()
+    return catalog
+
+
+def apply_recipe(nodes, recipe_str, catalog=None):
+    """
+    여러 노드에 레시피 임계값을 한 번에 적용합니다.
+    카탈로그는 1회만 확인하고(기본: 첫 노드가 속한 농장의 catalog_crop.json), 센서 뱅크에는 행 배열 단위로 대입합니다.
+    반환값: 적용 시 True, 해당 레시피가 없으면 None
+    """
+    if catalog is None:
+        farm = nodes[0].farm if nodes else DEFAULT_FARM
+        catalog = get_recipe_catalog(f'{farm.data_dir}/catalog_crop.json')
+    if not catalog.compile(recipe_str):
+        return None
+
+    updates = {}  # bank -> (rows, mins, maxs)
+    for node in nodes:
+        for sensor in node.sensors.values():
+            limits = catalog.match(recipe_str, sensor.name)
+            if limits is None:
+                continue
+            rows, mins, maxs = updates.setdefault(id(sensor.bank), (sensor.bank, [], [], []))[1:]
+            rows.append(sensor.bank_index)
+            mins.append(np.nan if limits[0] is None else limits[0])
+            maxs.append(np.nan if limits[1] is None else limits[1])
+
+    for bank, rows, mins, maxs in updates.values():
+        bank.t_min[rows] = mins
+        bank.t_max[rows] = maxs
+    return True
+
+
+def compile_automation(sensor):
+    """센서의 target_min/target_max를 소속 농장의 장치 인덱스로 해석해 디스패치 테이블에 기록합니다."""
+    farm = sensor.farm
+    rules = []
+    for target_id, msg_id in ((sensor.target_min, sensor.msg_id_min), (sensor.target_max, sensor.msg_id_max)):
+        act = None
+        if target_id:
+            farm.target_dependents.setdefault(target_id, set()).add(sensor)
+            entry = farm.device_index.get(target_id)
+            act = entry[1] if entry else None
+        rules.append((act, msg_id))
+    farm.automation_table[sensor.bank_index] = tuple(rules)
+
+
+def unresolved_targets(farm=None):
+    """대상 액추에이터를 찾지 못한 규칙 목록: {target_id: [센서 ID, ...]}"""
+    farm = farm or DEFAULT_FARM
+    missing = {}
+    for target_id, sensors in farm.target_dependents.items():
+        if sensors and target_id not in farm.device_index:
+            missing[target_id] = sorted(s.device_id for s in sensors)
+    return missing
+
+
+def report_unresolved(farm=None):
+    """프로비저닝 완료 후 1회 호출: 해석되지 않은 자동화 대상을 보고합니다."""
+    missing = unresolved_targets(farm)
+    for target_id, sensor_ids in sorted(missing.items()):
+        logger.warning("⚠️ [Error] 대상 장치 %s를 찾을 수 없습니다. (참조 센서: %s)", target_id, ', '.join(sensor_ids))
+    return missing
+
+
+def tick_nodes(nodes, bank=None):
+    """
+    여러 노드의 모든 센서를 한 번의 벡터 연산으로 샘플링하고,
+    알람 상태인 센서에 대해서만 ESP-NOW 알림과 자동화를 실행합니다. (nodes는 같은 농장 소속)
+    """
+    nodes = [n for n in nodes if n.is_provisioned and len(n._bank_rows)]
+    if not nodes:
+        return 0
+    bank = bank if bank is not None else nodes[0].farm.bank
+    rows = np.concatenate([n._bank_rows for n in nodes]) if len(nodes) > 1 else nodes[0]._bank_rows
+    alarmed = bank.sample(rows)
+    for idx in alarmed.tolist():
+        sensor = bank.owners[idx]
+        alarm = sensor.alarm_dict()
+        logger.info("📡 [ESP-NOW] %s 알람: %s", sensor.node_id, alarm, key=("alarm", sensor.device_id), every=ALARM_LOG_INTERVAL)
+        sensor.execute_automation(alarm)
+    return len(alarmed)
+
+
+def apply_readings(readings, bank=None, farm=None):
+    """
+    실제 노드가 보낸 측정값을 등록된 센서에 벡터 연산으로 반영합니다.
+    readings: (node_id, device_id, 원시 값) 목록. 시뮬레이션 대신 이 값으로 보정/필터/알람 판정을 수행합니다.
+    같은 센서의 값이 여러 개면 도착 순서대로 나누어 샘플링합니다 (이동평균 버퍼 보존).
+    반환값: (반영된 센서 목록, 알람 건수) - 농장(기본: DEFAULT_FARM) 레지스트리에 없는 장치는 건너뜁니다.
+    """
+    farm = farm or DEFAULT_FARM
+    registry = farm.registry
+    bank = bank if bank is not None else farm.bank
+    rounds = []  # 회차별 {bank_index: 원시 값}
+    applied = {}  # bank_index -> 센서
+    seen = {}     # bank_index -> 지금까지 받은 값 수 (n번째 값은 n회차에 샘플링)
+    for node_id, device_id, value in readings:
+        node = registry.get(node_id)
+        sensor = node.sensors.get(device_id) if node is not None and node.is_provisioned else None
+        if sensor is None:
+            continue
+        n = seen.get(sensor.bank_index, 0)
+        seen[sensor.bank_index] = n + 1
+        applied[sensor.bank_index] = sensor
+        if n == len(rounds):
+            rounds.append({})
+        rounds[n][sensor.bank_index] = value
+
+    alarms = 0
+    for batch in rounds:
+        alarmed = bank.sample(np.fromiter(batch.keys(), dtype=np.intp, count=len(batch)),
+                              np.fromiter(batch.values(), dtype=np.float64, count=len(batch)))
+        alarms += len(alarmed)
+        for idx in alarmed.tolist():
+            sensor = bank.owners[idx]
+            alarm = sensor.alarm_dict()
+            logger.info("📡 [MQTT] %s 알람: %s", sensor.node_id, alarm, key=("alarm", sensor.device_id), every=ALARM_LOG_INTERVAL)
+            sensor.execute_automation(alarm)
+    return list(applied.values()), alarms
+
+
+class TickScheduler:
+    """
+    노드별 코루틴 대신 하나의 루프가 모든 노드의 틱을 관리하는 타이머 휠.
+    예정 시각을 resolution(초) 단위 버킷으로 묶고, 버킷에 모인 노드들을 tick_nodes()로 한 번에 처리합니다.
+    각 노드는 자신의 interval(지터 포함)을 그대로 유지하며, 다음 예정 시각은 '예정 시각 + interval'로 계산되어 누적 지연이 없습니다.
+    """
+    def __init__(self, resolution=0.25, lag_warn=1.0, observer=None):
+        self.resolution = resolution
+        self.lag_warn = lag_warn
+        self.observer = observer  # observer(배치 노드 수, 지연 초, 처리 초): 배치 틱마다 호출 (지표 기록용)
+        self.buckets = {}   # 버킷 번호 -> [(node, interval, due), ...]
+        self._heap = []     # 비어 있지 않은 버킷 번호
+        self.stats = {"ticks": 0, "nodes": 0, "last_batch": 0, "last_lag": 0.0, "max_lag": 0.0}
+
+    def add(self, node, interval=5, start=None):
+        """노드를 등록합니다. start를 주지 않으면 지금부터 바로 첫 틱이 실행됩니다."""
+        if start is None:
+            start = asyncio.get_running_loop().time()
+        self._schedule(node, interval, start)
+        self.stats["nodes"] += 1
+
+    def _schedule(self, node, interval, due):
+        slot = int(due / self.resolution)
+        bucket = self.buckets.get(slot)
+        if bucket is None:
+            bucket = self.buckets[slot] = []
+            heapq.heappush(self._heap, slot)
+        bucket.append((node, interval, due))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        logger.info("⏱️ [Scheduler] 배치 틱 스케줄러 가동 (노드 %d개, 버킷 %s초)", self.stats['nodes'], self.resolution)
+        try:
+            while True:
+                if not self._heap:
+                    await asyncio.sleep(self.resolution)
+                    continue
+                slot = self._heap[0]
+                wait = slot * self.resolution - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                heapq.heappop(self._heap)
+                batch = self.buckets.pop(slot)
+                now = loop.time()
+                self._tick(batch, now - slot * self.resolution)
+                for node, interval, due in batch:
+                    if node.is_provisioned and node.farm.registry.get(node.node_id) is node:
+                        self._schedule(node, interval, max(due + interval, now))
+                    else:
+                        self.stats["nodes"] -= 1
+        except asyncio.CancelledError:
+            pass
+
+    def _tick(self, batch, lag):
+        started = time.perf_counter()
+        try:
+            tick_nodes([node for node, _, _ in batch])
+        except Exception as e:
+            logger.error("⚠️ [Scheduler] 틱 처리 오류: %s", e, key="tick-error")
+        if self.observer is not None:
+            self.observer(len(batch), lag, time.perf_counter() - started)
+        stats = self.stats
+        stats["ticks"] += 1
+        stats["last_batch"] = len(batch)
+        stats["last_lag"] = lag
+        stats["max_lag"] = max(stats["max_lag"], lag)
+        if lag > self.lag_warn:
+            logger.warning("⚠️ [Scheduler] 틱 지연 %.2f초 (배치 %d개 노드)", lag, len(batch), key="tick-lag")
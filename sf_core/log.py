@@ -0,0 +1,246 @@
+"""
+농장 서버 공용 로깅.
+- 레벨: LOG_LEVEL 환경 변수 (DEBUG/INFO/WARNING/ERROR, 기본 INFO)
+- 출력: 호출한 스레드는 레코드를 큐에 넣기만 하고, 백그라운드 스레드(QueueListener)가 포맷/stdout 기록을 담당합니다.
+  큐가 가득 차면 기다리지 않고 버린 뒤 건수를 셉니다. (stdout이 막혀도 틱/이벤트 루프는 멈추지 않음)
+- 빈도 제한은 호출하는 쪽이 지정할 때만 적용합니다. (반복될 수 있는 줄만 골라서 제한, 나머지는 레벨 기준으로 모두 출력)
+  key를 주면 키별로 every초(생략 시 dedupe초, 기본 10초)에 1번만, key 없이 every만 주면 같은 메시지(형식+인자)를 every초에 1번만 출력합니다.
+  둘 다 없으면 WARNING/ERROR는 물론 INFO도 반복 여부와 관계없이 그대로 출력하며, 생략된 건수는 다음에 출력되는 줄 끝에 붙습니다.
+메시지는 f-문자열 대신 %-형식 + 인자로 넘기면 걸러지는 줄의 문자열 조립 비용도 들지 않습니다.
+(인자는 출력 스레드에서 포맷되므로 나중에 바뀌는 가변 객체 대신 값/문자열을 넘길 것)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+ROOT = "mqnet"
+DEFAULT_FORMAT = "%(message)s"   # 기존 print 출력과 같은 모양 (Render 로그에 이미 타임스탬프가 붙음)
+DEDUPE_SECONDS = 10.0
+MAX_KEYS = 10000
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """큐가 가득 차면 버리고 dropped만 증가 (호출 스레드를 막지 않음)"""
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 포맷은 출력 스레드에서 (기본 구현은 호출 스레드에서 메시지를 조립하고 레코드를 복사함)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Throttle:
+    """
+    키별 출력 빈도 제한. check()는 출력해도 되면 직전 출력 이후 생략된 건수(0 이상), 아니면 None을 반환합니다.
+    잠금 없이 dict 연산만 사용합니다. (여러 스레드가 같은 키로 동시에 부르면 드물게 한 줄이 더 나오거나 생략 건수가 1 틀릴 수 있음)
+    """
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries = {}   # 키 -> [마지막 출력 시각, 생략 건수]
+
+    def check(self, key, every):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_keys:
+                self._entries.clear()
+            self._entries[key] = [now, 0]
+            return 0
+        if now - entry[0] < every:
+            entry[1] += 1
+            return None
+        suppressed = entry[1]
+        entry[0] = now
+        entry[1] = 0
+        return suppressed
+
+
+class _State:
+    handler = None
+    listener = None
+    options = None
+    throttle = Throttle()
+    dedupe = DEDUPE_SECONDS
+    limited = True
+
+
+def setup(level=None, stream=None, fmt=None, queued=True, queue_size=10000, dedupe=DEDUPE_SECONDS, limited=True):
+    """
+    'mqnet' 로거에 출력 설정을 (다시) 적용합니다. 호출하지 않으면 첫 로그 출력 때 기본값으로 설정됩니다.
+    queued=False면 호출 스레드에서 바로 기록하고, limited=False면 빈도 제한/중복 제거를 끕니다. (비교용)
+    """
+    shutdown()
+    root = logging.getLogger(ROOT)
+    root.propagate = False
+    root.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO').upper())
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(logging.Formatter(fmt or os.environ.get('LOG_FORMAT', DEFAULT_FORMAT)))
+    if queued:
+        handler = _DroppingQueueHandler(queue.Queue(queue_size))
+        _State.listener = logging.handlers.QueueListener(handler.queue, writer)
+        _State.listener.start()
+    else:
+        handler = writer
+    root.addHandler(handler)
+    _State.handler = handler
+    _State.options = dict(level=level, stream=stream, fmt=fmt, queued=queued, queue_size=queue_size, dedupe=dedupe, limited=limited)
+    _State.dedupe = dedupe
+    _State.limited = limited
+    _State.throttle = Throttle()
+    return handler
+
+
+def shutdown():
+    """대기 중인 로그를 모두 기록하고 출력 스레드를 멈춥니다. (프로세스 종료 시 자동 호출)"""
+    if _State.listener is not None:
+        _State.listener.stop()
+        _State.listener = None
+    if _State.handler is not None:
+        logging.getLogger(ROOT).removeHandler(_State.handler)
+        _State.handler = None
+
+
+def dropped():
+    """큐가 가득 차서 버린 로그 수"""
+    return getattr(_State.handler, 'dropped', 0)
+
+
+def _after_fork_in_child():
+    # fork된 자식(샤드 워커/분석 워커)에는 출력 스레드가 없으므로 새 큐와 스레드를 만듦 (부모의 미출력분은 부모가 기록)
+    if _State.listener is not None:
+        logging.getLogger(ROOT).removeHandler(_State.handler)
+        _State.listener = _State.handler = None
+        setup(**_State.options)
+
+
+atexit.register(shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class FarmLogger:
+    """
+    logging.Logger 래퍼: debug/info/warning/error(메시지, *인자, key=None, every=None)
+    - key: 키별로 every초(생략 시 dedupe초, 기본 10초)에 1번만 출력 (예: 센서별 알람)
+    - key 없이 every만 지정: 같은 메시지+인자는 every초 동안 1번만 출력
+    - 둘 다 없거나 every=0이면 제한 없이 출력
+    """
+    __slots__ = ("logger",)
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name if name == ROOT or name.startswith(ROOT + ".") else f"{ROOT}.{name}")
+
+    def is_enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, msg, args, key, every, exc_info=None):
+        if _State.handler is None:
+            setup()   # 레벨도 setup()에서 정해지므로 레벨 확인보다 먼저
+        if not self.logger.isEnabledFor(level):
+            return
+        if _State.limited and (key is not None or every):
+            every = _State.dedupe if every is None else every
+            if key is None:
+                try:
+                    key = (msg, args)
+                    hash(key)
+                except TypeError:
+                    key = None
+            if key is not None and every:
+                suppressed = _State.throttle.check(key, every)
+                if suppressed is None:
+                    return
+                if suppressed:
+                    msg = f"{msg} (이전 %d건 생략)"
+                    args = args + (suppressed,)
+        self.logger.log(level, msg, *args, exc_info=exc_info)
+
+    def debug(self, msg, *args, key=None, every=None):
+        self._log(logging.DEBUG, msg, args, key, every)
+
+    def info(self, msg, *args, key=None, every=None):
+        self._log(logging.INFO, msg, args, key, every)
+
+    def warning(self, msg, *args, key=None, every=None):
+        self._log(logging.WARNING, msg, args, key, every)
+
+    def error(self, msg, *args, key=None, every=None, exc_info=None):
+        self._log(logging.ERROR, msg, args, key, every, exc_info)
+
+
+def get_logger(name):
+    return FarmLogger(name)
+
+
+if __name__ == "__main__":
+    # 벤치마크: 알람이 많은 상황(센서 절반이 임계값 이탈)에서 배치 틱 처리량
+    #   기존 print(동기 stdout) / 로깅 끔(WARNING) / 큐+빈도 제한 로깅(INFO, 기본 설정)
+    #   stdout은 파이프로 연결하고 다른 스레드가 천천히 읽어 Render 로그 수집기처럼 느린 소비자를 흉내 냅니다.
+    import contextlib
+    import io
+    import tempfile
+    import threading
+    from sf_core import ESP32C3Node, Farm, tick_nodes
+    # python -m sf_core.log로 실행하면 이 파일은 __main__으로 한 번 더 적재되므로,
+    # sf_core가 실제로 쓰는 모듈(sf_core.log)의 설정을 바꿔야 측정 대상이 맞음
+    from sf_core import log as farm_log
+
+    n_nodes, ticks = 200, 30
+    farm = Farm("bench", tempfile.mkdtemp())
+    nodes = []
+    for i in range(n_nodes):
+        node = ESP32C3Node(f"BENCH-{i:03d}", farm=farm)
+        # 짝수 센서는 항상 하한 이탈(알람 + 자동화), 홀수 센서는 정상 범위
+        node.provision({"id": node.node_id, "sensors": [
+            {"id": f"{node.node_id}S{k}", "name": f"센서 {k}", "type": "analog" if k < 5 else "digital",
+             "min": 1000.0 if k % 2 == 0 else -1e9, "max": 1e9, "hysteresis": 0.0, "target_min": f"{node.node_id}A0"}
+            for k in range(8)], "actuators": [{"id": f"{node.node_id}A0", "name": "환기팬", "type": "digital"}]})
+        nodes.append(node)
+
+    read_fd, write_fd = os.pipe()
+
+    def slow_reader():
+        while True:
+            chunk = os.read(read_fd, 4096)
+            if not chunk:
+                return
+            time.sleep(0.0005)   # 4KB마다 0.5ms
+
+    threading.Thread(target=slow_reader, daemon=True).start()
+    pipe = io.TextIOWrapper(os.fdopen(write_fd, 'wb', buffering=0), encoding='utf-8', write_through=True)
+
+    def run():
+        tick_nodes(nodes)  # 워밍업
+        started = time.perf_counter()
+        for _ in range(ticks):
+            tick_nodes(nodes)
+        return ticks * n_nodes / (time.perf_counter() - started)
+
+    results = {}
+    with contextlib.redirect_stdout(pipe):
+        # 기존 동작 재현: 모든 줄을 호출 스레드에서 바로 stdout으로 (빈도 제한 없음)
+        farm_log.setup(level="INFO", stream=pipe, queued=False, limited=False)
+        results["print (동기, 제한 없음)"] = run()
+        farm_log.setup(level="WARNING", stream=pipe)
+        results["로깅 끔 (WARNING)"] = run()
+        farm_log.setup(level="INFO", stream=pipe)
+        results["로깅 켬 (큐 + 빈도 제한)"] = run()
+        lost = farm_log.dropped()
+        farm_log.shutdown()
+
+    base = results["print (동기, 제한 없음)"]
+    print(f"노드 {n_nodes}개 × 센서 8개 (절반 알람), 배치 틱 {ticks}회, 느린 stdout 소비자")
+    for label, rate in results.items():
+        print(f"  {label:24s}: {rate:10,.0f} 노드 틱/s ({rate / base:5.1f}배)")
+    print(f"  큐 초과로 버린 로그: {lost}건")
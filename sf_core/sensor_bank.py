@@ -0,0 +1,171 @@
+import numpy as np
+
+
+class SensorBank:
+    """
+    프로세스 내 모든 센서의 상태를 NumPy 배열로 보관하는 센서 뱅크.
+    보정(offset), 이동평균 링버퍼/누적합, 임계값, 히스테리시스, 알람 플래그를 행 단위로 저장하고
+    샘플링 → 필터링 → 히스테리시스 판정을 선택된 모든 행에 대해 한 번의 벡터 연산으로 수행합니다.
+    임계값이 없는 경우(None)는 NaN으로 저장됩니다.
+    """
+    RESUM_EVERY = 1024  # 누적합의 부동소수 오차를 주기적으로 링버퍼에서 재계산
+
+    def __init__(self, capacity=1024, width=8, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.free = []
+        self.owners = []  # 행 -> 센서 핸들 (알람 행을 객체로 되돌릴 때 사용)
+        self._ticks = 0
+        self.samples = 0  # 누적 샘플링 행 수 (처리량 측정용)
+        self._alloc(capacity, width)
+
+    def _alloc(self, capacity, width):
+        def grow(name, shape, dtype, fill):
+            new = np.full(shape, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[tuple(slice(0, n) for n in old.shape)] = old
+            setattr(self, name, new)
+
+        grow('offset', capacity, np.float64, 0.0)
+        grow('filter_size', capacity, np.int32, 1)
+        grow('hysteresis', capacity, np.float64, 0.0)
+        grow('t_min', capacity, np.float64, np.nan)
+        grow('t_max', capacity, np.float64, np.nan)
+        grow('ring', (capacity, width), np.float64, 0.0)
+        grow('ring_pos', capacity, np.int32, 0)
+        grow('ring_count', capacity, np.int32, 0)
+        grow('ring_sum', capacity, np.float64, 0.0)
+        grow('last_value', capacity, np.float64, 0.0)
+        grow('alarm_min', capacity, bool, False)
+        grow('alarm_max', capacity, bool, False)
+        grow('active', capacity, bool, False)
+        self.capacity, self.width = capacity, width
+
+    # ---------------------------------------------------------------- 행 관리
+    def add(self, offset=0, filter_size=5, hysteresis=0.5, t_min=None, t_max=None, owner=None):
+        """센서 1개에 해당하는 행을 할당하고 인덱스를 반환합니다."""
+        filter_size = max(1, int(filter_size))
+        if filter_size > self.width:
+            self._alloc(self.capacity, filter_size)
+        if self.free:
+            idx = self.free.pop()
+        else:
+            if self.size >= self.capacity:
+                self._alloc(self.capacity * 2, self.width)
+            idx = self.size
+            self.size += 1
+            self.owners.append(None)
+
+        self.offset[idx] = offset
+        self.filter_size[idx] = filter_size
+        self.hysteresis[idx] = hysteresis
+        self.t_min[idx] = np.nan if t_min is None else t_min
+        self.t_max[idx] = np.nan if t_max is None else t_max
+        self.ring[idx] = 0.0
+        self.ring_pos[idx] = 0
+        self.ring_count[idx] = 0
+        self.ring_sum[idx] = 0.0
+        self.last_value[idx] = 0.0
+        self.alarm_min[idx] = False
+        self.alarm_max[idx] = False
+        self.active[idx] = True
+        self.owners[idx] = owner
+        return idx
+
+    def release(self, idx):
+        """재프로비저닝 등으로 사라진 센서의 행을 반환합니다."""
+        if self.active[idx]:
+            self.active[idx] = False
+            self.owners[idx] = None
+            self.free.append(idx)
+
+    def set_filter_size(self, idx, filter_size):
+        filter_size = max(1, int(filter_size))
+        if filter_size > self.width:
+            self._alloc(self.capacity, filter_size)
+        self.filter_size[idx] = filter_size
+        self.ring[idx] = 0.0
+        self.ring_pos[idx] = 0
+        self.ring_count[idx] = 0
+        self.ring_sum[idx] = 0.0
+
+    # ---------------------------------------------------------------- 벡터 연산
+    def sample(self, rows=None, raw=None):
+        """
+        선택된 행(None이면 활성 행 전체)을 1회 샘플링합니다.
+        raw를 주지 않으면 0~100 균등분포로 원시 값을 시뮬레이션합니다.
+        반환값: 알람 상태(최소 또는 최대)인 행 인덱스 배열
+        """
+        if rows is None:
+            rows = np.flatnonzero(self.active[:self.size])
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 0:
+            return rows
+        if raw is None:
+            raw = self.rng.uniform(0, 100, len(rows))
+
+        # 1. 보정 (Offset)
+        val = raw + self.offset[rows]
+
+        # 2. 필터링 (링버퍼 이동평균, 누적합 갱신)
+        size = self.filter_size[rows]
+        pos = self.ring_pos[rows]
+        full = self.ring_count[rows] >= size
+        old = self.ring[rows, pos]
+        self.ring_sum[rows] += val - np.where(full, old, 0.0)
+        self.ring[rows, pos] = val
+        count = np.minimum(self.ring_count[rows] + 1, size)
+        self.ring_count[rows] = count
+        self.ring_pos[rows] = (pos + 1) % size
+        avg = self.ring_sum[rows] / count
+        self.last_value[rows] = avg
+
+        # 3. 히스테리시스 판정 (임계값이 없으면 기존 상태 유지)
+        t_min, t_max, hyst = self.t_min[rows], self.t_max[rows], self.hysteresis[rows]
+        a_min, a_max = self.alarm_min[rows], self.alarm_max[rows]
+        with np.errstate(invalid='ignore'):
+            next_min = np.where(a_min, avg < t_min + hyst, avg < t_min)
+            next_max = np.where(a_max, avg > t_max - hyst, avg > t_max)
+        a_min = np.where(np.isnan(t_min), a_min, next_min)
+        a_max = np.where(np.isnan(t_max), a_max, next_max)
+        self.alarm_min[rows] = a_min
+        self.alarm_max[rows] = a_max
+
+        self._ticks += 1
+        self.samples += len(rows)
+        if self._ticks % self.RESUM_EVERY == 0:
+            self.ring_sum[:self.size] = self.ring[:self.size].sum(axis=1)
+
+        return rows[a_min | a_max]
+
+
+if __name__ == "__main__":
+    # 벤치마크: python -m sf_core.sensor_bank [센서 수]
+    import sys
+    import time
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bank = SensorBank(capacity=n)
+    for i in range(n):
+        bank.add(offset=random.uniform(-1, 1), filter_size=5, hysteresis=0.5, t_min=20.0, t_max=80.0)
+
+    # 기존 방식: 센서 객체마다 list.pop(0) + sum(buffer)
+    buffers = [[] for _ in range(n)]
+    t0 = time.perf_counter()
+    for _ in range(10):
+        for buf in buffers:
+            buf.append(random.uniform(0, 100))
+            if len(buf) > 5:
+                buf.pop(0)
+            val = sum(buf) / len(buf)
+            alarm = val < 20.0 or val > 80.0
+    loop_ms = (time.perf_counter() - t0) / 10 * 1000
+
+    t0 = time.perf_counter()
+    for _ in range(10):
+        bank.sample()
+    bank_ms = (time.perf_counter() - t0) / 10 * 1000
+    print(f"센서 {n}개 1틱: 객체 루프 {loop_ms:.2f} ms / SensorBank {bank_ms:.2f} ms ({loop_ms / bank_ms:.1f}x)")
@@ -0,0 +1,376 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import (Actuator, ESP32C3Node, Farm, TickScheduler, apply_readings, apply_recipe, compile_automation,
+               get_recipe_catalog, unresolved_targets)
+from . import log as farm_log
+
+logger = farm_log.get_logger("sf_core.shards")
+
+ALARM_MIN, ALARM_MAX = 1, 2
+
+
+def zone_groups(configs, zone_ids):
+    """노드 설정을 구역 접두사(가장 긴 일치)별로 묶습니다. 구역에 속하지 않는 노드는 노드 ID를 구역으로 봅니다."""
+    prefixes = sorted(zone_ids, key=len, reverse=True)
+    groups = {}
+    for cfg in configs:
+        zone = next((z for z in prefixes if cfg['id'].startswith(z)), cfg['id'])
+        groups.setdefault(zone, []).append(cfg)
+    return groups
+
+
+def assign_shards(groups, shards):
+    """구역 단위로 샤드를 배정합니다. (센서 수가 많은 구역부터 가장 가벼운 샤드에: 구역 내 자동화는 같은 샤드에 남음)"""
+    load = [0] * shards
+    owner = {}
+    weight = lambda cfgs: sum(len(c.get('sensors', [])) + 1 for c in cfgs)
+    for zone, cfgs in sorted(groups.items(), key=lambda item: -weight(item[1])):
+        shard = load.index(min(load))
+        load[shard] += weight(cfgs)
+        for cfg in cfgs:
+            owner[cfg['id']] = shard
+    return owner
+
+
+class LiveBoard:
+    """
+    샤드 워커들이 쓰고 웹 서버/TSDB 로거가 읽는 공유 메모리 실시간 상태판.
+    센서 값/알람 비트, 액추에이터 상태 코드, 샤드별 통계를 고정 슬롯 배열로 두며, 읽는 쪽은 직렬화 없이 배열을 그대로 봅니다.
+    장치 이름/핀 등 메타데이터와 상태 문자열 표는 시작 시 한 번 정해져 fork로 워커에 전달됩니다.
+    """
+    def __init__(self, node_ids, sensors, actuators, states, shards):
+        self.sensors = sensors      # 슬롯 -> (node_id, device_id, name, pin, io_type)
+        self.actuators = actuators  # 슬롯 -> (node_id, device_id, name)
+        self.states = states        # 상태 코드 -> 상태 문자열 (0 = "OFF", 마지막 = 표에 없는 활성 상태)
+        self.state_codes = {s: i for i, s in enumerate(states)}
+        self.sensor_slot = {(n, d): i for i, (n, d, _, _, _) in enumerate(sensors)}
+        self.actuator_slot = {d: i for i, (_, d, _) in enumerate(actuators)}
+
+        fields = [('values', np.float64, len(sensors)), ('act_state', np.int32, len(actuators)),
+                  ('alarms', np.uint8, len(sensors)), ('ticks', np.uint64, shards),
+                  ('samples', np.uint64, shards), ('heartbeat', np.float64, shards), ('max_lag', np.float64, shards)]
+        offsets, size = [], 0
+        for name, dtype, count in fields:
+            size = (size + 7) // 8 * 8
+            offsets.append(size)
+            size += np.dtype(dtype).itemsize * count
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        for (name, dtype, count), offset in zip(fields, offsets):
+            setattr(self, name, np.ndarray(count, dtype=dtype, buffer=self.shm.buf, offset=offset))
+            getattr(self, name)[:] = 0
+
+        # live_status() 조립용: 노드별 슬롯 구간 (노드의 장치는 연속 슬롯에 배치됨)
+        self.nodes = {node_id: {"sensors": [0, 0], "actuators": [0, 0]} for node_id in node_ids}
+        for kind, table in (("sensors", sensors), ("actuators", actuators)):
+            seen = set()
+            for slot, entry in enumerate(table):
+                span = self.nodes[entry[0]][kind]
+                if entry[0] not in seen:
+                    seen.add(entry[0])
+                    span[0] = slot
+                span[1] = slot + 1
+
+    def live_status(self):
+        """tsdb_logger_task의 live_status와 같은 형태 {node_id: {"sensors": [...], "actuators": [...]}}"""
+        values = np.round(self.values, 2).tolist()
+        codes = self.act_state.tolist()
+        out = {}
+        for node_id, spans in self.nodes.items():
+            s0, s1 = spans["sensors"]
+            a0, a1 = spans["actuators"]
+            out[node_id] = {
+                "sensors": [{"id": d, "name": name, "val": values[i], "pin": pin, "type": io_type}
+                            for i, (_, d, name, pin, io_type) in enumerate(self.sensors[s0:s1], s0)],
+                "actuators": [{"id": d, "name": name, "state": self.states[codes[i]]}
+                              for i, (_, d, name) in enumerate(self.actuators[a0:a1], a0)],
+            }
+        return out
+
+    def close(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+
+class RemoteActuator(Actuator):
+    """
+    다른 샤드가 소유한 액추에이터의 대리 객체. set_state는 소유 샤드의 명령 채널로 전달됩니다.
+    소유 샤드에서 다른 규칙/레시피로 상태가 바뀔 수 있으므로, 비교 전에 상태판(board)의 실제 상태로 캐시를 갱신합니다.
+    """
+    def __init__(self, device_id, name, channel, shard, board=None, slot=None):
+        super().__init__(device_id, name, f"shard{shard}", "remote")
+        self.channel = channel
+        self.shard = shard
+        self.board = board
+        self.slot = slot
+
+    def set_state(self, new_state):
+        if self.board is not None:
+            code = int(self.board.act_state[self.slot])
+            # 마지막 코드는 상태 표에 없는 활성 상태이므로 실제 문자열을 알 수 없음 → 항상 전송
+            self.state = self.board.states[code] if code < len(self.board.states) - 1 else None
+        if new_state != self.state:
+            self.state = new_state
+            self.channel.put(("state", self.device_id, new_state))
+        return f"State -> {self.state} (shard {self.shard})"
+
+
+class ShardPool:
+    """
+    농장의 노드를 구역 접두사 단위로 나눠 워커 프로세스 shards개에서 실행합니다. (코어 1개가 포화되는 수천 노드용)
+    - 각 워커는 자기 샤드 노드만 가진 Farm과 TickScheduler로 필터/알람/자동화를 수행하고,
+      publish_interval마다 센서 값/알람/액추에이터 상태를 LiveBoard(공유 메모리)에 씁니다.
+    - 다른 샤드의 액추에이터를 대상으로 하는 자동화는 RemoteActuator가 대상 샤드의 명령 채널(SimpleQueue)로 보냅니다.
+    - 레시피 적용/실측값 반영도 같은 채널로 해당 샤드에 전달합니다.
+    VisionJobQueue와 마찬가지로 fork 방식이므로 다른 스레드가 생기기 전(main 초기)에 start()를 호출하세요.
+    """
+    def __init__(self, configs, data_dir, shards=2, name="farm", zone_ids=(), publish_interval=0.25,
+                 interval=(4, 6)):
+        self.data_dir = data_dir
+        self.name = name
+        self.shards = max(1, int(shards))
+        self.publish_interval = publish_interval
+        self.interval = interval
+        self.configs = list(configs)
+        self.owner = assign_shards(zone_groups(self.configs, zone_ids), self.shards)
+        self.node_ids = [cfg['id'] for cfg in self.configs]
+        self.board = self._layout()
+        ctx = multiprocessing.get_context('fork')
+        self._ctx = ctx
+        self.channels = [ctx.SimpleQueue() for _ in range(self.shards)]
+        self.procs = []
+
+    def _layout(self):
+        """임시 Farm에 프로비저닝해 핀 배정/자동화 규칙을 워커와 똑같이 계산하고 슬롯을 정합니다."""
+        scratch = Farm(f"{self.name}-layout", self.data_dir)
+        sensors, actuators, states = [], [], ["OFF"]
+        ordered = sorted(self.configs, key=lambda c: self.owner[c['id']])
+        for cfg in ordered:
+            node = ESP32C3Node(cfg['id'], farm=scratch)
+            node.provision(cfg)
+            sensors += [(node.node_id, s.device_id, s.name, s.pin, s.io_type) for s in node.sensors.values()]
+            actuators += [(node.node_id, a.device_id, a.name) for a in node.actuators.values()]
+            for s in node.sensors.values():
+                for target, msg_id in ((s.target_min, s.msg_id_min), (s.target_max, s.msg_id_max)):
+                    if target:
+                        states.append(f"ACTIVE (By:{s.device_id} Msg:{msg_id})")
+        states = list(dict.fromkeys(states)) + ["ACTIVE"]
+        return LiveBoard([c['id'] for c in ordered], sensors, actuators, states, self.shards)
+
+    def device_entries(self):
+        """노드 ID -> [(device_id, name, pin), ...] (config.json 센서 순서, 게이트웨이의 바이너리 장치 인덱스 해석용)"""
+        entries = {}
+        for node_id, device_id, name, pin, _ in self.board.sensors:
+            entries.setdefault(node_id, []).append((device_id, name, pin))
+        return entries
+
+    # ---------------------------------------------------------------- 부모 프로세스
+    def start(self):
+        if not self.procs:
+            for shard in range(self.shards):
+                proc = self._ctx.Process(target=self._worker_main, args=(shard,), name=f"{self.name}-shard{shard}", daemon=True)
+                proc.start()
+                self.procs.append(proc)
+            logger.info("🧩 [Shard] %s: 노드 %d개를 프로세스 %d개에 분산 (샤드별 노드 수: %s)", self.name, len(self.node_ids),
+                     self.shards, [sum(1 for o in self.owner.values() if o == s) for s in range(self.shards)])
+        return self
+
+    def stop(self, timeout=3.0):
+        for channel in self.channels:
+            channel.put(("stop",))
+        for proc in self.procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self.procs = []
+        self.board.close()
+
+    def apply_recipe(self, node_ids, recipe_str):
+        """레시피를 노드가 속한 샤드로 보냅니다. 반환값: 적용 요청 시 True, 레시피가 없으면 None"""
+        if not get_recipe_catalog(f'{self.data_dir}/catalog_crop.json').compile(recipe_str):
+            return None
+        by_shard = {}
+        for node_id in node_ids:
+            by_shard.setdefault(self.owner[node_id], []).append(node_id)
+        for shard, ids in by_shard.items():
+            self.channels[shard].put(("recipe", ids, recipe_str))
+        return True
+
+    def apply_readings(self, readings):
+        """실측값 (node_id, device_id, 원시 값)을 소속 샤드로 보냅니다. 반환값: 전달한 건수"""
+        by_shard = {}
+        for reading in readings:
+            shard = self.owner.get(reading[0])
+            if shard is not None:
+                by_shard.setdefault(shard, []).append(reading)
+        for shard, batch in by_shard.items():
+            self.channels[shard].put(("readings", batch))
+        return sum(map(len, by_shard.values()))
+
+    def status(self):
+        now = time.time()
+        board = self.board
+        return {"shards": [{"shard": s, "alive": s < len(self.procs) and self.procs[s].is_alive(),
+                            "nodes": sum(1 for o in self.owner.values() if o == s),
+                            "ticks": int(board.ticks[s]), "samples": int(board.samples[s]),
+                            "max_lag": round(float(board.max_lag[s]), 3),
+                            "stale": round(now - float(board.heartbeat[s]), 2) if board.heartbeat[s] else None}
+                           for s in range(self.shards)]}
+
+    # ---------------------------------------------------------------- 워커 프로세스
+    def _worker_main(self, shard):
+        try:
+            asyncio.run(self._worker(shard))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # multiprocessing 자식은 atexit 없이 종료되므로 대기 중인 로그를 직접 기록
+            farm_log.shutdown()
+
+    async def _worker(self, shard):
+        board = self.board
+        farm = Farm(f"{self.name}#{shard}", self.data_dir)
+        scheduler = TickScheduler()
+        loop = asyncio.get_running_loop()
+        for cfg in self.configs:
+            if self.owner[cfg['id']] == shard:
+                ESP32C3Node(cfg['id'], farm=farm).provision(cfg)
+
+        # 다른 샤드의 액추에이터 대상은 대리 객체로 해석 (없는 장치는 프로비저닝 때처럼 미해석으로 남김)
+        for target_id in unresolved_targets(farm):
+            slot = board.actuator_slot.get(target_id)
+            if slot is None:
+                continue
+            target_shard = self.owner[board.actuators[slot][0]]
+            proxy = RemoteActuator(target_id, board.actuators[slot][2], self.channels[target_shard], target_shard, board, slot)
+            farm.device_index[target_id] = (None, proxy)
+            for sensor in list(farm.target_dependents.get(target_id, ())):
+                compile_automation(sensor)
+
+        nodes = list(farm.registry.values())
+        rows = np.array([s.bank_index for n in nodes for s in n.sensors.values()], dtype=np.intp)
+        slots = np.array([board.sensor_slot[(n.node_id, s.device_id)] for n in nodes for s in n.sensors.values()], dtype=np.intp)
+        acts = [(a, board.actuator_slot[a.device_id]) for n in nodes for a in n.actuators.values()]
+        act_slots = np.array([slot for _, slot in acts], dtype=np.intp)
+        for node in nodes:
+            scheduler.add(node, interval=random.uniform(*self.interval))
+
+        stop = asyncio.Event()
+        parent = os.getppid()
+
+        def handle(message):
+            kind = message[0]
+            if kind == "state":
+                entry = farm.device_index.get(message[1])
+                if entry is not None and entry[0] is not None:
+                    entry[1].set_state(message[2])
+            elif kind == "recipe":
+                targets = [farm.registry[n] for n in message[1] if n in farm.registry]
+                if targets:
+                    apply_recipe(targets, message[2])
+            elif kind == "readings":
+                apply_readings(message[1], farm=farm)
+            elif kind == "stop":
+                stop.set()
+
+        def receive(channel=self.channels[shard]):
+            while True:
+                message = channel.get()
+                loop.call_soon_threadsafe(handle, message)
+                if message[0] == "stop":
+                    return
+
+        threading.Thread(target=receive, name=f"shard{shard}-inbox", daemon=True).start()
+        ticker = asyncio.create_task(scheduler.run())
+        codes = board.state_codes
+        fallback = len(board.states) - 1
+        bank = farm.bank
+        try:
+            while not stop.is_set():
+                # 공유 상태판 갱신: 행 배열 → 슬롯 배열 대입 1회, 액추에이터는 상태 코드로
+                board.values[slots] = bank.last_value[rows]
+                board.alarms[slots] = bank.alarm_min[rows] * ALARM_MIN + bank.alarm_max[rows] * ALARM_MAX
+                if len(acts):
+                    board.act_state[act_slots] = [codes.get(a.state, fallback) for a, _ in acts]
+                board.ticks[shard] = scheduler.stats["ticks"]
+                board.samples[shard] = bank.samples
+                board.max_lag[shard] = scheduler.stats["max_lag"]
+                board.heartbeat[shard] = time.time()
+                if os.getppid() != parent:  # 부모가 비정상 종료되면 함께 종료
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), self.publish_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            ticker.cancel()
+
+
+if __name__ == "__main__":
+    # 벤치마크/자가 점검: python -m sf_core.shards [노드 수] [샤드 수]
+    #   노드마다 센서 8개 + 액추에이터 4개, 구역 20개. 각 구역 첫 노드의 센서는 다음 구역(다른 샤드일 수 있음)의 액추에이터를 대상으로 함
+    #   틱 주기를 짧게(0.02~0.03초) 잡아 코어를 포화시킨 뒤, 단일 프로세스 대비 샤드 처리량(센서 샘플/초)을 비교합니다.
+    import contextlib
+    import io
+    import sys
+    import tempfile
+
+    farm_log.setup(level="WARNING")  # 노드/샤드 진행 로그는 숨김
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    n_shards = int(sys.argv[2]) if len(sys.argv) > 2 else max(2, min(os.cpu_count() or 1, 8))
+    data_dir = tempfile.mkdtemp()
+    with open(os.path.join(data_dir, 'catalog_crop.json'), 'w', encoding='utf-8') as f:
+        json.dump({"lettuce": {"seedling": {"온도": {"min": 200.0, "max": 300.0}}}}, f)
+    zones = [f"Z{z:02d}" for z in range(20)]
+    configs = []
+    for i in range(n_nodes):
+        zone = zones[i % len(zones)]
+        node_id = f"{zone}N{i:05d}"
+        next_zone_node = f"{zones[(i + 1) % len(zones)]}N{(i + 1) % n_nodes:05d}"
+        sensors = [{"id": f"{node_id}S{k}", "name": "온도 센서" if k == 0 else f"센서 {k}",
+                    "type": "analog" if k < 5 else "digital", "min": 10.0, "max": 90.0} for k in range(8)]
+        if i < len(zones):  # 교차 샤드 자동화: 항상 알람이 나도록 min을 높게
+            sensors[0].update({"min": 1000.0, "hysteresis": 0.0, "target_min": f"{next_zone_node}A0", "msg_id_min": "CROSS"})
+        configs.append({"id": node_id, "sensors": sensors,
+                        "actuators": [{"id": f"{node_id}A{k}", "name": f"액추에이터 {k}", "type": "digital"} for k in range(4)]})
+
+    def run(shards, seconds=4.0):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool = ShardPool(configs, data_dir, shards=shards, name=f"bench{shards}", zone_ids=zones,
+                             interval=(0.02, 0.03)).start()
+            time.sleep(1.0)  # 워커 프로비저닝/워밍업
+            s0, t0 = int(pool.board.samples.sum()), time.perf_counter()
+            time.sleep(seconds)
+            rate = (int(pool.board.samples.sum()) - s0) / (time.perf_counter() - t0)
+            t_read = time.perf_counter()
+            status = pool.board.live_status()
+            read_ms = (time.perf_counter() - t_read) * 1000
+            cross = [a for a in status[configs[1]['id']]["actuators"] if a["id"] == f"{configs[1]['id']}A0"][0]["state"]
+            pool.apply_recipe([configs[0]['id']], "lettuce.seedling")
+            time.sleep(0.6)
+            recipe_alarm = int(pool.board.alarms[pool.board.sensor_slot[(configs[0]['id'], f"{configs[0]['id']}S0")]])
+            info = pool.status()
+            pool.stop()
+        return rate, read_ms, cross, recipe_alarm, info
+
+    base_rate, _, _, _, _ = run(1)
+    rate, read_ms, cross, recipe_alarm, info = run(n_shards)
+    assert cross.startswith("ACTIVE (By:") and "Msg:CROSS" in cross, cross
+    assert recipe_alarm & ALARM_MIN, "레시피 명령이 샤드에 반영되지 않음"
+    assert all(s["ticks"] > 0 for s in info["shards"])
+    print(f"노드 {n_nodes}개 × 센서 8개, 코어 {os.cpu_count()}개")
+    print(f"  단일 프로세스      : {base_rate:12,.0f} 샘플/s")
+    print(f"  샤드 {n_shards}개          : {rate:12,.0f} 샘플/s ({rate / base_rate:.2f}배)")
+    print(f"  공유 메모리 스냅샷 조립 {read_ms:.1f} ms, 교차 샤드 자동화: {cross}")
+    print(f"  샤드별 노드 수: {[s['nodes'] for s in info['shards']]}")
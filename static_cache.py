@@ -0,0 +1,305 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate
+
+from sf_core.log import get_logger
+
+# 🟢 Brotli Support (Optional)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger("static")
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+GZIP_MIN_BYTES = 1024
+SENDFILE_MIN_BYTES = 256 * 1024
+
+
+class StaticEntry:
+    """파일 1개의 캐시 항목: 원본/압축 변형 본문(작은 파일), 강한 ETag, 파일 상태(mtime/크기)"""
+    __slots__ = ('path', 'stamp', 'size', 'ctype', 'etag', 'last_modified', 'variants', 'heads')
+
+    def __init__(self, path, stamp, size, ctype, etag, last_modified, variants):
+        self.path = path
+        self.stamp = stamp
+        self.size = size
+        self.ctype = ctype
+        self.etag = etag                  # 원본 ETag (변형은 "-gz"/"-br" 접미사)
+        self.last_modified = last_modified
+        self.variants = variants          # 인코딩("identity"/"gzip"/"br") -> 본문 bytes. 큰 파일은 {} (sendfile)
+        self.heads = {}                   # (인코딩, 본문 포함 여부) -> 미리 만든 응답 헤더 bytes
+
+
+class StaticCache:
+    """
+    html/ 폴더 정적 파일의 메모리 캐시.
+    - 시작 시 전체를 읽어 gzip(가능하면 brotli) 변형과 내용 해시 기반 강한 ETag를 미리 계산합니다.
+    - URL → 항목 매핑(/html/<경로>, /<이름>.html)도 미리 만들어 요청 처리 중에는 디스크를 보지 않습니다.
+    - If-None-Match가 일치하면 304, 큰 파일(sendfile_min 이상)은 본문을 메모리에 두지 않고 os.sendfile로 보냅니다.
+    - run() 루프가 interval초마다 폴더를 훑어 바뀐/새/삭제된 파일만 다시 반영합니다.
+    """
+    def __init__(self, root, url_prefix='/html/', gzip_min=GZIP_MIN_BYTES, sendfile_min=SENDFILE_MIN_BYTES, interval=2.0):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.gzip_min = gzip_min
+        self.sendfile_min = sendfile_min
+        self.interval = interval
+        self.entries = {}  # 상대 경로 -> StaticEntry
+        self.routes = {}   # URL 경로 -> StaticEntry
+        self.stats = {"hits": 0, "not_modified": 0, "sendfile": 0, "reloads": 0}
+
+    # ---------------------------------------------------------------- 적재/무효화
+    def load(self):
+        self.refresh()
+        variants = sum(len(e.variants) for e in self.entries.values())
+        logger.info("🗂️ [Static] %s: 파일 %d개 캐시 (본문 변형 %d개, brotli %s)", self.root, len(self.entries), variants,
+                    '사용' if brotli else '미설치')
+        return self
+
+    def refresh(self):
+        """폴더를 훑어 바뀐 파일만 다시 읽습니다. 반환값: 변경(추가/수정/삭제) 수"""
+        seen, changed = set(), 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(rel)
+                entry = self.entries.get(rel)
+                if entry is None or entry.stamp != (st.st_mtime_ns, st.st_size):
+                    try:
+                        self.entries[rel] = self._build(path, st)
+                    except OSError as e:
+                        logger.warning("⚠️ [Static] %s 읽기 실패: %s", rel, e, key=("static-read", rel), every=300)
+                        continue
+                    changed += 1
+        for rel in [rel for rel in self.entries if rel not in seen]:
+            del self.entries[rel]
+            changed += 1
+        if changed:
+            routes = {}
+            for rel, entry in self.entries.items():
+                routes[self.url_prefix + rel] = entry
+                if rel.endswith('.html'):
+                    routes['/' + rel] = entry
+            self.routes = routes  # 통째로 교체 (요청 처리 중인 조회와 경합 없음)
+        return changed
+
+    def _build(self, path, st):
+        ctype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if ctype.startswith('text/'):
+            ctype += '; charset=utf-8'
+        digest = hashlib.blake2b(digest_size=12)
+        variants = {}
+        if st.st_size >= self.sendfile_min:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            with open(path, 'rb') as f:
+                body = f.read()
+            digest.update(body)
+            variants["identity"] = body
+            if ctype.startswith(COMPRESSIBLE) and len(body) >= self.gzip_min:
+                packed = gzip.compress(body, 9, mtime=0)
+                if len(packed) < len(body):
+                    variants["gzip"] = packed
+                if brotli is not None:
+                    packed = brotli.compress(body, quality=11)
+                    if len(packed) < len(body):
+                        variants["br"] = packed
+        return StaticEntry(path, (st.st_mtime_ns, st.st_size), st.st_size, ctype, f'"{digest.hexdigest()}"',
+                           formatdate(st.st_mtime, usegmt=True), variants)
+
+    async def run(self):
+        """interval초마다 변경된 파일을 다시 반영하는 백그라운드 루프"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                changed = await asyncio.to_thread(self.refresh)
+                if changed:
+                    self.stats["reloads"] += changed
+                    logger.info("♻️ [Static] 변경된 파일 %d개 다시 적재", changed)
+            except Exception as e:
+                logger.error("⚠️ [Static] 갱신 실패: %s", e, key="static-refresh", every=300)
+
+    # ---------------------------------------------------------------- 응답
+    def lookup(self, route):
+        return self.routes.get(route)
+
+    @staticmethod
+    def _etag(entry, encoding):
+        return entry.etag if encoding == "identity" else entry.etag[:-1] + ('-gz"' if encoding == "gzip" else '-br"')
+
+    @staticmethod
+    def _choose(entry, accept):
+        """Accept-Encoding에 맞는 가장 작은 변형 (q=0 은 거부로 봄)"""
+        accepted = set()
+        for part in accept.lower().split(','):
+            name, _, params = part.strip().partition(';')
+            if name and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+                accepted.add(name)
+        if "br" in entry.variants and ("br" in accepted or "*" in accepted):
+            return "br"
+        if "gzip" in entry.variants and ("gzip" in accepted or "*" in accepted):
+            return "gzip"
+        return "identity"
+
+    def _head(self, entry, status, encoding, length):
+        key = (status, encoding)
+        head = entry.heads.get(key)
+        if head is None:
+            lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Modified'}",
+                     f"ETag: {self._etag(entry, encoding)}", f"Last-Modified: {entry.last_modified}",
+                     "Cache-Control: no-cache", "Vary: Accept-Encoding"]
+            if status == 200:
+                lines.append(f"Content-Type: {entry.ctype}")
+                if encoding != "identity":
+                    lines.append(f"Content-Encoding: {encoding}")
+            lines.append(f"Content-Length: {length}")
+            head = entry.heads[key] = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        return head
+
+    def not_modified(self, entry, headers):
+        tags = headers.get('if-none-match')
+        if not tags:
+            return False
+        if tags.strip() == '*':
+            return True
+        wanted = {tag.strip().removeprefix('W/') for tag in tags.split(',')}
+        return any(self._etag(entry, enc) in wanted for enc in ("identity", "gzip", "br"))
+
+    async def send(self, writer, entry, headers, head_only=False):
+        """캐시 항목으로 응답합니다. (304 / 메모리 본문 / 큰 파일 sendfile) 반환값: 상태 코드"""
+        self.stats["hits"] += 1
+        if self.not_modified(entry, headers):
+            self.stats["not_modified"] += 1
+            writer.write(self._head(entry, 304, "identity", 0))
+            return 304
+        if entry.variants:
+            encoding = self._choose(entry, headers.get('accept-encoding', ''))
+            body = entry.variants[encoding]
+            writer.write(self._head(entry, 200, encoding, len(body)))
+            if not head_only:
+                writer.write(body)
+            return 200
+
+        # 큰 파일: 헤더만 쓰고 본문은 커널에서 바로 소켓으로 (loop.sendfile → os.sendfile, 불가하면 읽어서 전송)
+        writer.write(self._head(entry, 200, "identity", entry.size))
+        if head_only:
+            return 200
+        await writer.drain()
+        self.stats["sendfile"] += 1
+        with open(entry.path, 'rb') as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, 0, entry.size)
+        return 200
+
+
+if __name__ == "__main__":
+    # 벤치마크/자가 점검: 대시보드(html/index.html) keep-alive 반복 요청 - 기존 정적 처리(SimpleHTTPRequestHandler) vs 캐시
+    import http.server
+    import shutil
+    import socket
+    import tempfile
+    import time
+    from async_http import AsyncHTTPServer
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    root = tempfile.mkdtemp()
+    shutil.copytree(os.path.join(base_dir, 'html'), os.path.join(root, 'html'))
+    with open(os.path.join(root, 'html', 'big.bin'), 'wb') as f:
+        f.write(os.urandom(SENDFILE_MIN_BYTES * 4))
+
+    class Plain(http.server.SimpleHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def translate_path(self, path):
+            return os.path.join(root, path.split('?', 1)[0].lstrip('/'))
+
+        def log_message(self, *args):
+            pass
+
+    def read_response(sock, buf):
+        while b"\r\n\r\n" not in buf:
+            buf += sock.recv(65536)
+        head, _, rest = buf.partition(b"\r\n\r\n")
+        length = int(next(l.split(b":")[1] for l in head.split(b"\r\n") if l.lower().startswith(b"content-length")))
+        while len(rest) < length:
+            rest += sock.recv(max(65536, length - len(rest)))
+        return head, rest[:length], rest[length:]
+
+    async def bench(static, requests=2000, extra=b""):
+        server = AsyncHTTPServer(Plain, static=static)
+        srv = await server.start("127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+
+        def client():
+            with socket.create_connection(("127.0.0.1", port)) as sock:
+                buf, total = b"", 0
+                t0 = time.perf_counter()
+                for _ in range(requests):
+                    sock.sendall(b"GET /html/index.html HTTP/1.1\r\nHost: x\r\n" + extra + b"\r\n")
+                    head, body, buf = read_response(sock, buf)
+                    total += len(body)
+                return time.perf_counter() - t0, total, head
+
+        try:
+            return await asyncio.to_thread(client)
+        finally:
+            srv.close()
+
+    async def checks(cache):
+        server = AsyncHTTPServer(Plain, static=cache)
+        srv = await server.start("127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+
+        def client():
+            with socket.create_connection(("127.0.0.1", port)) as sock:
+                buf = b""
+                sock.sendall(b"GET /index.html HTTP/1.1\r\nAccept-Encoding: gzip\r\n\r\n")
+                head, body, buf = read_response(sock, buf)
+                assert b"Content-Encoding: gzip" in head and gzip.decompress(body) == cache.entries['index.html'].variants["identity"]
+                etag = next(l.split(b": ", 1)[1] for l in head.split(b"\r\n") if l.startswith(b"ETag"))
+                sock.sendall(b"GET /html/index.html HTTP/1.1\r\nIf-None-Match: " + etag + b"\r\n\r\n")
+                head, body, buf = read_response(sock, buf)
+                assert head.startswith(b"HTTP/1.1 304") and body == b""
+                sock.sendall(b"GET /html/big.bin HTTP/1.1\r\n\r\n")
+                head, body, buf = read_response(sock, buf)
+                with open(os.path.join(root, 'html', 'big.bin'), 'rb') as f:
+                    assert body == f.read()
+                return etag
+
+        try:
+            etag = await asyncio.to_thread(client)
+        finally:
+            srv.close()
+        # 파일 변경 → 갱신 후 ETag 변경
+        with open(os.path.join(root, 'html', 'index.html'), 'ab') as f:
+            f.write(b"<!-- changed -->")
+        assert cache.refresh() == 1 and cache.lookup('/index.html').etag.encode() != etag.replace(b'-gz', b'')
+        assert cache.stats["sendfile"] == 1
+
+    async def main():
+        cache = StaticCache(os.path.join(root, 'html')).load()
+        plain = await bench(None)
+        cached = await bench(cache)
+        gz = await bench(cache, extra=b"Accept-Encoding: gzip, br\r\n")
+        etag = cache.lookup('/html/index.html').etag.encode()
+        revalidate = await bench(cache, extra=b"If-None-Match: " + etag + b"\r\n")
+        await checks(cache)
+        n = 2000
+        print(f"/html/index.html keep-alive {n}회")
+        for label, (sec, total, _) in (("기존(디스크 읽기)", plain), ("캐시", cached), ("캐시+gzip", gz), ("캐시 304", revalidate)):
+            print(f"  {label:16s}: {n / sec:8,.0f} req/s, 전송 {total / n / 1024:6.1f} KB/요청")
+        print(f"  {plain[0] / cached[0]:.1f}배 빠름, 압축 시 전송량 {cached[1] / max(gz[1], 1):.1f}배 감소")
+
+    asyncio.run(main())
+    shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,170 @@
+import json
+import struct
+
+import numpy as np
+
+from sf_core import DEFAULT_FARM
+
+# 바이너리 프레임 (리틀 엔디언, 고정폭)
+#   헤더 10 bytes: magic "SF" | version u8 | kind u8 | ts u32(epoch 초) | count u16
+#   텔레메트리 레코드 6 bytes: dev u16(노드 장치 사전 인덱스) | val f32
+#   경보 레코드 15 bytes: dev u16 | side u8(1=min, 2=max) | val f32 | min f32 | max f32
+MAGIC = b"SF"
+VERSION = 1
+KIND_TELEMETRY, KIND_ALERT = 1, 2
+HEADER = struct.Struct('<2sBBIH')
+TELEMETRY_DTYPE = np.dtype([('dev', '<u2'), ('val', '<f4')])
+ALERT_DTYPE = np.dtype([('dev', '<u2'), ('side', 'u1'), ('val', '<f4'), ('min', '<f4'), ('max', '<f4')])
+RECORD_DTYPES = {KIND_TELEMETRY: TELEMETRY_DTYPE, KIND_ALERT: ALERT_DTYPE}
+ALERT_SIDES = {1: "min", 2: "max"}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def is_binary(payload):
+    return payload[:2] == MAGIC
+
+
+def encode_telemetry(ts, readings):
+    """readings: [(장치 인덱스, 값), ...] → 텔레메트리 프레임 bytes (노드/테스트용 인코더)"""
+    recs = np.array(readings, dtype=TELEMETRY_DTYPE)
+    return HEADER.pack(MAGIC, VERSION, KIND_TELEMETRY, int(ts), len(recs)) + recs.tobytes()
+
+
+def encode_alert(ts, alerts):
+    """alerts: [(장치 인덱스, 'min'|'max', 값, 최소, 최대), ...] → 경보 프레임 bytes"""
+    sides = {v: k for k, v in ALERT_SIDES.items()}
+    recs = np.array([(dev, sides[side], val, lo, hi) for dev, side, val, lo, hi in alerts], dtype=ALERT_DTYPE)
+    return HEADER.pack(MAGIC, VERSION, KIND_ALERT, int(ts), len(recs)) + recs.tobytes()
+
+
+def read_header(buf):
+    """프레임 헤더를 검사합니다. 반환값: (종류, ts, 레코드 수). 형식이 맞지 않으면 FrameError"""
+    if len(buf) < HEADER.size:
+        raise FrameError("frame too short")
+    magic, version, kind, ts, count = HEADER.unpack_from(buf)
+    if magic != MAGIC or version != VERSION or kind not in RECORD_DTYPES:
+        raise FrameError(f"unsupported frame (version {version}, kind {kind})")
+    if len(buf) != HEADER.size + count * RECORD_DTYPES[kind].itemsize:
+        raise FrameError("frame length mismatch")
+    return kind, ts, count
+
+
+def decode_frames(buffers, kind=KIND_TELEMETRY):
+    """
+    같은 종류의 프레임 여러 개를 한 번에 배열로 풉니다.
+    헤더만 struct로 검사하고, 본문(memoryview 슬라이스)은 한 번에 이어 붙여 np.frombuffer 1회로 해석합니다.
+    반환값: (레코드 배열, 레코드별 프레임 번호 배열, 레코드별 ts 배열)
+    """
+    dtype = RECORD_DTYPES[kind]
+    size, itemsize = HEADER.size, dtype.itemsize
+    unpack = HEADER.unpack_from
+    bodies, counts, stamps = [], [], []
+    for buf in buffers:
+        if len(buf) < size:
+            raise FrameError("frame too short")
+        magic, version, frame_kind, ts, count = unpack(buf)
+        if magic != MAGIC or version != VERSION or frame_kind != kind or len(buf) != size + count * itemsize:
+            read_header(buf)  # 구체적인 오류 메시지
+            raise FrameError("mixed frame kinds")
+        bodies.append(memoryview(buf)[size:])
+        counts.append(count)
+        stamps.append(ts)
+    recs = np.frombuffer(b"".join(bodies), dtype=dtype)
+    counts = np.array(counts, dtype=np.intp)
+    frame_idx = np.repeat(np.arange(len(counts)), counts)
+    return recs, frame_idx, np.array(stamps, dtype=np.int64)[frame_idx]
+
+
+class DeviceDictionary:
+    """
+    노드별 장치 사전: 바이너리 레코드의 장치 인덱스 → (device_id, name, pin).
+    - JSON 텔레메트리를 한 번 받으면 그 sensors 순서를 사전으로 학습합니다. (노드는 부팅 시 JSON 1회 후 바이너리 전송)
+    - 학습 전이면 provisioned(노드 ID -> 항목 목록, 샤드 모드에서 ShardPool.device_entries()로 지정),
+      그다음 농장 레지스트리(기본: DEFAULT_FARM)에 등록된 노드의 센서 순서(config.json 순서)를 사용합니다.
+    - 둘 다 없으면 "{node_id}#{인덱스}"를 장치 ID로 씁니다.
+    """
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else DEFAULT_FARM.registry
+        self.learned = {}  # node_id -> [(device_id, name, pin), ...]
+        self.provisioned = {}  # 레지스트리 밖에서 실행되는 노드(샤드 워커)의 같은 형식 사전
+
+    def learn(self, node_id, sensors):
+        entries = [(s["id"], s.get("name", s["id"]), s.get("pin", "")) for s in sensors
+                   if isinstance(s, dict) and isinstance(s.get("id"), str)]
+        if entries and self.learned.get(node_id) != entries:
+            self.learned[node_id] = entries
+
+    def entries(self, node_id):
+        found = self.learned.get(node_id) or self.provisioned.get(node_id)
+        if found is None:
+            node = self.registry.get(node_id)
+            if node is not None:
+                found = [(s.device_id, s.name, s.pin) for s in node.sensors.values()]
+        return found or []
+
+    def resolve(self, node_id, index):
+        entries = self.entries(node_id)
+        if index < len(entries):
+            return entries[index]
+        return (f"{node_id}#{index}", f"{node_id}#{index}", "")
+
+    def describe(self, node_id):
+        """노드에 내려줄 사전 (설정 응답용)"""
+        return {"version": VERSION, "devices": [device_id for device_id, _, _ in self.entries(node_id)]}
+
+
+if __name__ == "__main__":
+    # 벤치마크: 노드 1만 개 메시지(센서 8개씩) - JSON 크기/해석 vs 바이너리 크기/일괄 해석
+    import time
+
+    rng = np.random.default_rng(0)
+    sensors = [{"id": f"AAA{i:03d}", "name": f"센서 {i}", "pin": f"GPIO{i}"} for i in range(8)]
+    messages, json_payloads, bin_payloads = 10000, [], []
+    for m in range(messages):
+        values = rng.uniform(0, 100, 8).astype(np.float32)
+        json_payloads.append(json.dumps({"ts": 1771665300 + m, "sensors": [
+            {**s, "val": round(float(v), 2)} for s, v in zip(sensors, values)]}, ensure_ascii=False).encode('utf-8'))
+        bin_payloads.append(encode_telemetry(1771665300 + m, list(enumerate(values.tolist()))))
+
+    # 왕복 확인
+    recs, frame_idx, stamps = decode_frames(bin_payloads[:2])
+    assert len(recs) == 16 and frame_idx.tolist() == [0] * 8 + [1] * 8 and stamps[8] == 1771665301
+    alert = encode_alert(1771665300, [(3, "max", 31.5, 18.0, 28.0)])
+    arecs, _, _ = decode_frames([alert], KIND_ALERT)
+    assert ALERT_SIDES[int(arecs['side'][0])] == "max" and abs(float(arecs['val'][0]) - 31.5) < 1e-6
+    for bad in (b"SF", alert[:-1], b"SF\x09" + alert[3:]):
+        try:
+            decode_frames([bad], KIND_ALERT)
+            raise AssertionError("잘못된 프레임이 통과됨")
+        except FrameError:
+            pass
+
+    def timed(fn, repeat=5):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    def json_path():
+        out = []
+        for p in json_payloads:
+            data = json.loads(p.decode())
+            for s in data["sensors"]:
+                out.append((data["ts"], s["id"], s["val"]))
+        return out
+
+    views = [memoryview(p) for p in bin_payloads]
+    json_s = timed(json_path)
+    bin_s = timed(lambda: decode_frames(views))
+    json_bytes = sum(map(len, json_payloads)) / messages
+    bin_bytes = sum(map(len, bin_payloads)) / messages
+    records = messages * 8
+    print(f"메시지 {messages}건 × 센서 8개")
+    print(f"  JSON    : {json_bytes:6.0f} bytes/메시지, 해석 {json_s * 1000:7.1f} ms ({records / json_s:,.0f} 레코드/s)")
+    print(f"  바이너리: {bin_bytes:6.0f} bytes/메시지, 해석 {bin_s * 1000:7.1f} ms ({records / bin_s:,.0f} 레코드/s)")
+    print(f"  크기 {json_bytes / bin_bytes:.1f}배 감소, 해석 {json_s / bin_s:.1f}배 빠름")
@@ -0,0 +1,184 @@
+import os
+import urllib.parse
+
+# 요청에 붙여 핸들러에 넘기는 농장 헤더 (클라이언트가 보낸 같은 이름의 헤더는 라우터가 덮어씀)
+TENANT_HEADER = "X-Farm"
+BASE_HEADER = "X-Farm-Base"
+PREFIX = "/farm/"
+
+
+def parse_farms(spec):
+    """
+    FARMS 환경 변수 해석: "seoul=seoul_data,busan=busan_data,default=data" → [(이름, 데이터 폴더), ...]
+    폴더를 생략하면("seoul") 이름을 폴더로 씁니다. 순서를 유지하며 첫 번째가 기본 농장입니다.
+    """
+    farms = []
+    for item in (spec or "").split(','):
+        name, _, data_dir = item.strip().partition('=')
+        name = name.strip()
+        if not name:
+            continue
+        if any(name == n for n, _ in farms):
+            raise ValueError(f"중복된 농장 이름: {name}")
+        farms.append((name, data_dir.strip() or name))
+    return farms
+
+
+def parse_hosts(spec):
+    """FARM_HOSTS 환경 변수 해석: "seoul.example.com=seoul,busan.local=busan" → {호스트: 농장 이름}"""
+    hosts = {}
+    for item in (spec or "").split(','):
+        host, _, name = item.strip().partition('=')
+        if host and name:
+            hosts[host.strip().lower()] = name.strip()
+    return hosts
+
+
+class TenantRouter:
+    """
+    요청을 농장(테넌트)으로 나눕니다. 우선순위:
+    1. Host 헤더 매핑 (FARM_HOSTS)
+    2. 경로 접두사 /farm/<이름>/... (접두사는 떼고 라우팅)
+    3. Referer의 접두사 (대시보드 HTML은 /api/...를 절대 경로로 부르므로, /farm/<이름>/ 아래에서 연 페이지의 요청도 같은 농장으로)
+    4. 기본 농장 (첫 번째)
+    route()는 AsyncHTTPServer(router=...)에 그대로 넘길 수 있습니다.
+    """
+    def __init__(self, tenants, hosts=None):
+        if not tenants:
+            raise ValueError("농장이 1개 이상 필요합니다.")
+        self.tenants = {t.name: t for t in tenants}
+        self.default = tenants[0]
+        self.hosts = {h.lower(): name for h, name in (hosts or {}).items() if name in self.tenants}
+
+    def __iter__(self):
+        return iter(self.tenants.values())
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def get(self, name):
+        return self.tenants.get(name, self.default)
+
+    def _from_prefix(self, path):
+        """'/farm/<이름>/나머지' → (농장, '/나머지'). 해당 없으면 (None, path)"""
+        if not path.startswith(PREFIX):
+            return None, path
+        name, sep, rest = path[len(PREFIX):].partition('/')
+        name, query_sep, query = name.partition('?')
+        tenant = self.tenants.get(urllib.parse.unquote(name))
+        if tenant is None:
+            return None, path
+        rest = '/' + rest if sep else '/'
+        return tenant, rest + (query_sep + query if query_sep else '')
+
+    def route(self, path, headers):
+        host = headers.get('host', '').split(':', 1)[0].lower()
+        tenant = self.tenants.get(self.hosts.get(host))
+        prefixed, stripped = self._from_prefix(path)
+        base = ""
+        if prefixed is not None and tenant in (None, prefixed):
+            tenant, path, base = prefixed, stripped, PREFIX + prefixed.name
+        if tenant is None:
+            tenant = self._from_prefix(urllib.parse.urlparse(headers.get('referer', '')).path)[0]
+            base = PREFIX + tenant.name if tenant is not None else ""
+        tenant = tenant or self.default
+        return path, {TENANT_HEADER: tenant.name, BASE_HEADER: base}
+
+
+if __name__ == "__main__":
+    # 비교: 농장 3곳을 프로세스 3개(기존 docker-compose의 컨테이너 3개와 같은 구성)로 띄울 때 vs 1개 프로세스에 테넌트 3개
+    #       각 구성의 /health 응답까지 걸린 시간과 전체 메모리(PSS, 분석 워커 포함)를 측정합니다.
+    import shutil
+    import socket
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    import urllib.request
+
+    # 라우팅 자가 점검
+    class _T:
+        def __init__(self, name):
+            self.name = name
+    router = TenantRouter([_T("seoul"), _T("busan"), _T("data")], hosts={"busan.local": "busan"})
+    assert router.route("/api/live", {}) == ("/api/live", {TENANT_HEADER: "seoul", BASE_HEADER: ""})
+    assert router.route("/farm/busan/api/live?since=3", {}) == ("/api/live?since=3", {TENANT_HEADER: "busan", BASE_HEADER: "/farm/busan"})
+    assert router.route("/farm/busan", {})[0] == "/"
+    assert router.route("/api/live", {"host": "busan.local:8000"})[1][TENANT_HEADER] == "busan"
+    assert router.route("/api/live", {"referer": "http://x/farm/data/html/index.html"})[1][TENANT_HEADER] == "data"
+    assert router.route("/farm/nope/api/live", {}) == ("/farm/nope/api/live", {TENANT_HEADER: "seoul", BASE_HEADER: ""})
+    assert parse_farms("a=x, b") == [("a", "x"), ("b", "b")]
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    names = ["seoul_data", "busan_data", "data"]
+    work = tempfile.mkdtemp()
+    for name in names:
+        src = os.path.join(base_dir, name)
+        shutil.copytree(src if os.path.isdir(src) else os.path.join(base_dir, "data"), os.path.join(work, name))
+
+    def free_port():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def tree_pss_kb(pid):
+        """프로세스와 자식들의 PSS 합 (공유 페이지는 나눠서 계산, 없으면 RSS)"""
+        total, stack = 0, [pid]
+        while stack:
+            p = stack.pop()
+            try:
+                with open(f"/proc/{p}/smaps_rollup") as f:
+                    field = next((l for l in f if l.startswith("Pss:")), None)
+                if field is None:
+                    raise OSError
+            except OSError:
+                try:
+                    with open(f"/proc/{p}/status") as f:
+                        field = next((l for l in f if l.startswith("VmRSS:")), "VmRSS: 0 kB")
+                except OSError:
+                    continue
+            total += int(field.split()[1])
+            try:
+                with open(f"/proc/{p}/task/{p}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+            except OSError:
+                pass
+        return total
+
+    def launch(env_list):
+        procs, ports = [], []
+        t0 = time.perf_counter()
+        for extra in env_list:
+            port = free_port()
+            env = {**os.environ, "PORT": str(port), "PYTHONUNBUFFERED": "1", **extra}
+            env.pop("MQTT_BROKER", None)
+            procs.append(subprocess.Popen([sys.executable, os.path.join(base_dir, "main_async.py")], cwd=work, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            ports.append(port)
+        pending = set(ports)
+        while pending and time.perf_counter() - t0 < 60:
+            for port in list(pending):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5).read()
+                    pending.discard(port)
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        startup = time.perf_counter() - t0
+        time.sleep(3)  # 첫 틱/로거/코디네이터가 한 바퀴 돈 뒤 측정
+        memory = sum(tree_pss_kb(p.pid) for p in procs)
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+        return startup, memory, not pending
+
+    separate = launch([{"DATA_DIR": name} for name in names])
+    combined = launch([{"FARMS": ",".join(f"{n.split('_')[0]}={n}" for n in names)}])
+    shutil.rmtree(work, ignore_errors=True)
+
+    print(f"농장 {len(names)}곳 (분석 워커 포함, PSS 기준)")
+    print(f"  프로세스 {len(names)}개 : 기동 {separate[0]:5.2f}s, 메모리 {separate[1] / 1024:7.1f} MB")
+    print(f"  프로세스 1개 : 기동 {combined[0]:5.2f}s, 메모리 {combined[1] / 1024:7.1f} MB")
+    print(f"  메모리 {separate[1] / max(combined[1], 1):.1f}배 절감 (컨테이너 구성은 여기에 컨테이너 런타임/이미지 레이어 비용이 더해짐)")
+    assert separate[2] and combined[2], "일부 서버가 /health에 응답하지 않았습니다."
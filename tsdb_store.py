@@ -0,0 +1,403 @@
+import os
+import csv
+import glob
+import json
+import threading
+import time
+import numpy as np
+from datetime import datetime, date, timedelta
+from sf_core.log import get_logger
+
+logger = get_logger("tsdb")
+
+# 레코드 레이아웃: epoch(int64) + 장치 사전 ID(uint32) + 값(float32) = 16 bytes
+RECORD_DTYPE = np.dtype([('ts', '<i8'), ('dev', '<u4'), ('val', '<f4')])
+# 롤업 레이아웃: 버킷 시작 epoch + 장치 ID + count/min/max/sum = 32 bytes
+ROLLUP_DTYPE = np.dtype([('ts', '<i8'), ('dev', '<u4'), ('count', '<u4'),
+                         ('min', '<f4'), ('max', '<f4'), ('sum', '<f8')])
+# 해상도 라벨 -> 버킷 크기(초). 작은 것부터 정렬되어 있어야 함
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+LEGACY_PATTERNS = ["tsdb_*.csv", "smartfarm_tsdb.csv"]
+
+
+def _day_ordinals(ts_array):
+    """epoch 배열을 로컬 날짜의 ordinal 배열로 변환합니다 (고유 초 단위로만 변환)."""
+    uniq, inverse = np.unique(ts_array, return_inverse=True)
+    ords = np.array([datetime.fromtimestamp(int(t)).toordinal() for t in uniq], dtype=np.int64)
+    return ords[inverse]
+
+
+def _append_records(path, data, itemsize, checked):
+    """
+    고정폭 레코드 bytes를 파티션 끝에 덧붙입니다.
+    이 프로세스에서 처음 쓰는 파티션은 끝의 불완전 레코드(쓰기 도중 중단된 흔적)를 먼저 잘라 레코드 경계를 맞춥니다.
+    (그대로 두면 이후 append가 모두 어긋난 오프셋에서 시작되어 그날 나머지 데이터를 읽을 수 없게 됨)
+    """
+    with open(path, 'ab') as f:
+        if path not in checked:
+            size = f.seek(0, os.SEEK_END)
+            torn = size % itemsize
+            if torn:
+                f.truncate(size - torn)
+                logger.warning("⚠️ [TSDB] %s: 끝의 불완전한 레코드 %d바이트를 잘라냅니다.", os.path.basename(path), torn)
+            checked.add(path)
+        f.write(data)
+
+
+def _reduce(buckets, devs, count, mn, mx, sm):
+    """(버킷, 장치)별로 정렬 후 count/min/max/sum을 병합해 ROLLUP_DTYPE 배열을 만듭니다."""
+    out = np.empty(0, dtype=ROLLUP_DTYPE)
+    if len(buckets) == 0:
+        return out
+    order = np.lexsort((devs, buckets))
+    b, d = buckets[order], devs[order]
+    starts = np.flatnonzero(np.r_[True, (b[1:] != b[:-1]) | (d[1:] != d[:-1])])
+    out = np.empty(len(starts), dtype=ROLLUP_DTYPE)
+    out['ts'] = b[starts]
+    out['dev'] = d[starts]
+    out['count'] = np.add.reduceat(count[order], starts)
+    out['min'] = np.minimum.reduceat(mn[order], starts)
+    out['max'] = np.maximum.reduceat(mx[order], starts)
+    out['sum'] = np.add.reduceat(sm[order].astype(np.float64), starts)
+    return out
+
+
+class RollupSet:
+    """
+    해상도별(1분/1시간/1일) min/max/mean/count 집계를 쓰기 시점에 증분 유지합니다.
+    닫힌 버킷은 {해상도}/YYYY-MM-DD.agg 에 append 되고, 진행 중인 버킷은 rollup_state.json에 보존됩니다.
+    늦게 도착한 데이터는 부분 집계로 기록되며 조회 시 같은 버킷끼리 병합됩니다.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.state_path = os.path.join(root, 'rollup_state.json')
+        self.open = {label: {} for label in RESOLUTIONS}  # label -> {dev: [bucket, count, min, max, sum]}
+        self._checked = set()  # 끝 정렬을 확인한 파티션 경로
+        for label in RESOLUTIONS:
+            os.makedirs(os.path.join(root, label), exist_ok=True)
+        self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            for label in RESOLUTIONS:
+                self.open[label] = {int(dev): v for dev, v in state.get(label, {}).items()}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("⚠️ [TSDB] 롤업 상태 로드 실패: %s", e)
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.open, f)
+        os.replace(tmp_path, self.state_path)
+
+    def has_state(self):
+        return os.path.exists(self.state_path)
+
+    def reset(self):
+        for label in RESOLUTIONS:
+            for path in glob.glob(os.path.join(self.root, label, "*.agg")):
+                os.remove(path)
+        self.open = {label: {} for label in RESOLUTIONS}
+
+    def partition_path(self, label, day):
+        return os.path.join(self.root, label, f"{day:%Y-%m-%d}.agg")
+
+    @staticmethod
+    def bucket_of(ts_array, res):
+        # 일 단위 버킷이 로컬 자정에 맞도록 UTC 오프셋을 보정
+        offset = time.localtime(int(ts_array[0])).tm_gmtoff if len(ts_array) else 0
+        return (ts_array + offset) // res * res - offset
+
+    def update(self, recs):
+        """새로 기록된 원시 레코드로 모든 해상도의 집계를 갱신합니다."""
+        if len(recs) == 0:
+            return
+        vals = recs['val']
+        ones = np.ones(len(recs), dtype='<u4')
+        for label, res in RESOLUTIONS.items():
+            aggs = _reduce(self.bucket_of(recs['ts'], res), recs['dev'], ones, vals, vals, vals)
+            opened = self.open[label]
+            closed = []
+            for row in aggs.tolist():
+                bucket, dev, cnt, mn, mx, sm = row
+                cur = opened.get(dev)
+                if cur is None or bucket > cur[0]:
+                    if cur is not None:
+                        closed.append((cur[0], dev, cur[1], cur[2], cur[3], cur[4]))
+                    opened[dev] = [bucket, cnt, mn, mx, sm]
+                elif bucket == cur[0]:
+                    cur[1] += cnt
+                    cur[2] = min(cur[2], mn)
+                    cur[3] = max(cur[3], mx)
+                    cur[4] += sm
+                else:
+                    closed.append(row)
+            if closed:
+                self._append(label, np.array(closed, dtype=ROLLUP_DTYPE))
+        self._save_state()
+
+    def _append(self, label, aggs):
+        days = _day_ordinals(aggs['ts'])
+        for day in np.unique(days):
+            path = self.partition_path(label, date.fromordinal(int(day)))
+            _append_records(path, aggs[days == day].tobytes(), ROLLUP_DTYPE.itemsize, self._checked)
+
+    def read_partition(self, label, day):
+        path = self.partition_path(label, day)
+        try:
+            count = os.path.getsize(path) // ROLLUP_DTYPE.itemsize
+        except OSError:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        if count == 0:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        return np.memmap(path, dtype=ROLLUP_DTYPE, mode='r', shape=(count,))
+
+    def query(self, label, start_ts, end_ts, dev_ids=None):
+        """[start_ts, end_ts) 구간의 버킷을 (ts, dev) 순으로 병합해 반환합니다."""
+        parts = []
+        day = datetime.fromtimestamp(start_ts).date()
+        last = datetime.fromtimestamp(max(start_ts, end_ts - 1)).date()
+        while day <= last:
+            aggs = self.read_partition(label, day)
+            if len(aggs):
+                parts.append(np.asarray(aggs))
+            day += timedelta(days=1)
+        opened = [(v[0], dev, v[1], v[2], v[3], v[4]) for dev, v in list(self.open[label].items())]
+        if opened:
+            parts.append(np.array(opened, dtype=ROLLUP_DTYPE))
+        if not parts:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        aggs = np.concatenate(parts)
+        mask = (aggs['ts'] >= start_ts) & (aggs['ts'] < end_ts)
+        if dev_ids is not None:
+            mask &= np.isin(aggs['dev'], dev_ids)
+        aggs = aggs[mask]
+        return _reduce(aggs['ts'], aggs['dev'], aggs['count'], aggs['min'], aggs['max'], aggs['sum'])
+
+
+def pick_resolution(step):
+    """요청 간격(초)을 넘지 않는 가장 큰 롤업 해상도 라벨을 고릅니다."""
+    chosen = next(iter(RESOLUTIONS))
+    for label, res in RESOLUTIONS.items():
+        if res <= step:
+            chosen = label
+    return chosen
+
+
+class TimeSeriesStore:
+    """
+    일 단위 파티션(YYYY-MM-DD.seg)에 고정폭 바이너리 레코드를 append-only로 저장하는 시계열 엔진.
+    장치는 사전(devices.json)의 정수 ID로 저장되며, 조회 시에는 질의 구간에 해당하는 파티션만 memory-map 합니다.
+    쓰기 경로에서 1분/1시간/1일 롤업(RollupSet)을 함께 갱신합니다.
+    """
+    def __init__(self, data_dir, subdir='tsdb'):
+        self.data_dir = data_dir
+        self.root = os.path.join(data_dir, subdir)
+        os.makedirs(self.root, exist_ok=True)
+        self.dict_path = os.path.join(self.root, 'devices.json')
+        self.manifest_path = os.path.join(self.root, 'imported.json')
+        self.devices = []     # dev_id -> {"node_id", "device_id", "name", "pin"}
+        self.device_ids = {}  # (node_id, device_id) -> dev_id
+        self._lock = threading.Lock()
+        self._checked = set()  # 끝 정렬을 확인한 파티션 경로
+        self._load_dictionary()
+        self.rollups = RollupSet(self.root)
+
+    # ---------------------------------------------------------------- 장치 사전
+    def _load_dictionary(self):
+        if os.path.exists(self.dict_path):
+            try:
+                with open(self.dict_path, 'r', encoding='utf-8') as f:
+                    self.devices = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("⚠️ [TSDB] 장치 사전 로드 실패: %s", e)
+                self.devices = []
+        self.device_ids = {(d['node_id'], d['device_id']): i for i, d in enumerate(self.devices)}
+
+    def _save_dictionary(self):
+        tmp_path = self.dict_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.devices, f, ensure_ascii=False)
+        os.replace(tmp_path, self.dict_path)
+
+    def _resolve(self, node_id, device_id, name, pin):
+        """(node_id, device_id)를 사전 ID로 변환합니다. 반환값: (dev_id, 사전 변경 여부)"""
+        key = (node_id, device_id)
+        dev = self.device_ids.get(key)
+        if dev is None:
+            dev = len(self.devices)
+            self.devices.append({"node_id": node_id, "device_id": device_id, "name": name, "pin": pin})
+            self.device_ids[key] = dev
+            return dev, True
+        info = self.devices[dev]
+        if info['name'] != name or info['pin'] != pin:
+            info['name'], info['pin'] = name, pin
+            return dev, True
+        return dev, False
+
+    def devices_matching(self, keywords, exclude=()):
+        """이름에 키워드가 포함된 장치의 사전 ID 배열을 반환합니다."""
+        ids = [i for i, d in enumerate(self.devices)
+               if any(k in d['name'] for k in keywords) and not any(k in d['name'] for k in exclude)]
+        return np.array(ids, dtype='<u4')
+
+    # ---------------------------------------------------------------- 쓰기 경로
+    def partition_path(self, day):
+        return os.path.join(self.root, f"{day:%Y-%m-%d}.seg")
+
+    def append(self, rows):
+        """
+        rows: (epoch, node_id, device_id, device_name, value, pin) 목록.
+        일자별로 묶어 해당 파티션 끝에 레코드를 덧붙이고, 기록된 레코드 배열을 반환합니다.
+        """
+        rows = list(rows)
+        if not rows:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        recs = np.empty(len(rows), dtype=RECORD_DTYPE)
+        with self._lock:
+            dirty = False
+            for i, (ts, node_id, device_id, name, value, pin) in enumerate(rows):
+                dev, changed = self._resolve(node_id, device_id, name, pin)
+                dirty |= changed
+                recs[i] = (int(ts), dev, value)
+            # 사전을 먼저 저장해야 리더가 새 ID를 해석할 수 있음
+            if dirty:
+                self._save_dictionary()
+            self._write_partitions(recs)
+            self.rollups.update(recs)
+        return recs
+
+    def _write_partitions(self, recs):
+        days = _day_ordinals(recs['ts'])
+        for day in np.unique(days):
+            chunk = recs[days == day]
+            path = self.partition_path(date.fromordinal(int(day)))
+            _append_records(path, chunk.tobytes(), RECORD_DTYPE.itemsize, self._checked)
+
+    # ---------------------------------------------------------------- 읽기 경로
+    def read_partition(self, day):
+        """해당 일자의 파티션을 읽기 전용으로 memory-map 합니다. (끝의 불완전 레코드는 무시)"""
+        path = self.partition_path(day)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        count = size // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def query(self, start_ts, end_ts, dev_ids=None):
+        """[start_ts, end_ts) 구간의 레코드를 반환합니다. 질의가 걸치는 파티션만 엽니다."""
+        first = datetime.fromtimestamp(start_ts).date()
+        last = datetime.fromtimestamp(max(start_ts, end_ts - 1)).date()
+        parts = []
+        day = first
+        while day <= last:
+            recs = self.read_partition(day)
+            if len(recs):
+                mask = (recs['ts'] >= start_ts) & (recs['ts'] < end_ts)
+                if dev_ids is not None:
+                    mask &= np.isin(recs['dev'], dev_ids)
+                parts.append(np.asarray(recs[mask]))
+            day += timedelta(days=1)
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(parts)
+
+    def query_day(self, day, dev_ids=None):
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+        return self.query(int(start.timestamp()), int(end.timestamp()), dev_ids)
+
+    def rollup(self, step, start_ts, end_ts, dev_ids=None):
+        """요청 간격(step초)에 맞는 가장 작은 롤업을 조회합니다. 반환값: (해상도 라벨, 집계 배열)"""
+        label = pick_resolution(step)
+        with self._lock:
+            return label, self.rollups.query(label, start_ts, end_ts, dev_ids)
+
+    def rebuild_rollups(self):
+        """원시 파티션 전체로부터 롤업을 다시 계산합니다. (롤업 도입 이전 데이터용)"""
+        with self._lock:
+            self.rollups.reset()
+            for day in self.days():
+                self.rollups.update(np.asarray(self.read_partition(day)))
+            self.rollups._save_state()
+
+    def days(self):
+        """저장된 파티션 일자 목록 (오름차순)"""
+        result = []
+        for path in glob.glob(os.path.join(self.root, "*.seg")):
+            try:
+                result.append(datetime.strptime(os.path.basename(path)[:-4], "%Y-%m-%d").date())
+            except ValueError:
+                continue
+        return sorted(result)
+
+    # ---------------------------------------------------------------- 레거시 CSV 이관
+    def import_csv(self, csv_path, batch_size=50000):
+        """기존 tsdb_YYYY_MM.csv 파일을 스트리밍으로 읽어 바이너리 파티션으로 이관합니다."""
+        imported = 0
+        batch = []
+        last_ts_str, last_epoch = None, 0
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                ts_str = row.get('timestamp', '')
+                if ts_str != last_ts_str:
+                    try:
+                        last_epoch = int(datetime.strptime(ts_str, TS_FORMAT).timestamp())
+                    except ValueError:
+                        continue
+                    last_ts_str = ts_str
+                try:
+                    val = float(row.get('value', ''))
+                except ValueError:
+                    continue
+                batch.append((last_epoch, row.get('node_id', ''), row.get('device_id', ''),
+                               row.get('device_name', ''), val, row.get('pin', '')))
+                if len(batch) >= batch_size:
+                    imported += len(self.append(batch))
+                    batch = []
+        if batch:
+            imported += len(self.append(batch))
+        return imported
+
+    def import_legacy(self):
+        """DATA_DIR의 레거시 CSV를 1회만 이관합니다. 이관 완료 파일은 imported.json에 기록됩니다."""
+        done = []
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                done = json.load(f)
+
+        # 롤업 도입 이전에 기록된 원시 파티션이 있으면 1회 재계산
+        if not self.rollups.has_state() and self.days():
+            self.rebuild_rollups()
+            logger.info("📦 [TSDB] 롤업 재계산 완료 (%d일)", len(self.days()))
+
+        total = 0
+        for pattern in LEGACY_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(self.data_dir, pattern))):
+                name = os.path.basename(path)
+                if name in done:
+                    continue
+                count = self.import_csv(path)
+                done.append(name)
+                with open(self.manifest_path, 'w', encoding='utf-8') as f:
+                    json.dump(done, f, ensure_ascii=False)
+                logger.info("📦 [TSDB] 레거시 CSV 이관: %s (%d건)", name, count)
+                total += count
+        return total
+
+
+if __name__ == "__main__":
+    import sys
+    # 사용법: python tsdb_store.py [DATA_DIR]  -> 레거시 CSV 1회 이관
+    target = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('DATA_DIR', 'data')
+    store = TimeSeriesStore(target)
+    print(f"✅ [TSDB] 이관 완료: {store.import_legacy()}건 ({store.root})")
@@ -4,103 +4,220 @@ import requests
 import os
 import time
 
-def analyze_plant_growth(image_source):
+def load_image(image_source):
     """
-    이미지 소스(URL 또는 로컬 파일 경로)를 받아 식물의 초록색 영역 비율을 분석합니다.
+    이미지 소스(URL 또는 로컬 파일 경로)를 BGR 배열로 읽습니다.
+    반환값: (image, 오류 dict 또는 None)
     """
-    try:
-        # 1. 이미지 로드
-        image = None
-        if image_source.startswith('http'):
-            # Detect whether it's an MJPEG stream or a static image
-            try:
-                resp = requests.get(image_source, stream=True, timeout=5)
-                content_type = resp.headers.get('Content-Type', '').lower()
-                
-                if 'multipart' in content_type or 'video' in content_type:
-                    # It's an MJPEG stream. We must close the request and use OpenCV VideoCapture
-                    resp.close()
-                    cap = cv2.VideoCapture(image_source)
-                    if cap.isOpened():
-                        ret, frame = cap.read()
-                        if ret:
-                            image = frame
-                        cap.release()
+    image = None
+    if image_source.startswith('http'):
+        # Detect whether it's an MJPEG stream or a static image
+        try:
+            resp = requests.get(image_source, stream=True, timeout=5)
+            content_type = resp.headers.get('Content-Type', '').lower()
+            
+            if 'multipart' in content_type or 'video' in content_type:
+                # It's an MJPEG stream. We must close the request and use OpenCV VideoCapture
+                resp.close()
+                cap = cv2.VideoCapture(image_source)
+                if cap.isOpened():
+                    ret, frame = cap.read()
+                    if ret:
+                        image = frame
+                    cap.release()
+            else:
+                # It's a static image. Safe to read the whole content
+                if resp.status_code == 200:
+                    image_array = np.asarray(bytearray(resp.content), dtype="uint8")
+                    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                 else:
-                    # It's a static image. Safe to read the whole content
-                    if resp.status_code == 200:
-                        image_array = np.asarray(bytearray(resp.content), dtype="uint8")
-                        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-                    else:
-                        return {"error": f"Failed to download image (Status: {resp.status_code})"}
-            except Exception as e:
-                return {"error": f"Download Error: {str(e)}"}
+                    return None, {"error": f"Failed to download image (Status: {resp.status_code})"}
+        except Exception as e:
+            return None, {"error": f"Download Error: {str(e)}"}
+    else:
+        # 로컬 파일
+        if os.path.exists(image_source):
+            image = cv2.imread(image_source)
         else:
-            # 로컬 파일
-            if os.path.exists(image_source):
-                image = cv2.imread(image_source)
-            else:
-                return {"error": "Local file not found"}
+            return None, {"error": "Local file not found"}
 
+    if image is None:
+        return None, {"error": "Failed to decode image"}
+    return image, None
+
+def analyze_plant_growth(image_source, scale=1.0, roi=None, render=True):
+    """
+    이미지 소스(URL 또는 로컬 파일 경로)를 받아 식물의 초록색 영역 비율을 분석합니다.
+    scale/roi/render는 analyze_image와 같습니다.
+    """
+    try:
+        image, error = load_image(image_source)
+        if error:
+            return error
+        return analyze_image(image, scale, roi, render)
+    except Exception as e:
+        return {"error": str(e)}
+
+def analyze_jpeg(jpeg_bytes, scale=1.0, roi=None, render=True):
+    """카메라 풀이 보관 중인 JPEG 프레임(bytes)을 분석합니다. (프로세스 풀 작업용)"""
+    try:
+        # 축소 분석이면 디코드 단계에서 바로 줄여 읽기 (1/2, 1/4, 1/8 JPEG 축소 디코드)
+        flag = cv2.IMREAD_COLOR
+        reduced = 1
+        if not render:
+            for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if scale * factor <= 1.0:
+                    flag, reduced = reduced_flag, factor
+                    break
+        image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), flag)
         if image is None:
             return {"error": "Failed to decode image"}
+        return analyze_image(image, scale, roi, render, pixel_scale=reduced)
+    except Exception as e:
+        return {"error": str(e)}
 
-        # 2. 이미지 전처리 (HSV 변환)
-        # BGR -> HSV (Hue, Saturation, Value)
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        # 3. 초록색 마스크 생성 (식물 영역 추출)
-        # Hue 범위: 35(연두) ~ 85(진초록)
-        # Saturation: 40 ~ 255 (너무 흐릿한 색 제외)
-        # Value: 40 ~ 255 (너무 어두운 색 제외)
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        
-        mask = cv2.inRange(hsv, lower_green, upper_green)
-        
-        # 노이즈 제거 (Morphology)
-        kernel = np.ones((5,5), np.uint8)
+def crop_roi(image, roi):
+    """roi: (x, y, w, h) 비율(0~1). 프레임 해상도와 무관하게 카메라별 관심 영역을 지정합니다."""
+    if not roi:
+        return image
+    height, width = image.shape[:2]
+    x, y, w, h = roi
+    x0, y0 = int(round(x * width)), int(round(y * height))
+    x1, y1 = int(round((x + w) * width)), int(round((y + h) * height))
+    x0, y0 = max(0, min(x0, width - 1)), max(0, min(y0, height - 1))
+    x1, y1 = max(x0 + 1, min(x1, width)), max(y0 + 1, min(y1, height))
+    return image[y0:y1, x0:x1]
+
+def downscale(image, factor):
+    """면적 평균 축소. OpenCV의 1/2 INTER_AREA 전용 경로를 반복 사용하고 나머지 배율만 한 번 더 줄입니다."""
+    while factor <= 0.5:
+        image = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        factor *= 2
+    if factor < 1.0:
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return image
+
+def green_mask(image, kernel_size=5):
+    """초록색(식물) 영역 마스크"""
+    # 2. 이미지 전처리 (HSV 변환)
+    # BGR -> HSV (Hue, Saturation, Value)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    
+    # 3. 초록색 마스크 생성 (식물 영역 추출)
+    # Hue 범위: 35(연두) ~ 85(진초록)
+    # Saturation: 40 ~ 255 (너무 흐릿한 색 제외)
+    # Value: 40 ~ 255 (너무 어두운 색 제외)
+    lower_green = np.array([35, 40, 40])
+    upper_green = np.array([85, 255, 255])
+    
+    mask = cv2.inRange(hsv, lower_green, upper_green)
+    
+    # 노이즈 제거 (Morphology)
+    if kernel_size > 1:
+        kernel = np.ones((kernel_size, kernel_size), np.uint8)
         mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
         mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-        
-        # 4. 면적 계산
-        height, width = image.shape[:2]
-        total_pixels = height * width
-        green_pixels = cv2.countNonZero(mask)
-        growth_ratio = (green_pixels / total_pixels) * 100
-        
-        # 5. 결과 시각화 (원본 + 마스크 합성)
-        # 초록색 영역만 원본 색상 유지, 나머지는 흑백 처리
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray_bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-        
-        # 마스크 영역은 원본, 아닌 영역은 흑백
-        result_img = np.where(mask[:, :, None] == 255, image, gray_bgr)
-        
-        # 텍스트 추가
-        cv2.putText(result_img, f"Growth: {growth_ratio:.2f}%", (20, 50), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        
-        # 결과 이미지 저장 (html 폴더 내에 저장하여 웹에서 접근 가능하게 함)
-        save_name = f"analysis_result.jpg"
-        save_path = os.path.join("html", save_name)
-        cv2.imwrite(save_path, result_img)
-        
-        return {
-            "success": True,
-            "green_pixels": green_pixels,
-            "total_pixels": total_pixels,
-            "ratio": round(growth_ratio, 2),
-            "image_url": "html/" + save_name,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
-    except Exception as e:
-        return {"error": str(e)}
+    return mask
+
+def render_overlay(image, mask, growth_ratio, save_name="analysis_result.jpg"):
+    """결과 시각화 (초록색 영역만 원본 색상 유지, 나머지는 흑백) 후 html 폴더에 저장하고 웹 경로를 반환합니다."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    result_img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    
+    # 마스크 영역은 원본, 아닌 영역은 흑백
+    cv2.copyTo(image, mask, result_img)
+    
+    # 텍스트 추가
+    cv2.putText(result_img, f"Growth: {growth_ratio:.2f}%", (20, 50), 
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    
+    # 결과 이미지 저장 (html 폴더 내에 저장하여 웹에서 접근 가능하게 함)
+    save_path = os.path.join("html", save_name)
+    cv2.imwrite(save_path, result_img)
+    return "html/" + save_name
+
+def analyze_image(image, scale=1.0, roi=None, render=True, pixel_scale=1):
+    """
+    BGR 이미지 배열의 초록색 영역 비율을 계산합니다.
+    - roi: (x, y, w, h) 비율로 관심 영역만 분석
+    - scale: 1 미만이면 축소본에서 계산 (모폴로지 커널도 같은 비율로 축소)
+    - render: False면 결과 이미지를 만들지 않음 (정기 모니터링용)
+    - pixel_scale: 입력이 이미 1/pixel_scale로 축소 디코드된 경우의 배율 (남은 축소만 수행)
+    green_pixels/total_pixels는 항상 원본 해상도 기준으로 환산해 보고합니다.
+    """
+    image = crop_roi(image, roi)
+    work_scale = scale * pixel_scale
+    if work_scale < 1.0:
+        image = downscale(image, work_scale)
+    kernel_size = max(1, int(round(5 * scale)))
+
+    mask = green_mask(image, kernel_size)
+    
+    # 4. 면적 계산
+    height, width = image.shape[:2]
+    green = cv2.countNonZero(mask)
+    growth_ratio = (green / (height * width)) * 100
+    to_full = 1.0 / (scale * scale)
+    
+    result = {
+        "success": True,
+        "green_pixels": int(round(green * to_full)),
+        "total_pixels": int(round(height * width * to_full)),
+        "ratio": round(growth_ratio, 2),
+        "scale": scale,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    # 5. 결과 시각화 (요청한 경우에만)
+    if render:
+        result["image_url"] = render_overlay(image, mask, growth_ratio)
+    return result
+
+def compare_accuracy(image, scales=(1.0, 0.5, 0.25), roi=None, repeat=5):
+    """축소 배율별 비율/소요 시간을 원본 해상도 결과와 비교합니다."""
+    rows = []
+    base = None
+    for scale in scales:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = analyze_image(image, scale, roi, render=False)
+        ms = (time.perf_counter() - t0) / repeat * 1000
+        if base is None:
+            base = result["ratio"]
+        rows.append({"scale": scale, "ratio": result["ratio"], "error": round(abs(result["ratio"] - base), 2), "ms": round(ms, 2)})
+    return rows
 
 if __name__ == "__main__":
-    # Test Code
-    test_url = "https://images.unsplash.com/photo-1530836369250-ef72a3f5cda8?q=80&w=800&auto=format&fit=crop"
-    print("Testing analysis with sample image...")
-    result = analyze_plant_growth(test_url)
-    print(result)
+    import sys
+
+    if len(sys.argv) > 1:
+        print(analyze_plant_growth(sys.argv[1]))
+        sys.exit(0)
+
+    # 벤치마크: 합성 1600x1200 프레임 (잎 모양 초록 타원 + 센서 노이즈)
+    rng = np.random.default_rng(0)
+    frame = np.full((1200, 1600, 3), (60, 80, 110), np.uint8)
+    for _ in range(40):
+        center = (int(rng.integers(100, 1500)), int(rng.integers(100, 1100)))
+        axes = (int(rng.integers(20, 90)), int(rng.integers(10, 50)))
+        cv2.ellipse(frame, center, axes, float(rng.integers(0, 180)), 0, 360, (40, int(rng.integers(120, 200)), 50), -1)
+    frame = cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8))
+    jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+
+    print("배율별 정확도 (원본 대비 비율 오차, render=False)")
+    for row in compare_accuracy(frame):
+        print(f"  scale {row['scale']:<5} ratio {row['ratio']:6.2f}%  오차 {row['error']:.2f}%p  {row['ms']:7.2f} ms")
+
+    def timed(fn, repeat=5):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return result, (time.perf_counter() - t0) / repeat * 1000
+
+    import tempfile
+    os.chdir(tempfile.mkdtemp())  # 결과 이미지는 임시 폴더의 html/에 기록
+    os.makedirs("html")
+    decode = lambda: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    full, full_ms = timed(lambda: analyze_image(decode(), render=True))
+    fast, fast_ms = timed(lambda: analyze_jpeg(jpeg, scale=0.25, render=False))
+    print(f"JPEG 1프레임: 기존(원본+결과 이미지) {full_ms:.1f} ms / 1/4 축소 디코드 {fast_ms:.1f} ms ({full_ms / fast_ms:.1f}x), "
+          f"비율 {full['ratio']}% vs {fast['ratio']}%")
@@ -0,0 +1,243 @@
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from sf_core.log import get_logger
+
+logger = get_logger("vision")
+
+
+class VisionJobQueue:
+    """
+    생육 이미지 분석 작업 큐.
+    - submit()은 작업 ID만 즉시 반환하고, 분석은 프로세스 풀(max_workers개 동시 실행)에서 수행됩니다.
+    - get()/wait()로 결과를 조회하며, wait()는 완료될 때까지 최대 timeout초 대기합니다. (롱 폴링, 이벤트 루프에서는 wait_async())
+    - 성공한 결과는 모아 두었다가 run() 루프가 growth_log.json에 한 번에 반영합니다.
+    대기 중인 작업이 max_pending개를 넘으면 submit()은 None을 반환합니다.
+    bytes 입력(카메라 프레임)은 내용 해시 + 분석 옵션으로 결과를 캐시하므로, 같은 프레임의 재제출은 워커를 거치지 않고 즉시 완료됩니다.
+    pool: 다른 큐를 지정하면 그 큐의 프로세스 풀을 함께 씁니다. (한 프로세스에서 여러 농장을 서비스할 때 워커를 농장 수만큼 띄우지 않음)
+    """
+    def __init__(self, worker, growth_log_path, max_workers=2, max_pending=32,
+                 result_ttl=600, flush_interval=5.0, cache_size=256, pool=None):
+        self.worker = worker
+        self.growth_log_path = growth_log_path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.flush_interval = flush_interval
+        self.jobs = {}       # job_id -> 상태 dict
+        self._futures = {}   # job_id -> Future (진행 중인 작업만)
+        self._log_buffer = []
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # 내용 해시 키 -> 성공 결과
+        self.cache_hits = 0
+        self._cond = threading.Condition()
+        self._executor = None
+        self._pool = pool
+
+    def start(self):
+        """
+        프로세스 풀을 미리 띄웁니다. fork 방식 풀은 첫 작업 때 워커를 한꺼번에 만들므로,
+        다른 스레드가 생기기 전(main 초기)에 호출해 두면 워커가 깨끗한 상태에서 fork 됩니다.
+        """
+        with self._cond:
+            if self._executor is None and self._pool is not None:
+                self._executor = self._pool.start()._executor
+            elif self._executor is None:
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('fork'))
+                self._executor.submit(time.time).result()
+        return self
+
+    # ---------------------------------------------------------------- 작업 제출/조회
+    def submit(self, source, worker=None, camera=None):
+        """
+        source: 이미지 URL/경로 또는 worker가 받는 입력(예: 카메라 풀의 JPEG bytes)
+        worker: 기본 워커 대신 사용할 함수 (functools.partial로 분석 옵션 지정 가능)
+        camera: 지정하면 작업 상태와 생육 기록에 카메라 ID가 함께 남습니다.
+        """
+        self.start()
+        worker = worker or self.worker
+        cache_key = self._cache_key(source, worker)
+        now = time.time()
+        with self._cond:
+            self._prune(now)
+            job_id = uuid.uuid4().hex[:12]
+            job = {"job_id": job_id, "status": "queued", "created": now,
+                   "source": source if isinstance(source, str) else f"camera:{camera}"}
+            if camera is not None:
+                job["camera"] = camera
+
+            cached = self._cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                # 이미 분석한 프레임: 워커를 거치지 않고 즉시 완료 (생육 기록은 요청 시각으로 남김)
+                self._cache.move_to_end(cache_key)
+                self.cache_hits += 1
+                result = dict(cached, cached=True, timestamp=time.strftime("%Y-%m-%d %H:%M:%S"))
+                job.update(status="done", result=result, finished=now)
+                self.jobs[job_id] = job
+                self._log_buffer.append(self._log_entry(result, camera))
+                return job_id
+
+            if len(self._futures) >= self.max_pending:
+                return None
+            self.jobs[job_id] = job
+            future = self._executor.submit(worker, source)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id, camera=camera, key=cache_key: self._finish(job_id, f, camera, key))
+        return job_id
+
+    @staticmethod
+    def _cache_key(source, worker):
+        if not isinstance(source, (bytes, bytearray)):
+            return None
+        options = sorted(worker.keywords.items()) if isinstance(worker, functools.partial) else []
+        name = getattr(getattr(worker, 'func', worker), '__name__', '')
+        return f"{hashlib.blake2b(source, digest_size=16).hexdigest()}:{name}:{options}"
+
+    def _finish(self, job_id, future, camera=None, cache_key=None):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": f"Vision Engine Error: {e}"}
+        with self._cond:
+            self._futures.pop(job_id, None)
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job["status"] = "error" if result.get("error") else "done"
+                job["result"] = result
+                job["finished"] = time.time()
+            if result.get("success"):
+                self._log_buffer.append(self._log_entry(result, camera))
+                if cache_key:
+                    self._cache[cache_key] = result
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _log_entry(result, camera):
+        entry = {
+            "date": result['timestamp'],
+            "ratio": result['ratio'],
+            "pixels": result['green_pixels']
+        }
+        if camera is not None:
+            entry["camera"] = camera
+        return entry
+
+    def _prune(self, now):
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.get("finished") and now - job["finished"] > self.result_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            future = self._futures.get(job_id)
+            if future is not None and future.running():
+                job["status"] = "running"
+            return dict(job)
+
+    def wait(self, job_id, timeout=0):
+        """작업이 끝나거나 timeout초가 지날 때까지 기다린 뒤 상태를 반환합니다."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while job_id in self._futures:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.get(job_id)
+
+    async def wait_async(self, job_id, timeout=0):
+        """wait()의 이벤트 루프용: 스레드를 잡지 않고 작업 Future 완료를 최대 timeout초 기다립니다."""
+        with self._cond:
+            future = self._futures.get(job_id)
+        if future is not None and timeout > 0:
+            try:
+                # shield: 시간 초과로 대기만 취소하고 분석 작업 자체는 취소하지 않음
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except Exception:
+                pass   # 시간 초과는 진행 중 상태로, 분석 실패는 _finish()가 기록한 error 상태로 응답
+        # _finish()는 submit()에서 먼저 등록된 완료 콜백이므로 여기서 깨어날 때는 이미 상태가 반영되어 있음
+        return self.get(job_id)
+
+    def pending(self):
+        with self._cond:
+            return len(self._futures)
+
+    # ---------------------------------------------------------------- 생육 기록 일괄 반영
+    def flush(self):
+        """모아 둔 분석 결과를 growth_log.json에 한 번의 재작성으로 반영합니다. 반환값: 반영 건수"""
+        with self._cond:
+            batch, self._log_buffer = self._log_buffer, []
+        if not batch:
+            return 0
+        logs = []
+        if os.path.exists(self.growth_log_path):
+            try:
+                with open(self.growth_log_path, 'r', encoding='utf-8') as f:
+                    logs = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+        logs.extend(batch)
+        tmp_path = self.growth_log_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(logs, f, indent=2)
+        os.replace(tmp_path, self.growth_log_path)
+        return len(batch)
+
+    async def run(self):
+        """flush_interval마다 생육 기록을 반영하는 백그라운드 루프"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    written = await asyncio.to_thread(self.flush)
+                    if written:
+                        logger.info("🌱 [Vision] 분석 결과 %d건 생육 기록 반영", written)
+                except Exception as e:
+                    logger.error("⚠️ [Vision] 생육 기록 저장 실패: %s", e, key="growth-log", every=300)
+        finally:
+            self.flush()
+
+
+def _demo_worker(source):
+    time.sleep(0.2)
+    return {"success": True, "ratio": 12.5, "green_pixels": 1000, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+if __name__ == "__main__":
+    # 자가 점검: 2개 워커로 6건을 동시에 제출 → 제출은 즉시 반환, 결과는 약 3 * 0.2초 후, 기록은 1회 일괄 반영
+    import tempfile
+
+    log_path = os.path.join(tempfile.mkdtemp(), "growth_log.json")
+    jobs = VisionJobQueue(_demo_worker, log_path, max_workers=2).start()
+    t0 = time.perf_counter()
+    ids = [jobs.submit(f"img-{i}.jpg") for i in range(6)]
+    submit_ms = (time.perf_counter() - t0) * 1000
+    results = [jobs.wait(job_id, timeout=5) for job_id in ids]
+    elapsed = time.perf_counter() - t0
+    assert all(r["status"] == "done" for r in results)
+    assert jobs.flush() == 6 and len(json.load(open(log_path, encoding='utf-8'))) == 6
+    print(f"✅ 제출 6건 {submit_ms:.1f} ms, 전체 완료 {elapsed:.2f}초, 생육 기록 6건 일괄 반영")
+
+    # 같은 프레임(bytes) 재제출은 내용 해시 캐시로 즉시 완료
+    frame = os.urandom(200_000)
+    first = jobs.wait(jobs.submit(frame, camera="CAM-01"), timeout=5)
+    t0 = time.perf_counter()
+    again = jobs.get(jobs.submit(frame, camera="CAM-01"))
+    hit_ms = (time.perf_counter() - t0) * 1000
+    assert again["status"] == "done" and again["result"]["cached"] and jobs.cache_hits == 1
+    print(f"✅ 동일 프레임 재제출: 캐시 적중 {hit_ms:.2f} ms (최초 분석 {(first['finished'] - first['created']) * 1000:.0f} ms)")